@@ -8,6 +8,7 @@ from app.config import settings
 from app.models.user import User
 from app.models.caregiver import Doctor
 from app.models.admin import Admin
+from app.auth.principal_cache import principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -23,15 +24,22 @@ async def get_current_user_or_admin(
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+        cache_key = (user_type, user_id, payload.get("exp"))
+        cached = principal_cache.get(cache_key, db)
+        if cached is not None:
+            return cached
+
         if user_type == "admin":
             admin = db.query(Admin).filter(Admin.email == user_id).first()
             if not admin:
                 raise HTTPException(status_code=401, detail="Admin not found")
+            principal_cache.put(cache_key, admin)
             return admin
         elif user_type == "doctor":
             doctor = db.query(Doctor).filter(Doctor.doctor_id == user_id).first()
             if not doctor:
                 raise HTTPException(status_code=401, detail="Doctor not found")
+            principal_cache.put(cache_key, doctor)
             return doctor
         else:
             # Handle string vs int ID issues
@@ -44,6 +52,7 @@ async def get_current_user_or_admin(
                 
             if not user:
                 raise HTTPException(status_code=401, detail="User not found")
+            principal_cache.put(cache_key, user)
             return user
             
     except JWTError:
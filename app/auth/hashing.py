@@ -1,12 +1,44 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from typing import Optional, Tuple
+import asyncio
+import threading
 import logging
 
+from app.config import settings
+
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto"
-)
+SUPPORTED_SCHEMES = ("bcrypt", "argon2")
+
+
+def _build_context() -> CryptContext:
+    """Preferred scheme first; any other supported scheme still verifies but is marked for rehash"""
+    preferred = settings.PASSWORD_HASH_SCHEME if settings.PASSWORD_HASH_SCHEME in SUPPORTED_SCHEMES else "bcrypt"
+    schemes = [preferred] + [scheme for scheme in SUPPORTED_SCHEMES if scheme != preferred]
+    rounds = settings.BCRYPT_ROUNDS
+
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        # Pin the cost so hashes made with any other cost are flagged for rehash
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+pwd_context = _build_context()
+
+
+def _truncate(password: str) -> str:
+    """Truncate to 71 bytes (safe limit for bcrypt)"""
+    password_bytes = password.encode('utf-8')
+    if len(password_bytes) > 71:
+        return password_bytes[:71].decode('utf-8', errors='ignore')
+    return password
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -16,15 +48,8 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     if not plain_password or not hashed_password:
         return False
 
-    # Ensure bytes for consistent length checking
-    password_bytes = plain_password.encode('utf-8')
-    
-    # If password is too long, truncate it to 71 bytes (safe limit for bcrypt)
-    if len(password_bytes) > 71:
-        plain_password = password_bytes[:71].decode('utf-8', errors='ignore')
-        
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return pwd_context.verify(_truncate(plain_password), hashed_password)
     except Exception as e:
         logger.error(f"Error verifying password: {str(e)}")
         return False
@@ -33,11 +58,116 @@ def get_password_hash(password: str) -> str:
     """Hash a password with length safety"""
     if not password:
         raise ValueError("Password cannot be empty")
-        
-    password_bytes = password.encode('utf-8')
-    
-    # Truncate if too long to prevent crash
-    if len(password_bytes) > 71:
-        password = password_bytes[:71].decode('utf-8', errors='ignore')
-        
-    return pwd_context.hash(password)
\ No newline at end of file
+
+    return pwd_context.hash(_truncate(password))
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, when the stored hash uses another scheme or cost
+    than the configured one, return a replacement hash as well.
+    """
+    if not plain_password or not hashed_password:
+        return False, None
+
+    try:
+        return pwd_context.verify_and_update(_truncate(plain_password), hashed_password)
+    except Exception as e:
+        logger.error(f"Error verifying password: {str(e)}")
+        return False, None
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except Exception:
+        return False
+
+
+class PasswordHashingPool:
+    """
+    Dedicated, size-limited executor for password hashing so bcrypt/argon2
+    work never runs on the event loop. Jobs beyond `max_pending` waiting for
+    a worker are rejected with 503 instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = max(workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwhash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.peak_pending = 0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service is busy, please retry"
+                )
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        future = self._executor.submit(self._invoke, fn, args)
+        # A caller cancelled while the job is still queued cancels it before
+        # _invoke runs, so _invoke cannot release its place in the queue
+        future.add_done_callback(self._release_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _release_if_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self.pending -= 1
+
+    def _invoke(self, fn, args):
+        with self._lock:
+            self.pending -= 1
+            self.active += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                "active": self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "peak_queue_depth": self.peak_pending,
+                "scheme": pwd_context.default_scheme(),
+                "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+hashing_pool = PasswordHashingPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    if not password:
+        raise ValueError("Password cannot be empty")
+    return await hashing_pool.run(get_password_hash, password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Async verify; the second item is a new hash to store (rehash-on-login) or None"""
+    return await hashing_pool.run(verify_and_update, plain_password, hashed_password)
@@ -0,0 +1,114 @@
+"""
+Process-local cache of authenticated principals (User / Doctor / Admin).
+
+Entries are keyed by (user_type, sub, token exp) and hold a column snapshot
+rather than a live ORM instance, so a hit is re-attached to the request's
+Session without issuing a SELECT. Entries for an account are dropped when
+is_active, the password hash or a role flag changes, and explicitly on
+logout / password change.
+"""
+import threading
+import logging
+
+from cachetools import TTLCache
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.config import settings
+from app.models.user import User
+from app.models.caregiver import Doctor
+from app.models.admin import Admin
+
+logger = logging.getLogger(__name__)
+
+# Columns whose change must evict the cached principal
+SECURITY_ATTRIBUTES = ("is_active", "hashed_password", "is_caregiver", "is_superadmin")
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.enabled = ttl > 0 and maxsize > 0
+        self._cache = TTLCache(maxsize=max(maxsize, 1), ttl=max(ttl, 1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, db: Session):
+        """Return the cached principal attached to `db`, or None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        model, values = entry
+        instance = model(**values)
+        make_transient_to_detached(instance)
+        return db.merge(instance, load=False)
+
+    def put(self, key: tuple, principal) -> None:
+        if not self.enabled or principal is None:
+            return
+
+        mapper = inspect(principal).mapper
+        values = {attr.key: getattr(principal, attr.key) for attr in mapper.column_attrs}
+        with self._lock:
+            self._cache[key] = (mapper.class_, values)
+
+    def invalidate(self, principal) -> None:
+        """Drop every cached token entry belonging to this account"""
+        if principal is None:
+            return
+        self.invalidate_identity(type(principal), principal.id)
+
+    def invalidate_identity(self, model, pk) -> None:
+        with self._lock:
+            stale = [
+                key for key, (cached_model, values) in self._cache.items()
+                if cached_model is model and values.get("id") == pk
+            ]
+            for key in stale:
+                self._cache.pop(key, None)
+
+        if stale:
+            logger.debug(f"Evicted {len(stale)} cached principal(s) for {model.__name__} {pk}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._cache)
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAXSIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_principal(principal) -> None:
+    """Invalidation hook for logout, password change and deactivation"""
+    principal_cache.invalidate(principal)
+
+
+def _evict_on_security_change(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes()
+           for name in SECURITY_ATTRIBUTES if name in state.attrs):
+        principal_cache.invalidate(target)
+
+
+def _evict_on_delete(mapper, connection, target):
+    principal_cache.invalidate(target)
+
+
+for _model in (User, Doctor, Admin):
+    event.listen(_model, "after_update", _evict_on_security_change)
+    event.listen(_model, "after_delete", _evict_on_delete)
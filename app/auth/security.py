@@ -10,6 +10,7 @@ import re
 from app.config import settings
 from app.database import get_db
 from app.auth.hashing import verify_password, get_password_hash
+from app.auth.principal_cache import principal_cache
 
 
 
@@ -73,37 +74,35 @@ async def get_current_user_or_admin(
         if user_id is None:
             raise credentials_exception
 
+        cache_key = (user_type, user_id, payload.get("exp"))
+        cached = principal_cache.get(cache_key, db)
+        if cached is not None:
+            return cached
+
         if user_type == "admin":
-            admin = db.query(Admin).filter(Admin.email == user_id).first()
-            if admin is None:
-                raise credentials_exception
-            return admin
+            principal = db.query(Admin).filter(Admin.email == user_id).first()
             
         elif user_type == "doctor":
-            doctor = db.query(Doctor).filter(Doctor.doctor_id == user_id).first()
-            if doctor is None:
-                raise credentials_exception
-            return doctor
+            principal = db.query(Doctor).filter(Doctor.doctor_id == user_id).first()
             
         elif user_type == "caregiver":
             
-            user = db.query(User).filter(User.id == int(user_id)).first()
-            if user is None:
-                raise credentials_exception
-            return user
+            principal = db.query(User).filter(User.id == int(user_id)).first()
             
         else:
             
             try:
                 u_id = int(user_id)
-                user = db.query(User).filter(User.id == u_id).first()
+                principal = db.query(User).filter(User.id == u_id).first()
             except ValueError:
                 
-                user = db.query(User).filter(User.email == user_id).first()
+                principal = db.query(User).filter(User.email == user_id).first()
                 
-            if user is None:
-                raise credentials_exception
-            return user
+        if principal is None:
+            raise credentials_exception
+
+        principal_cache.put(cache_key, principal)
+        return principal
             
     except JWTError:
         raise credentials_exception
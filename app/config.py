@@ -11,6 +11,9 @@ class Settings(BaseModel):
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
     LOCAL_DB_URL: Optional[str] = os.getenv("LOCAL_DB_URL", None)
+    # Async engine (asyncpg / aiosqlite); "false" keeps ported routers on
+    # the sync engine through a thread-offloading compat session
+    USE_ASYNC_DB: bool = os.getenv("USE_ASYNC_DB", "true").lower() == "true"
 
     # Azure Custom Vision
     AZURE_CUSTOM_VISION_PREDICTION_ENDPOINT: str = os.getenv(
@@ -35,6 +38,14 @@ class Settings(BaseModel):
         os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7")
     )  # noqa
 
+    # Authenticated principal cache (per process, 0 disables)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = int(
+        os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60")
+    )
+    PRINCIPAL_CACHE_MAXSIZE: int = int(
+        os.getenv("PRINCIPAL_CACHE_MAXSIZE", "10000")
+    )
+
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
 
     CORS_ORIGINS: List[str] = os.getenv(
@@ -85,6 +96,15 @@ class Settings(BaseModel):
         os.getenv("REQUIRE_PASSWORD_UPPERCASE", "true").lower() == "true"
     )
 
+    # Password Hashing ("bcrypt" or "argon2"; other schemes/costs are
+    # rehashed transparently on the next successful login)
+    PASSWORD_HASH_SCHEME: str = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_QUEUE: int = int(
+        os.getenv("PASSWORD_HASH_MAX_QUEUE", "64")
+    )
+
     # Azure AI Services
     AZURE_AI_VISION_ENDPOINT: str = os.getenv("AZURE_AI_VISION_ENDPOINT", "")
     AZURE_AI_VISION_KEY: str = os.getenv("AZURE_AI_VISION_KEY", "")
@@ -97,6 +117,100 @@ class Settings(BaseModel):
 
     # IoT Hub
     IOT_HUB_CONNECTION_STRING: str = os.getenv("IOT_CONNECTION_STRING", "")  # noqa
+    # Outbound IoT Hub queue: messages are batched per device connection
+    IOT_HUB_BATCH_SIZE: int = int(os.getenv("IOT_HUB_BATCH_SIZE", "50"))
+    IOT_HUB_BATCH_LINGER_MS: int = int(
+        os.getenv("IOT_HUB_BATCH_LINGER_MS", "200")
+    )
+    IOT_HUB_QUEUE_MAXSIZE: int = int(os.getenv("IOT_HUB_QUEUE_MAXSIZE", "10000"))
+    IOT_HUB_MAX_RETRIES: int = int(os.getenv("IOT_HUB_MAX_RETRIES", "3"))
+    # /iot/webhook/batch limits
+    IOT_BATCH_MAX_ITEMS: int = int(os.getenv("IOT_BATCH_MAX_ITEMS", "10000"))
+    IOT_BATCH_CHUNK_SIZE: int = int(os.getenv("IOT_BATCH_CHUNK_SIZE", "1000"))
+    # Optional write-behind buffer for single /iot/webhook readings
+    IOT_WRITE_BEHIND_ENABLED: bool = (
+        os.getenv("IOT_WRITE_BEHIND_ENABLED", "false").lower() == "true"
+    )
+    IOT_BUFFER_MAX_SIZE: int = int(os.getenv("IOT_BUFFER_MAX_SIZE", "10000"))
+    IOT_BUFFER_FLUSH_SIZE: int = int(os.getenv("IOT_BUFFER_FLUSH_SIZE", "500"))
+    IOT_BUFFER_FLUSH_INTERVAL_MS: int = int(
+        os.getenv("IOT_BUFFER_FLUSH_INTERVAL_MS", "250")
+    )
+    IOT_BUFFER_SPOOL_PATH: str = os.getenv(
+        "IOT_BUFFER_SPOOL_PATH", "spool/vital_readings.ndjson"
+    )
+    IOT_BUFFER_FSYNC: bool = os.getenv("IOT_BUFFER_FSYNC", "false").lower() == "true"
+    # Failed flushes in a row before the batch is retried reading by reading
+    # and rejected readings are dead-lettered next to the spool
+    IOT_BUFFER_MAX_FLUSH_ATTEMPTS: int = int(os.getenv("IOT_BUFFER_MAX_FLUSH_ATTEMPTS", "3"))
+
+    # Streaming emergency detection on ingested vitals
+    EMERGENCY_DETECTION_ENABLED: bool = (
+        os.getenv("EMERGENCY_DETECTION_ENABLED", "true").lower() == "true"
+    )
+    EMERGENCY_ALERT_COOLDOWN_SECONDS: int = int(
+        os.getenv("EMERGENCY_ALERT_COOLDOWN_SECONDS", "300")
+    )
+
+    # Pooled connections one caregiver dashboard may hold at once, the
+    # request's own included; the async pool is 5 + 10 overflow per worker
+    CAREGIVER_DASHBOARD_SESSIONS: int = int(
+        os.getenv("CAREGIVER_DASHBOARD_SESSIONS", "2")
+    )
+
+    # Leaderboard
+    LEADERBOARD_REFRESH_SECONDS: int = int(
+        os.getenv("LEADERBOARD_REFRESH_SECONDS", "60")
+    )
+
+    # WebSocket fan-out between workers: "memory://" (single process) or
+    # "redis://[[username]:password@]host[:port][/db]" ("rediss://" for TLS)
+    WS_BACKPLANE_URL: str = os.getenv("WS_BACKPLANE_URL", "memory://")
+    # How long startup waits for the backplane before serving local-only
+    WS_BACKPLANE_CONNECT_TIMEOUT_SECONDS: float = float(
+        os.getenv("WS_BACKPLANE_CONNECT_TIMEOUT_SECONDS", "5")
+    )
+    WS_PRESENCE_INTERVAL_SECONDS: float = float(
+        os.getenv("WS_PRESENCE_INTERVAL_SECONDS", "15")
+    )
+    # Per-connection send queue; slower clients are disconnected
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+    # Dead sockets are found by uvicorn's protocol-level ping/pong
+    # (--ws-ping-interval / --ws-ping-timeout). Optionally also close
+    # connections that send nothing for this long; 0 (the default) keeps
+    # listen-only clients connected
+    WS_IDLE_TIMEOUT_SECONDS: float = float(
+        os.getenv("WS_IDLE_TIMEOUT_SECONDS", "0")
+    )
+    # Upper bound on each socket send during a caregiver broadcast
+    WS_SEND_TIMEOUT_SECONDS: float = float(
+        os.getenv("WS_SEND_TIMEOUT_SECONDS", "2")
+    )
+
+    # scripts/purge_notifications.py: read notifications are kept this long,
+    # unread ones up to NOTIFICATION_UNREAD_RETENTION_DAYS
+    NOTIFICATION_RETENTION_DAYS: int = int(
+        os.getenv("NOTIFICATION_RETENTION_DAYS", "90")
+    )
+    NOTIFICATION_UNREAD_RETENTION_DAYS: int = int(
+        os.getenv("NOTIFICATION_UNREAD_RETENTION_DAYS", "365")
+    )
+
+    # Badge counters cache (per process, invalidated across workers)
+    UNREAD_CACHE_TTL_SECONDS: int = int(
+        os.getenv("UNREAD_CACHE_TTL_SECONDS", "30")
+    )
+    UNREAD_CACHE_MAXSIZE: int = int(
+        os.getenv("UNREAD_CACHE_MAXSIZE", "50000")
+    )
+
+    # Patient -> approved caregivers, for alert fan-out (per process)
+    CAREGIVER_MAP_TTL_SECONDS: int = int(
+        os.getenv("CAREGIVER_MAP_TTL_SECONDS", "300")
+    )
+    CAREGIVER_MAP_MAXSIZE: int = int(
+        os.getenv("CAREGIVER_MAP_MAXSIZE", "50000")
+    )
 
     # Storage
     AZURE_STORAGE_CONNECTION_STRING: str = os.getenv(
@@ -1,8 +1,12 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 import logging
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
 
 logging.basicConfig(level=logging.INFO)
@@ -67,6 +71,152 @@ def get_db():
     finally:
         db.close()
 
+
+def get_async_database_url(url):
+    """Map a sync database URL onto the matching asyncio driver"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+
+    if backend == "postgresql":
+        # asyncpg takes `ssl` where libpq takes `sslmode`
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        if sslmode:
+            query["ssl"] = sslmode
+        return url.set(drivername="postgresql+asyncpg", query=query)
+
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+
+    return None
+
+
+def create_async_engine_for(url):
+    """Create the asyncio engine paired with the sync engine, or None"""
+    async_url = get_async_database_url(url)
+    if async_url is None:
+        return None
+
+    if async_url.get_backend_name() == "sqlite":
+        return create_async_engine(async_url, connect_args={"check_same_thread": False})
+
+    return create_async_engine(
+        async_url,
+        echo=False,
+        pool_size=5,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        connect_args={"timeout": 10}
+    )
+
+
+class SyncSessionAdapter:
+    """
+    Compat mode: exposes the awaitable AsyncSession surface over a sync
+    Session, running each database call in a worker thread so ported
+    handlers keep the event loop free even without an asyncio driver.
+    """
+
+    def __init__(self, sync_session):
+        self.sync_session = sync_session
+        self.bind = sync_session.get_bind()
+
+    @property
+    def info(self):
+        return self.sync_session.info
+
+    async def _call(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await self._call(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await self._call(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await self._call(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await self._call(self.sync_session.get, entity, ident, **kwargs)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await self._call(fn, self.sync_session, *args, **kwargs)
+
+    async def flush(self, objects=None):
+        await self._call(self.sync_session.flush, objects)
+
+    async def commit(self):
+        await self._call(self.sync_session.commit)
+
+    async def rollback(self):
+        await self._call(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None):
+        await self._call(self.sync_session.refresh, instance, attribute_names)
+
+    async def delete(self, instance):
+        await self._call(self.sync_session.delete, instance)
+
+    async def close(self):
+        await self._call(self.sync_session.close)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+
+async_engine = None
+if settings.USE_ASYNC_DB:
+    try:
+        async_engine = create_async_engine_for(engine.url)
+    except Exception as e:
+        # Missing asyncio driver: fall back to compat mode
+        logger.warning(f"Async database engine unavailable, using compat mode: {e}")
+
+AsyncSessionLocal = (
+    async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+    if async_engine is not None else None
+)
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            yield SyncSessionAdapter(db)
+        finally:
+            db.close()
+        return
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# For background tasks that need a session outside a request
+async_session_scope = asynccontextmanager(get_async_db)
+
+
+@asynccontextmanager
+async def sibling_session(db):
+    """
+    A separate session on the same bind as `db` (AsyncSession or compat
+    adapter), so independent reads can run concurrently with asyncio.gather
+    """
+    if isinstance(db, SyncSessionAdapter):
+        session = Session(bind=db.bind, expire_on_commit=False)
+        try:
+            yield SyncSessionAdapter(session)
+        finally:
+            session.close()
+        return
+
+    async with AsyncSession(bind=db.bind, expire_on_commit=False) as session:
+        yield session
+
 def create_tables(preserve_data: bool = True):
     """Create database tables with option to preserve data"""
     try:
@@ -0,0 +1,249 @@
+"""
+Streaming emergency detection over incoming vitals.
+
+Each user gets small fixed-size ring buffers per metric; a reading updates
+them and evaluates every rule in O(1). Rules:
+
+- sustained tachycardia: most heart-rate readings in the window above
+  TACHYCARDIA_BPM, spanning at least TACHYCARDIA_MIN_SECONDS
+- SpO2 drop: several recent blood-oxygen readings below SPO2_LOW
+- glucose excursion: a single hypo- or hyperglycaemic reading
+- rapid heart-rate change between consecutive readings
+
+An alert for the same user and rule is suppressed for
+EMERGENCY_ALERT_COOLDOWN_SECONDS of reading time.
+
+Callers that persist readings in a transaction take a `snapshot` of the
+users they feed and `restore` it if the transaction fails. Otherwise a
+retried batch would find its alert already under cooldown. They do so
+inside `hold(user_ids)`, held until the commit. That way a restore cannot
+undo what a concurrent batch for the same user has committed.
+"""
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+
+from app.config import settings
+
+
+@dataclass
+class Alert:
+    user_id: int
+    event_type: str
+    severity: str
+    description: str
+    triggered_at: datetime
+
+
+class RingBuffer:
+    """Fixed-size window keeping a running total of its values"""
+    __slots__ = ("values", "size", "index", "count", "total")
+
+    def __init__(self, size: int):
+        self.values = [0.0] * size
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def push(self, value: float):
+        if self.count == self.size:
+            self.total -= self.values[self.index]
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.index = (self.index + 1) % self.size
+
+    def copy(self) -> "RingBuffer":
+        other = RingBuffer.__new__(RingBuffer)
+        other.values = list(self.values)
+        other.size, other.index, other.count, other.total = self.size, self.index, self.count, self.total
+        return other
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    @property
+    def oldest(self) -> float:
+        return self.values[self.index if self.full else 0]
+
+
+class UserVitalsState:
+    __slots__ = ("hr_high", "hr_times", "spo2_low", "last_hr", "last_hr_at", "last_alert")
+
+    def __init__(self):
+        self.hr_high = RingBuffer(VitalRuleEngine.TACHYCARDIA_WINDOW)
+        self.hr_times = RingBuffer(VitalRuleEngine.TACHYCARDIA_WINDOW)
+        self.spo2_low = RingBuffer(VitalRuleEngine.SPO2_WINDOW)
+        self.last_hr: Optional[float] = None
+        self.last_hr_at = 0.0
+        self.last_alert: Dict[str, float] = {}
+
+    def copy(self) -> "UserVitalsState":
+        other = UserVitalsState.__new__(UserVitalsState)
+        other.hr_high, other.hr_times, other.spo2_low = (
+            self.hr_high.copy(), self.hr_times.copy(), self.spo2_low.copy()
+        )
+        other.last_hr, other.last_hr_at = self.last_hr, self.last_hr_at
+        other.last_alert = dict(self.last_alert)
+        return other
+
+
+class VitalRuleEngine:
+    TACHYCARDIA_BPM = 120
+    TACHYCARDIA_WINDOW = 10
+    TACHYCARDIA_MIN_HIGH = 8
+    TACHYCARDIA_MIN_SECONDS = 30
+
+    SPO2_LOW = 90
+    SPO2_CRITICAL = 85
+    SPO2_WINDOW = 5
+    SPO2_MIN_LOW = 3
+
+    GLUCOSE_HYPO = 70
+    GLUCOSE_HYPO_CRITICAL = 54
+    GLUCOSE_HYPER = 250
+    GLUCOSE_HYPER_CRITICAL = 300
+
+    HR_CHANGE_BPM = 40
+    HR_CHANGE_SECONDS = 60
+
+    def __init__(self, cooldown_seconds: int = settings.EMERGENCY_ALERT_COOLDOWN_SECONDS):
+        self.cooldown = cooldown_seconds
+        self.users: Dict[int, UserVitalsState] = {}
+        # user_id -> (lock, batches holding or waiting for it)
+        self._holds: Dict[int, Tuple[asyncio.Lock, int]] = {}
+        self.processed = 0
+        self.alerts_raised = 0
+
+    def _alert(self, state: UserVitalsState, alerts: List[Alert], user_id: int,
+               now: float, at: datetime, event_type: str, severity: str, description: str):
+        last = state.last_alert.get(event_type)
+        if last is not None and now - last < self.cooldown:
+            return
+        state.last_alert[event_type] = now
+        alerts.append(Alert(user_id, event_type, severity, description, at))
+
+    def process(self, user_id: int, at: datetime, heart_rate=None,
+                blood_oxygen=None, glucose_level=None) -> List[Alert]:
+        """Feed one reading; returns the alerts it triggers (usually none)"""
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserVitalsState()
+        now = at.timestamp()
+        alerts: List[Alert] = []
+        self.processed += 1
+
+        if heart_rate is not None:
+            state.hr_high.push(1.0 if heart_rate > self.TACHYCARDIA_BPM else 0.0)
+            state.hr_times.push(now)
+            if (state.hr_high.full
+                    and state.hr_high.total >= self.TACHYCARDIA_MIN_HIGH
+                    and now - state.hr_times.oldest >= self.TACHYCARDIA_MIN_SECONDS):
+                self._alert(state, alerts, user_id, now, at, "sustained_tachycardia", "high",
+                            f"Heart rate above {self.TACHYCARDIA_BPM} bpm in "
+                            f"{int(state.hr_high.total)} of the last {self.TACHYCARDIA_WINDOW} readings "
+                            f"(latest {heart_rate} bpm)")
+
+            if (state.last_hr is not None
+                    and abs(heart_rate - state.last_hr) >= self.HR_CHANGE_BPM
+                    and abs(now - state.last_hr_at) <= self.HR_CHANGE_SECONDS):
+                self._alert(state, alerts, user_id, now, at, "rapid_heart_rate_change", "medium",
+                            f"Heart rate changed from {state.last_hr:g} to {heart_rate} bpm "
+                            f"within {int(abs(now - state.last_hr_at))}s")
+            state.last_hr = heart_rate
+            state.last_hr_at = now
+
+        if blood_oxygen is not None:
+            state.spo2_low.push(1.0 if blood_oxygen < self.SPO2_LOW else 0.0)
+            if blood_oxygen < self.SPO2_CRITICAL:
+                self._alert(state, alerts, user_id, now, at, "spo2_drop", "critical",
+                            f"Blood oxygen at {blood_oxygen:g}%")
+            elif state.spo2_low.total >= self.SPO2_MIN_LOW:
+                self._alert(state, alerts, user_id, now, at, "spo2_drop", "high",
+                            f"Blood oxygen below {self.SPO2_LOW}% in {int(state.spo2_low.total)} "
+                            f"of the last {state.spo2_low.count} readings (latest {blood_oxygen:g}%)")
+
+        if glucose_level is not None:
+            if glucose_level < self.GLUCOSE_HYPO:
+                severity = "critical" if glucose_level < self.GLUCOSE_HYPO_CRITICAL else "high"
+                self._alert(state, alerts, user_id, now, at, "hypoglycemia", severity,
+                            f"Blood glucose at {glucose_level:g} mg/dL")
+            elif glucose_level > self.GLUCOSE_HYPER:
+                severity = "critical" if glucose_level > self.GLUCOSE_HYPER_CRITICAL else "high"
+                self._alert(state, alerts, user_id, now, at, "hyperglycemia", severity,
+                            f"Blood glucose at {glucose_level:g} mg/dL")
+
+        self.alerts_raised += len(alerts)
+        return alerts
+
+    def process_readings(self, readings: List[dict]) -> List[Alert]:
+        """
+        Evaluate VitalReading row dicts in timestamp order and flag
+        `is_emergency` on the ones that raised an alert.
+        """
+        alerts = []
+        for reading in sorted(readings, key=lambda r: r["timestamp"].timestamp()):
+            raised = self.process(
+                reading["user_id"], reading["timestamp"],
+                heart_rate=reading.get("heart_rate"),
+                blood_oxygen=reading.get("blood_oxygen"),
+                glucose_level=reading.get("glucose_level"),
+            )
+            if raised:
+                reading["is_emergency"] = True
+                alerts.extend(raised)
+        return alerts
+
+    def snapshot(self, user_ids: Iterable[int]) -> Dict[int, Optional[UserVitalsState]]:
+        """Copy the state of the given users (None for users not seen yet)"""
+        return {
+            user_id: state.copy() if (state := self.users.get(user_id)) is not None else None
+            for user_id in user_ids
+        }
+
+    def restore(self, snapshot: Dict[int, Optional[UserVitalsState]]):
+        for user_id, state in snapshot.items():
+            if state is None:
+                self.users.pop(user_id, None)
+            else:
+                self.users[user_id] = state
+
+    @asynccontextmanager
+    async def hold(self, user_ids: Iterable[int]):
+        """
+        Serialize batches per user from snapshot to commit. Locks are taken
+        in user id order and dropped once no batch holds or waits for them.
+        """
+        entered, acquired = [], []
+        try:
+            for user_id in sorted(set(user_ids)):
+                lock, count = self._holds.get(user_id) or (asyncio.Lock(), 0)
+                self._holds[user_id] = (lock, count + 1)
+                entered.append(user_id)
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in acquired:
+                lock.release()
+            for user_id in entered:
+                lock, count = self._holds[user_id]
+                if count == 1:
+                    del self._holds[user_id]
+                else:
+                    self._holds[user_id] = (lock, count - 1)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_users": len(self.users),
+            "processed": self.processed,
+            "alerts_raised": self.alerts_raised,
+        }
+
+
+emergency_engine = VitalRuleEngine()
@@ -3,8 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 import logging
-from app.database import create_tables, engine
+from app.database import create_tables, engine, async_engine, SessionLocal
 from app.config import settings         
+from app.auth.hashing import hashing_pool
+from app.services.backplane import backplane
+from app.services.iot_hub_client import hub_client_manager
+from app.services.ingest_buffer import ingest_buffer
+from app.services.leaderboard_engine import leaderboard_engine
 from fastapi.responses import RedirectResponse, HTMLResponse
 from app.seed import seed_db
 
@@ -27,6 +32,7 @@ from app.routers.caregiver_tasks import router as caregiver_tasks_router
 from app.routers.caregiver_schedule import router as caregiver_schedule_router
 from app.routers.caregiver_analytics import router as caregiver_analytics_router
 from app.routers.messages import router as messages_router
+from app.routers.me import router as me_router
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -76,6 +82,40 @@ def startup_event():
     except Exception as e:
         logger.warning(f"Database setup warning: {e}")
 
+@app.on_event("startup")
+def build_leaderboard():
+    try:
+        with SessionLocal() as db:
+            participants = leaderboard_engine.rebuild(db)
+        logger.info(f"Weekly leaderboard loaded with {participants} participants")
+    except Exception as e:
+        logger.warning(f"Leaderboard rebuild warning: {e}")
+
+@app.on_event("startup")
+async def recover_ingest_buffer():
+    if settings.IOT_WRITE_BEHIND_ENABLED:
+        try:
+            await ingest_buffer.recover()
+        except Exception as e:
+            logger.warning(f"Ingest spool recovery warning: {e}")
+
+@app.on_event("startup")
+async def start_backplane():
+    try:
+        await backplane.start()
+        logger.info(f"WebSocket backplane started as {backplane.worker_id}")
+    except Exception as e:
+        logger.warning(f"WebSocket backplane warning: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await backplane.stop()
+    await ingest_buffer.close()
+    if async_engine is not None:
+        await async_engine.dispose()
+    await hub_client_manager.close()
+    hashing_pool.shutdown()
+
 try:
     from app.routers.system import router as system_router
     app.include_router(system_router)
@@ -100,6 +140,7 @@ app.include_router(caregiver_tasks_router)
 app.include_router(caregiver_schedule_router)
 app.include_router(caregiver_analytics_router)
 app.include_router(messages_router)
+app.include_router(me_router)
 
 @app.get("/")
 def read_root():
@@ -9,6 +9,7 @@ from app.database import get_db
 from app.config import settings
 from app.models.user import User
 from app.models.admin import Admin
+from app.auth.principal_cache import principal_cache
 
 logger = logging.getLogger(__name__)
 
@@ -43,7 +44,11 @@ class AdminOverrideMiddleware:
                     db = await anext(db_gen) if hasattr(db_gen, '__anext__') else next(db_gen)
                     
                     try:
-                        admin = db.query(Admin).filter(Admin.email == subject).first()
+                        cache_key = (user_type, subject, payload.get("exp"))
+                        admin = principal_cache.get(cache_key, db)
+                        if admin is None:
+                            admin = db.query(Admin).filter(Admin.email == subject).first()
+                            principal_cache.put(cache_key, admin)
                         if admin and admin.is_active:
                             
                             request.state.is_admin = True
@@ -31,6 +31,11 @@ from .iot_device import (
 )
 
 from .notification import Notification
+from .vital_rollup import VitalRollup
+from .daily_health_summary import DailyHealthSummary
+from .patient_latest_state import PatientLatestState
+from .conversation import Conversation
+from .unread_counter import UnreadCounter
 
 __all__ = [
     
@@ -67,5 +72,10 @@ __all__ = [
     "VitalReading",
     
     
-    "Notification"
+    "Notification",
+    "VitalRollup",
+    "DailyHealthSummary",
+    "PatientLatestState",
+    "Conversation",
+    "UnreadCounter"
 ]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -39,6 +39,14 @@ class CaregiverRelationship(Base):
     caregiver = relationship("User", foreign_keys=[caregiver_id], back_populates="caregiving_relationships")
     patient = relationship("User", foreign_keys=[patient_id], back_populates="caregiver_relationships")
 
+def _pair_low(context):
+    params = context.get_current_parameters()
+    return min(params["sender_id"], params["receiver_id"])
+
+def _pair_high(context):
+    params = context.get_current_parameters()
+    return max(params["sender_id"], params["receiver_id"])
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -49,5 +57,13 @@ class Message(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # The conversation pair, ordered, so one index serves both directions
+    user_low_id = Column(Integer, default=_pair_low)
+    user_high_id = Column(Integer, default=_pair_high)
+
     sender = relationship("User", foreign_keys=[sender_id], backref="sent_messages")
-    receiver = relationship("User", foreign_keys=[receiver_id], backref="received_messages")
\ No newline at end of file
+    receiver = relationship("User", foreign_keys=[receiver_id], backref="received_messages")
+
+    __table_args__ = (
+        Index("ix_messages_pair_created", "user_low_id", "user_high_id", "created_at", "id"),
+    )
\ No newline at end of file
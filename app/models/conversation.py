@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class Conversation(Base):
+    """One row per messaging pair (user_low_id < user_high_id), kept in step with messages"""
+    __tablename__ = "conversations"
+
+    user_low_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    user_high_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    last_message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    last_sender_id = Column(Integer, nullable=False)
+    last_message_preview = Column(String(200))
+    last_message_at = Column(DateTime(timezone=True), nullable=False)
+
+    # Messages each side has not read yet
+    unread_low = Column(Integer, nullable=False, default=0)
+    unread_high = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_conversations_low_activity", "user_low_id", "last_message_at"),
+        Index("ix_conversations_high_activity", "user_high_id", "last_message_at"),
+    )
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, Date, DateTime, Float, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class DailyHealthSummary(Base):
+    """Per user, per day totals kept up to date by every health write path"""
+    __tablename__ = "daily_health_summary"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    # POST /health/health-data
+    health_entries = Column(Integer, nullable=False, default=0)
+    steps = Column(Integer, nullable=False, default=0)
+    water_intake = Column(Integer, nullable=False, default=0)
+    calories_burned = Column(Integer, nullable=False, default=0)
+
+    # Health data and IoT vitals
+    heart_rate_sum = Column(Float, nullable=False, default=0)
+    heart_rate_count = Column(Integer, nullable=False, default=0)
+    glucose_sum = Column(Float, nullable=False, default=0)
+    glucose_count = Column(Integer, nullable=False, default=0)
+    vital_count = Column(Integer, nullable=False, default=0)
+    emergency_count = Column(Integer, nullable=False, default=0)
+
+    # Food logs and meal analyses
+    meal_count = Column(Integer, nullable=False, default=0)
+    diet_score_total = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    @property
+    def diet_score_avg(self):
+        return self.diet_score_total // self.meal_count if self.meal_count else 0
+
+    @property
+    def heart_rate_avg(self):
+        return self.heart_rate_sum / self.heart_rate_count if self.heart_rate_count else None
+
+    @property
+    def glucose_avg(self):
+        return self.glucose_sum / self.glucose_count if self.glucose_count else None
@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Text, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship  
 from app.database import Base
@@ -21,6 +21,10 @@ class HealthData(Base):
     
     
     user = relationship("User", back_populates="health_data")
+    
+    __table_args__ = (
+        Index("ix_health_data_user_date", "user_id", "date"),
+    )
 
 class FoodLog(Base):
     __tablename__ = "food_logs"
@@ -34,6 +38,10 @@ class FoodLog(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="food_logs")
+    
+    __table_args__ = (
+        Index("ix_food_logs_user_created", "user_id", "created_at"),
+    )
 
 class WeeklyProgress(Base):
     __tablename__ = "weekly_progress"
@@ -49,6 +57,10 @@ class WeeklyProgress(Base):
     water_goal = Column(Integer, default=2000)
     
     user = relationship("User", back_populates="weekly_progress")
+    
+    __table_args__ = (
+        Index("ix_weekly_progress_user_week", "user_id", "week_start_date"),
+    )
 
 class HealthInsight(Base):
     __tablename__ = "health_insights"
@@ -6,6 +6,7 @@ from sqlalchemy import (
     Boolean,
     ForeignKey,
     Float,
+    Index,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -45,6 +46,13 @@ class VitalReading(Base):
     movement = Column(Integer)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     is_emergency = Column(Boolean, default=False)
+    # Set by the write-behind buffer so a spool replay can skip stored readings
+    ingest_key = Column(String(32), nullable=True)
 
     device = relationship("IoTDevice", back_populates="vital_readings")
     user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_vital_readings_user_timestamp", "user_id", "timestamp"),
+        Index("ix_vital_readings_ingest_key", "ingest_key", unique=True),
+    )
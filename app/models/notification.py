@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -16,4 +16,10 @@ class Notification(Base):
     sender_type = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    user = relationship("User", back_populates="notifications")
\ No newline at end of file
+    user = relationship("User", back_populates="notifications")
+    
+    # Per-type feed pages (id breaks created_at ties) and retention sweeps
+    __table_args__ = (
+        Index("ix_notifications_user_type_created", "user_id", "notification_type", "created_at", "id"),
+        Index("ix_notifications_created", "created_at"),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class PatientLatestState(Base):
+    """Last known vitals per patient, merged from health data and IoT readings"""
+    __tablename__ = "patient_latest_state"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    heart_rate = Column(Float)
+    blood_pressure = Column(String)
+    blood_glucose = Column(Float)
+    blood_oxygen = Column(Float)
+    temperature = Column(Float)
+    status = Column(String, nullable=False, default="stable")  # stable / monitor / critical
+    measured_at = Column(DateTime, nullable=False)
+    health_data_id = Column(Integer)  # latest health_data row, for snapshots
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_patient_latest_state_status", "status", "measured_at"),
+    )
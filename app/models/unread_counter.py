@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class UnreadCounter(Base):
+    """Unread notifications and messages per user, kept in step with both tables"""
+    __tablename__ = "unread_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    notifications = Column(Integer, nullable=False, default=0)
+    messages = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
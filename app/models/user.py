@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from sqlalchemy import event
@@ -100,6 +100,10 @@ class UserProfile(Base):
     
     user = relationship("User", back_populates="profile")
     assigned_doctor = relationship("Doctor", back_populates="patients")
+    
+    __table_args__ = (
+        Index("ix_user_profiles_doctor_completed", "doctor_id", "profile_completed"),
+    )
 
 class UserDevice(Base):
     __tablename__ = "user_devices"
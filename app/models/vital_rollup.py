@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, UniqueConstraint, Index
+from app.database import Base
+
+
+class VitalRollup(Base):
+    """Per user, metric and time bucket aggregate of vitals"""
+    __tablename__ = "vital_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    metric = Column(String, nullable=False)
+    granularity = Column(String, nullable=False)  # minute / hour / day
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    sum = Column(Float, nullable=False, default=0)
+    min = Column(Float)
+    max = Column(Float)
+    last_value = Column(Float)
+    last_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "metric", "granularity", "bucket_start",
+                         name="uq_vital_rollups_bucket"),
+        Index("ix_vital_rollups_metric_bucket", "metric", "granularity", "bucket_start"),
+    )
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 import secrets
 from app.database import get_db
-from app.auth.hashing import get_password_hash
+from app.auth.hashing import get_password_hash_async
 from app.auth.security import get_current_admin  
 from app.models.caregiver import Doctor
 
@@ -55,7 +55,7 @@ async def create_doctor(
         )
     
     initial_password = secrets.token_urlsafe(8)
-    hashed_password = get_password_hash(initial_password)
+    hashed_password = await get_password_hash_async(initial_password)
     
     
     doctor_data = {
@@ -13,7 +13,8 @@ import jwt
 import logging
 from app.database import get_db
 from app.auth.security import create_access_token, verify_password, get_password_hash, get_current_user,    get_current_admin, get_current_user_or_admin,get_current_active_user_or_admin 
-from app.auth.hashing import verify_password as verify_pass, get_password_hash as get_pass_hash
+from app.auth.hashing import verify_password_async, verify_and_update_async, get_password_hash_async
+from app.auth.principal_cache import invalidate_principal
 from app.models.user import User
 from app.models.auth import PasswordResetToken, EmailVerificationToken, LoginOTP, RefreshToken, UserSession
 from app.services.email_service import email_service
@@ -336,7 +337,7 @@ async def signup(
             )
     
     # Create new user with proper fields
-    hashed_password = get_pass_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     logger.info(f"Password hashed for {email}")
     
     user = User(
@@ -424,13 +425,18 @@ async def login_patient(
     
     logger.info(f"User found: {user.id}, is_caregiver: {user.is_caregiver}")
     
-    password_valid = verify_pass(login_data.password, user.hashed_password)
+    password_valid, new_hash = await verify_and_update_async(login_data.password, user.hashed_password)
     logger.info(f"Password verification result: {password_valid}")
     
     if not password_valid:
         logger.warning(f"Login failed: Invalid password for user {user.id}")
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    if new_hash:
+        # Stored hash used an outdated scheme or cost
+        user.hashed_password = new_hash
+        logger.info(f"Password rehashed for user {user.id}")
+
     user.last_login = datetime.utcnow()
     db.commit()
     logger.info(f"Login successful for user {user.id}")
@@ -484,7 +490,7 @@ async def signup_caregiver(
     new_user = User(
         email=email,
         username=username,
-        hashed_password=get_pass_hash(caregiver_data.password),
+        hashed_password=await get_password_hash_async(caregiver_data.password),
         first_name=caregiver_data.first_name,
         last_name=caregiver_data.last_name,
         phone_number=caregiver_data.phone_number,
@@ -585,7 +591,7 @@ async def reset_password(
         )
     
     
-    user.hashed_password = get_pass_hash(request_data.new_password)
+    user.hashed_password = await get_password_hash_async(request_data.new_password)
     reset_token.is_used = True
     
     
@@ -595,6 +601,7 @@ async def reset_password(
     db.query(UserSession).filter(UserSession.user_id == user.id).update({"is_active": False})
     
     db.commit()
+    invalidate_principal(user)
     
     return {"message": "Password reset successfully"}
 
@@ -800,28 +807,26 @@ async def change_password(
     db: Session = Depends(get_db)
 ):
     """Change password (works for both users and admins)"""
-    from app.auth.hashing import verify_password as verify_pass
-    
-    
     if isinstance(current, Admin):
-        if not verify_pass(request_data.current_password, current.hashed_password):
+        if not await verify_password_async(request_data.current_password, current.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
             )
-        current.hashed_password = get_pass_hash(request_data.new_password)
+        current.hashed_password = await get_password_hash_async(request_data.new_password)
     else:
-        if not verify_pass(request_data.current_password, current.hashed_password):
+        if not await verify_password_async(request_data.current_password, current.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
             )
-        current.hashed_password = get_pass_hash(request_data.new_password)
+        current.hashed_password = await get_password_hash_async(request_data.new_password)
         
         
         db.query(RefreshToken).filter(RefreshToken.user_id == current.id).update({"is_revoked": True})
     
     db.commit()
+    invalidate_principal(current)
     
     return {"message": "Password changed successfully"}
 
@@ -869,13 +874,14 @@ async def logout(
 ):
     """Logout user or admin"""
     if isinstance(current, Admin):
-        
+        invalidate_principal(current)
         return {"message": "Admin logged out successfully"}
     
     
     db.query(RefreshToken).filter(RefreshToken.user_id == current.id).update({"is_revoked": True})
     db.query(UserSession).filter(UserSession.user_id == current.id).update({"is_active": False})
     db.commit()
+    invalidate_principal(current)
     
     return {"message": "Logged out successfully"}
 
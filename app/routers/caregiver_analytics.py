@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, select
 from typing import List, Dict, Any
 from datetime import datetime, date, timedelta
 import statistics
@@ -9,7 +10,8 @@ from app.database import get_db
 from app.auth.security import get_current_user
 from app.models.user import User
 from app.models.caregiver import CaregiverRelationship
-from app.models.health import HealthData
+from app.services.vital_analytics import load_window, metric_reports
+from app.utils.sql import seconds_between
 from app.models.caregiver_tasks import CaregiverTask, TaskStatus
 from app.models.caregiver_schedule import CaregiverSchedule, AppointmentStatus
 
@@ -54,11 +56,8 @@ async def get_patient_analytics(
     
     start_date = datetime.utcnow() - timedelta(days=days)
     
-    # Health data analysis
-    health_data = db.query(HealthData).filter(
-        HealthData.user_id == patient_id,
-        HealthData.created_at >= start_date
-    ).order_by(HealthData.created_at).all()
+    # Health data analysis from the vital rollups, one bucket per day/hour
+    health_window = load_window(db, [patient_id], TRACKED_METRICS, start_date)
     
     # Task analysis
     tasks = db.query(CaregiverTask).filter(
@@ -73,7 +72,7 @@ async def get_patient_analytics(
     ).all()
     
     # Analyze health trends
-    health_trends = analyze_health_trends(health_data)
+    health_trends = analyze_health_trends(metric_reports(health_window, TREND_METRICS)[patient_id])
     
     # Analyze task performance
     task_analytics = analyze_task_performance(tasks)
@@ -106,18 +105,22 @@ async def get_patient_analytics(
         "recommendations": generate_recommendations(health_trends, risk_assessment)
     }
 
-def analyze_health_trends(health_data: List[HealthData]) -> Dict[str, Any]:
-    """Analyze health data trends"""
-    
-    trends = {
-        "heart_rate": analyze_metric_trend(health_data, "heart_rate"),
-        "blood_pressure": analyze_metric_trend(health_data, "blood_pressure"),
-        "blood_glucose": analyze_metric_trend(health_data, "blood_glucose"),
-        "weight": analyze_metric_trend(health_data, "weight"),
-        "sleep_time": analyze_metric_trend(health_data, "sleep_time"),
-        "steps": analyze_metric_trend(health_data, "steps"),
-        "water_intake": analyze_metric_trend(health_data, "water_intake")
-    }
+# Trend name -> rollup metric (None: not tracked by any ingest path)
+TREND_METRICS = {
+    "heart_rate": "heart_rate",
+    "blood_pressure": "blood_pressure_systolic",
+    "blood_glucose": "blood_glucose",
+    "weight": None,
+    "sleep_time": "sleep_time",
+    "steps": "steps",
+    "water_intake": "water_intake",
+}
+TRACKED_METRICS = [metric for metric in TREND_METRICS.values() if metric]
+
+def analyze_health_trends(reports: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Analyze health data trends from per-metric reports (see vital_analytics)"""
+    
+    trends = dict(reports)
     
     # Calculate overall health trend
     metric_trends = [t["trend"] for t in trends.values() if t["has_data"]]
@@ -138,75 +141,10 @@ def analyze_health_trends(health_data: List[HealthData]) -> Dict[str, Any]:
     trends["overall_trend"] = overall_trend
     return trends
 
-def analyze_metric_trend(health_data: List[HealthData], metric_name: str) -> Dict[str, Any]:
-    """Analyze trend for a specific metric"""
-    
-    metric_data = []
-    for data in health_data:
-        value = getattr(data, metric_name, None)
-        if value is not None:
-            metric_data.append({
-                "value": value,
-                "timestamp": data.created_at,
-                "is_critical": getattr(data, 'is_critical', False)
-            })
-    
-    if not metric_data:
-        return {
-            "has_data": False,
-            "message": f"No {metric_name.replace('_', ' ')} data available"
-        }
-    
-    # Calculate statistics
-    values = [d["value"] for d in metric_data]
-    recent_values = values[-5:] if len(values) >= 5 else values
-    
-    # Determine trend
-    if len(values) >= 2:
-        first_half_avg = statistics.mean(values[:len(values)//2])
-        second_half_avg = statistics.mean(values[len(values)//2:])
-        
-        if second_half_avg > first_half_avg * 1.1:
-            trend = "improving"
-        elif second_half_avg < first_half_avg * 0.9:
-            trend = "declining"
-        else:
-            trend = "stable"
-    else:
-        trend = "stable"
-    
-    # Check for critical values
-    critical_count = sum(1 for d in metric_data if d["is_critical"])
-    
-    return {
-        "has_data": True,
-        "average": statistics.mean(values) if values else 0,
-        "min": min(values) if values else 0,
-        "max": max(values) if values else 0,
-        "recent_average": statistics.mean(recent_values) if recent_values else 0,
-        "trend": trend,
-        "data_points": len(values),
-        "critical_count": critical_count,
-        "latest_value": values[-1] if values else None,
-        "latest_timestamp": metric_data[-1]["timestamp"].isoformat() if metric_data else None
-    }
-
 def analyze_task_performance(tasks: List[CaregiverTask]) -> Dict[str, Any]:
     """Analyze task performance"""
     
-    if not tasks:
-        return {
-            "total_tasks": 0,
-            "completion_rate": 0,
-            "average_completion_time": 0,
-            "overdue_rate": 0
-        }
-    
-    total_tasks = len(tasks)
     completed_tasks = [t for t in tasks if t.status == TaskStatus.COMPLETED]
-    overdue_tasks = [t for t in tasks if t.is_overdue()]
-    
-    completion_rate = len(completed_tasks) / total_tasks * 100 if total_tasks > 0 else 0
     
     # Calculate average completion time (for completed tasks)
     completion_times = []
@@ -215,30 +153,54 @@ def analyze_task_performance(tasks: List[CaregiverTask]) -> Dict[str, Any]:
             completion_time = (task.completed_at - task.due_date).total_seconds() / 3600  # hours
             completion_times.append(completion_time)
     
-    avg_completion_time = statistics.mean(completion_times) if completion_times else 0
-    
-    overdue_rate = len(overdue_tasks) / total_tasks * 100 if total_tasks > 0 else 0
-    
     # Task type distribution
     task_types = {}
     for task in tasks:
         task_type = task.task_type or "other"
         task_types[task_type] = task_types.get(task_type, 0) + 1
     
+    return task_performance(
+        len(tasks), len(completed_tasks), len([t for t in tasks if t.is_overdue()]),
+        statistics.mean(completion_times) if completion_times else 0, task_types
+    )
+
+def task_performance(total_tasks: int, completed: int, overdue: int,
+                     avg_completion_time: float, task_types: Dict[str, int]) -> Dict[str, Any]:
+    if not total_tasks:
+        return {
+            "total_tasks": 0,
+            "completion_rate": 0,
+            "average_completion_time": 0,
+            "overdue_rate": 0
+        }
+    
     return {
         "total_tasks": total_tasks,
-        "completed_tasks": len(completed_tasks),
-        "completion_rate": round(completion_rate, 1),
+        "completed_tasks": completed,
+        "completion_rate": round(completed / total_tasks * 100, 1),
         "average_completion_time": round(avg_completion_time, 1),
-        "overdue_tasks": len(overdue_tasks),
-        "overdue_rate": round(overdue_rate, 1),
+        "overdue_tasks": overdue,
+        "overdue_rate": round(overdue / total_tasks * 100, 1),
         "task_type_distribution": task_types
     }
 
 def analyze_appointment_adherence(appointments: List[CaregiverSchedule]) -> Dict[str, Any]:
     """Analyze appointment adherence"""
     
-    if not appointments:
+    status_counts = {}
+    appointment_types = {}
+    for appointment in appointments:
+        # Freshly created rows still hold the enum members
+        status_value = getattr(appointment.status, "value", appointment.status)
+        status_counts[status_value] = status_counts.get(status_value, 0) + 1
+        app_type = getattr(appointment.appointment_type, "value", appointment.appointment_type)
+        appointment_types[app_type] = appointment_types.get(app_type, 0) + 1
+    
+    return appointment_adherence(len(appointments), status_counts, appointment_types)
+
+def appointment_adherence(total_appointments: int, status_counts: Dict[str, int],
+                          appointment_types: Dict[str, int]) -> Dict[str, Any]:
+    if not total_appointments:
         return {
             "total_appointments": 0,
             "attendance_rate": 0,
@@ -246,29 +208,18 @@ def analyze_appointment_adherence(appointments: List[CaregiverSchedule]) -> Dict
             "no_show_rate": 0
         }
     
-    total_appointments = len(appointments)
-    completed = [a for a in appointments if a.status == AppointmentStatus.COMPLETED]
-    cancelled = [a for a in appointments if a.status == AppointmentStatus.CANCELLED]
-    no_show = [a for a in appointments if a.status == AppointmentStatus.NO_SHOW]
-    
-    attendance_rate = len(completed) / total_appointments * 100 if total_appointments > 0 else 0
-    cancellation_rate = len(cancelled) / total_appointments * 100 if total_appointments > 0 else 0
-    no_show_rate = len(no_show) / total_appointments * 100 if total_appointments > 0 else 0
-    
-    # Appointment type distribution
-    appointment_types = {}
-    for appointment in appointments:
-        app_type = appointment.appointment_type.value
-        appointment_types[app_type] = appointment_types.get(app_type, 0) + 1
+    completed = status_counts.get(AppointmentStatus.COMPLETED.value, 0)
+    cancelled = status_counts.get(AppointmentStatus.CANCELLED.value, 0)
+    no_show = status_counts.get(AppointmentStatus.NO_SHOW.value, 0)
     
     return {
         "total_appointments": total_appointments,
-        "completed": len(completed),
-        "cancelled": len(cancelled),
-        "no_show": len(no_show),
-        "attendance_rate": round(attendance_rate, 1),
-        "cancellation_rate": round(cancellation_rate, 1),
-        "no_show_rate": round(no_show_rate, 1),
+        "completed": completed,
+        "cancelled": cancelled,
+        "no_show": no_show,
+        "attendance_rate": round(completed / total_appointments * 100, 1),
+        "cancellation_rate": round(cancelled / total_appointments * 100, 1),
+        "no_show_rate": round(no_show / total_appointments * 100, 1),
         "appointment_type_distribution": appointment_types
     }
 
@@ -442,4 +393,150 @@ async def get_comparative_analytics(
             "by_score": sorted(comparative_data.items(), key=lambda x: x[1]["overall_score"], reverse=True)[:5],
             "by_risk": [item for item in comparative_data.items() if item[1]["risk_level"] != "low"][:5]
         }
-    }
\ No newline at end of file
+    }
+RISK_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+def panel_task_query(db, patient_ids: List[int], start_date: datetime):
+    completed = CaregiverTask.status == TaskStatus.COMPLETED.value
+    timed = and_(completed, CaregiverTask.due_date.is_not(None), CaregiverTask.completed_at.is_not(None))
+    return (
+        select(
+            CaregiverTask.patient_id,
+            func.coalesce(CaregiverTask.task_type, "other").label("task_type"),
+            func.count().label("total"),
+            func.count().filter(completed).label("completed"),
+            func.count().filter(
+                ~completed, CaregiverTask.due_date < datetime.utcnow()
+            ).label("overdue"),
+            func.sum(seconds_between(db, CaregiverTask.completed_at, CaregiverTask.due_date) / 3600.0)
+            .filter(timed).label("completion_hours"),
+            func.count().filter(timed).label("timed"),
+        )
+        .where(CaregiverTask.patient_id.in_(patient_ids), CaregiverTask.created_at >= start_date)
+        .group_by(CaregiverTask.patient_id, func.coalesce(CaregiverTask.task_type, "other"))
+    )
+
+def panel_appointment_query(patient_ids: List[int], start_date: datetime):
+    return (
+        select(
+            CaregiverSchedule.patient_id,
+            CaregiverSchedule.appointment_type,
+            CaregiverSchedule.status,
+            func.count().label("total"),
+        )
+        .where(CaregiverSchedule.patient_id.in_(patient_ids), CaregiverSchedule.created_at >= start_date)
+        .group_by(CaregiverSchedule.patient_id, CaregiverSchedule.appointment_type, CaregiverSchedule.status)
+    )
+
+@router.get("/panel")
+async def get_panel_analytics(
+    days: int = Query(30, description="Number of days to analyze"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Analytics for every approved patient in four grouped queries, with the
+    panel ranked by risk (highest first)
+    """
+    
+    if not getattr(current_user, 'is_caregiver', False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not a caregiver"
+        )
+    
+    patients = db.execute(
+        select(User.id, User.username, User.email, User.patient_id)
+        .join(CaregiverRelationship, CaregiverRelationship.patient_id == User.id)
+        .where(
+            CaregiverRelationship.caregiver_id == current_user.id,
+            CaregiverRelationship.status == "approved"
+        )
+        .distinct()
+        .order_by(User.id)
+    ).all()
+    patient_ids = [patient.id for patient in patients]
+    start_date = datetime.utcnow() - timedelta(days=days)
+    
+    health_reports = {}
+    tasks = {patient_id: {"total": 0, "completed": 0, "overdue": 0, "hours": 0.0, "timed": 0, "types": {}}
+             for patient_id in patient_ids}
+    appointments = {patient_id: {"total": 0, "statuses": {}, "types": {}} for patient_id in patient_ids}
+    
+    if patient_ids:
+        health_reports = metric_reports(
+            load_window(db, patient_ids, TRACKED_METRICS, start_date), TREND_METRICS
+        )
+        
+        for row in db.execute(panel_task_query(db, patient_ids, start_date)):
+            counts = tasks[row.patient_id]
+            counts["total"] += row.total
+            counts["completed"] += row.completed
+            counts["overdue"] += row.overdue
+            counts["hours"] += row.completion_hours or 0.0
+            counts["timed"] += row.timed
+            counts["types"][row.task_type] = row.total
+        
+        for row in db.execute(panel_appointment_query(patient_ids, start_date)):
+            counts = appointments[row.patient_id]
+            counts["total"] += row.total
+            counts["statuses"][row.status] = counts["statuses"].get(row.status, 0) + row.total
+            counts["types"][row.appointment_type] = counts["types"].get(row.appointment_type, 0) + row.total
+    
+    panel = []
+    for patient in patients:
+        task_counts = tasks[patient.id]
+        appointment_counts = appointments[patient.id]
+        health_trends = analyze_health_trends(health_reports[patient.id])
+        task_analytics = task_performance(
+            task_counts["total"], task_counts["completed"], task_counts["overdue"],
+            task_counts["hours"] / task_counts["timed"] if task_counts["timed"] else 0,
+            task_counts["types"]
+        )
+        appointment_analytics = appointment_adherence(
+            appointment_counts["total"], appointment_counts["statuses"], appointment_counts["types"]
+        )
+        risk_assessment = assess_health_risk(health_trends)
+        panel.append({
+            "patient_info": {
+                "id": patient.id,
+                "name": patient.username or patient.email,
+                "patient_id": patient.patient_id
+            },
+            "health_trends": health_trends,
+            "task_analytics": task_analytics,
+            "appointment_analytics": appointment_analytics,
+            "overall_score": calculate_health_score(health_trends, task_analytics, appointment_analytics),
+            "risk_assessment": risk_assessment,
+        })
+    
+    panel.sort(key=lambda item: (
+        RISK_ORDER[item["risk_assessment"]["risk_level"]],
+        -item["risk_assessment"]["total_risk_factors"],
+        item["overall_score"],
+    ))
+    
+    return {
+        "analysis_period": {
+            "days": days,
+            "start_date": start_date.isoformat(),
+            "end_date": datetime.utcnow().isoformat()
+        },
+        "total_patients": len(panel),
+        "risk_summary": {
+            level: sum(1 for item in panel if item["risk_assessment"]["risk_level"] == level)
+            for level in RISK_ORDER
+        },
+        "risk_ranking": [
+            {
+                "rank": rank,
+                "patient_id": item["patient_info"]["id"],
+                "patient_name": item["patient_info"]["name"],
+                "risk_level": item["risk_assessment"]["risk_level"],
+                "risk_factors": item["risk_assessment"]["risk_factors"],
+                "overall_score": item["overall_score"]
+            }
+            for rank, item in enumerate(panel, 1)
+        ],
+        "patients": panel
+    }
@@ -1,19 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
 from datetime import datetime, timedelta, date
+import asyncio
 import logging
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_async_db, sibling_session
 from app.auth.security import get_current_user
 from app.models.user import User
 from app.models.caregiver import CaregiverRelationship
 from app.models.health import HealthData
+from app.models.notification import Notification
+from app.models.patient_latest_state import PatientLatestState
 from app.models.caregiver_tasks import CaregiverTask, TaskStatus
 from app.models.caregiver_schedule import CaregiverSchedule, AppointmentStatus
+from app.services.rollups import load_rollups, summarize
 from app.schemas.caregiver_dashboard import (
     CaregiverDashboardResponse, DashboardStats, PatientOverview,
-    TaskOverview, AppointmentOverview, AlertItem, VitalTrend
+    TaskOverview, AppointmentOverview, AlertItem, VitalTrend, RecentActivity
 )
 
 router = APIRouter(prefix="/caregivers", tags=["caregiver_dashboard"])
@@ -22,7 +29,7 @@ logger = logging.getLogger(__name__)
 @router.get("/dashboard", response_model=CaregiverDashboardResponse)
 async def get_caregiver_dashboard(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not getattr(current_user, 'is_caregiver', False):
         raise HTTPException(
@@ -30,20 +37,26 @@ async def get_caregiver_dashboard(
             detail="User is not a caregiver"
         )
     
-    relationships = db.query(CaregiverRelationship).filter(
+    relationships = (await db.scalars(select(CaregiverRelationship).where(
         CaregiverRelationship.caregiver_id == current_user.id,
         CaregiverRelationship.status == "approved"
-    ).all()
-    
+    ))).all()
     patient_ids = [rel.patient_id for rel in relationships]
-    patients = db.query(User).filter(User.id.in_(patient_ids)).all()
     
-    stats = calculate_dashboard_stats(current_user.id, patient_ids, db)
-    recent_patients = get_recent_patients(patients, db)
-    upcoming_tasks = get_upcoming_tasks(current_user.id, db)
-    todays_appointments = get_todays_appointments(current_user.id, db)
-    recent_alerts = get_recent_alerts(patient_ids, db)
-    vital_trends = get_vital_trends(patient_ids, db)
+    patients = (await db.scalars(
+        select(User).where(User.id.in_(patient_ids)).options(selectinload(User.profile))
+    )).all()
+    
+    sections = [
+        lambda session: calculate_dashboard_stats(current_user.id, patient_ids, session),
+        lambda session: get_recent_patients(patients, session),
+        lambda session: get_upcoming_tasks(current_user.id, session),
+        lambda session: get_todays_appointments(current_user.id, session),
+        lambda session: get_recent_alerts(patient_ids, session),
+        lambda session: get_vital_trends(patient_ids, session),
+    ]
+    (stats, recent_patients, upcoming_tasks, todays_appointments,
+     recent_alerts, vital_trends) = await build_sections(db, sections)
     
     caregiver_info = {
         "id": current_user.id,
@@ -54,7 +67,21 @@ async def get_caregiver_dashboard(
         "experience_years": getattr(current_user, 'experience_years', 0)
     }
     
+    recent_activity = [
+        RecentActivity(
+            patient_id=rel.patient_id,
+            relationship_type=rel.relationship_type,
+            status=rel.status,
+            since=rel.created_at
+        )
+        for rel in relationships[:5]
+    ]
+    
     return CaregiverDashboardResponse(
+        total_patients=stats.total_patients,
+        pending_requests=stats.pending_requests,
+        caregiver_status="active",
+        recent_activity=recent_activity,
         stats=stats,
         recent_patients=recent_patients,
         upcoming_tasks=upcoming_tasks,
@@ -65,98 +92,125 @@ async def get_caregiver_dashboard(
         last_updated=datetime.utcnow()
     )
 
-def calculate_dashboard_stats(caregiver_id: int, patient_ids: List[int], db: Session) -> DashboardStats:
-    total_patients = len(patient_ids)
-    
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    active_patients = db.query(HealthData.user_id).filter(
-        HealthData.user_id.in_(patient_ids),
-        HealthData.created_at >= week_ago
-    ).distinct().count()
+async def build_sections(db, sections: list) -> list:
+    """
+    Run independent section builders (sync Session API, through run_sync)
+    in at most CAREGIVER_DASHBOARD_SESSIONS concurrent lanes. The request's
+    session is the first lane; the others are sibling sessions on its bind,
+    so one dashboard never holds more pooled connections than that.
+    """
+    lanes = max(1, min(settings.CAREGIVER_DASHBOARD_SESSIONS, len(sections)))
     
-    critical_patients = 0
+    def run_lane(builds):
+        return lambda session: [build(session) for build in builds]
     
-    pending_tasks = db.query(CaregiverTask).filter(
-        CaregiverTask.caregiver_id == caregiver_id,
-        CaregiverTask.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS])
-    ).count()
-    
-    completed_tasks = db.query(CaregiverTask).filter(
-        CaregiverTask.caregiver_id == caregiver_id,
-        CaregiverTask.status == TaskStatus.COMPLETED,
-        CaregiverTask.completed_at >= datetime.utcnow() - timedelta(days=7)
-    ).count()
-    
-    overdue_tasks = db.query(CaregiverTask).filter(
-        CaregiverTask.caregiver_id == caregiver_id,
-        CaregiverTask.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS]),
-        CaregiverTask.due_date < datetime.utcnow()
-    ).count()
+    async def lane(index: int):
+        builds = sections[index::lanes]
+        if index == 0:
+            return await db.run_sync(run_lane(builds))
+        async with sibling_session(db) as session:
+            return await session.run_sync(run_lane(builds))
     
+    results = await asyncio.gather(*(lane(index) for index in range(lanes)))
+    return [results[position % lanes][position // lanes] for position in range(len(sections))]
+
+def calculate_dashboard_stats(caregiver_id: int, patient_ids: List[int], db: Session) -> DashboardStats:
+    """All dashboard counters in one statement of FILTERed counts"""
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
     today_start = datetime.combine(date.today(), datetime.min.time())
     today_end = datetime.combine(date.today(), datetime.max.time())
+    week_end = today_end + timedelta(days=7)
+    open_task = CaregiverTask.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS])
     
-    todays_appointments_count = db.query(CaregiverSchedule).filter(
-        CaregiverSchedule.caregiver_id == caregiver_id,
-        CaregiverSchedule.start_time.between(today_start, today_end)
-    ).count()
+    active_patients = select(func.count(HealthData.user_id.distinct())).where(
+        HealthData.user_id.in_(patient_ids),
+        HealthData.date >= week_ago
+    )
+    tasks = select(
+        func.count().filter(open_task).label("pending"),
+        func.count().filter(
+            CaregiverTask.status == TaskStatus.COMPLETED,
+            CaregiverTask.completed_at >= week_ago
+        ).label("completed"),
+        func.count().filter(open_task, CaregiverTask.due_date < now).label("overdue"),
+    ).where(CaregiverTask.caregiver_id == caregiver_id).subquery()
+    appointments = select(
+        func.count().filter(CaregiverSchedule.start_time.between(today_start, today_end)).label("today"),
+        func.count().filter(CaregiverSchedule.start_time.between(today_start, week_end)).label("week"),
+    ).where(CaregiverSchedule.caregiver_id == caregiver_id).subquery()
     
-    week_end = today_end + timedelta(days=7)
-    weekly_appointments = db.query(CaregiverSchedule).filter(
-        CaregiverSchedule.caregiver_id == caregiver_id,
-        CaregiverSchedule.start_time.between(today_start, week_end)
-    ).count()
+    critical_patients = select(func.count()).where(
+        PatientLatestState.user_id.in_(patient_ids),
+        PatientLatestState.status == "critical"
+    )
+    pending_requests = select(func.count()).where(
+        CaregiverRelationship.caregiver_id == caregiver_id,
+        CaregiverRelationship.status == "pending"
+    )
+    
+    counts = db.execute(select(
+        active_patients.scalar_subquery().label("active"),
+        critical_patients.scalar_subquery().label("critical"),
+        pending_requests.scalar_subquery().label("pending_requests"),
+        tasks.c.pending, tasks.c.completed, tasks.c.overdue,
+        appointments.c.today, appointments.c.week,
+    ).select_from(tasks).join(appointments, true())).one()
     
     return DashboardStats(
-        total_patients=total_patients,
-        active_patients=active_patients,
-        critical_patients=critical_patients,
-        pending_tasks=pending_tasks,
-        completed_tasks=completed_tasks,
-        overdue_tasks=overdue_tasks,
-        todays_appointments=todays_appointments_count,
-        weekly_appointments=weekly_appointments,
+        total_patients=len(patient_ids),
+        pending_requests=counts.pending_requests,
+        active_patients=counts.active,
+        critical_patients=counts.critical,
+        pending_tasks=counts.pending,
+        completed_tasks=counts.completed,
+        overdue_tasks=counts.overdue,
+        todays_appointments=counts.today,
+        weekly_appointments=counts.week,
         avg_health_score=85
     )
 
+def enum_value(field):
+    # Rows created in this session still hold the enum members
+    return getattr(field, "value", field)
+
 def get_recent_patients(patients: List[User], db: Session) -> List[PatientOverview]:
-    recent_patients = []
+    recent = patients[:5]
+    states = {
+        state.user_id: state
+        for state in db.scalars(select(PatientLatestState).where(
+            PatientLatestState.user_id.in_([patient.id for patient in recent])
+        ))
+    } if recent else {}
     
-    for patient in patients[:5]:
-        from app.models.user import UserProfile
-        profile = db.query(UserProfile).filter(UserProfile.user_id == patient.id).first()
-        
-        latest_health = db.query(HealthData).filter(
-            HealthData.user_id == patient.id
-        ).order_by(HealthData.created_at.desc()).first()
-        
-        status = "stable"
-        if latest_health:
-            if getattr(latest_health, 'is_critical', False):
-                status = "critical"
+    recent_patients = []
+    for patient in recent:
+        profile = patient.profile
+        latest = states.get(patient.id)
         
         recent_patients.append(PatientOverview(
             id=patient.id,
-            name=profile.full_name if profile else patient.username or patient.email,
+            name=profile.full_name if profile and profile.full_name else patient.username or patient.email,
             email=patient.email,
             patient_id=patient.patient_id or f"PAT{patient.id:06d}",
             age=profile.age if profile else None,
             gender=profile.gender if profile else None,
-            status=status,
-            health_score=latest_health.health_score if latest_health else 0,
-            last_checkup=latest_health.created_at if latest_health else None,
-            conditions=profile.chronic_conditions if profile else [],
+            status=latest.status if latest else "stable",
+            health_score=None if latest else 0,
+            last_checkup=latest.measured_at if latest else None,
+            conditions=(profile.chronic_conditions or []) if profile else [],
             recent_vitals={
-                "heart_rate": latest_health.heart_rate if latest_health else None,
-                "blood_pressure": latest_health.blood_pressure if latest_health else None,
-                "blood_glucose": latest_health.blood_glucose if latest_health else None
-            } if latest_health else None
+                "heart_rate": latest.heart_rate,
+                "blood_pressure": latest.blood_pressure,
+                "blood_glucose": latest.blood_glucose,
+                "blood_oxygen": latest.blood_oxygen
+            } if latest else None
         ))
     
     return recent_patients
 
 def get_upcoming_tasks(caregiver_id: int, db: Session) -> List[TaskOverview]:
-    tasks = db.query(CaregiverTask).filter(
+    tasks = db.query(CaregiverTask).options(joinedload(CaregiverTask.patient)).filter(
         CaregiverTask.caregiver_id == caregiver_id,
         CaregiverTask.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS])
     ).order_by(CaregiverTask.due_date).limit(10).all()
@@ -168,8 +222,8 @@ def get_upcoming_tasks(caregiver_id: int, db: Session) -> List[TaskOverview]:
             patient_id=task.patient_id,
             patient_name=task.patient.username if task.patient else "Unknown",
             task_type=task.task_type,
-            status=task.status.value,
-            priority=task.priority.value,
+            status=enum_value(task.status),
+            priority=enum_value(task.priority),
             due_date=task.due_date,
             is_overdue=task.is_overdue()
         )
@@ -180,7 +234,7 @@ def get_todays_appointments(caregiver_id: int, db: Session) -> List[AppointmentO
     today_start = datetime.combine(date.today(), datetime.min.time())
     today_end = datetime.combine(date.today(), datetime.max.time())
     
-    appointments = db.query(CaregiverSchedule).filter(
+    appointments = db.query(CaregiverSchedule).options(joinedload(CaregiverSchedule.patient)).filter(
         CaregiverSchedule.caregiver_id == caregiver_id,
         CaregiverSchedule.start_time.between(today_start, today_end),
         CaregiverSchedule.status.in_([AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED])
@@ -192,8 +246,8 @@ def get_todays_appointments(caregiver_id: int, db: Session) -> List[AppointmentO
             title=appointment.title,
             patient_id=appointment.patient_id,
             patient_name=appointment.patient.username if appointment.patient else "Unknown",
-            appointment_type=appointment.appointment_type.value,
-            status=appointment.status.value,
+            appointment_type=enum_value(appointment.appointment_type),
+            status=enum_value(appointment.status),
             start_time=appointment.start_time,
             end_time=appointment.end_time,
             location=appointment.location,
@@ -203,9 +257,7 @@ def get_todays_appointments(caregiver_id: int, db: Session) -> List[AppointmentO
     ]
 
 def get_recent_alerts(patient_ids: List[int], db: Session) -> List[AlertItem]:
-    from app.models.notification import Notification
-    
-    alerts = db.query(Notification).filter(
+    alerts = db.query(Notification).options(joinedload(Notification.user)).filter(
         Notification.user_id.in_(patient_ids),
         Notification.notification_type.in_(["critical", "warning"])
     ).order_by(Notification.created_at.desc()).limit(5).all()
@@ -227,21 +279,16 @@ def get_recent_alerts(patient_ids: List[int], db: Session) -> List[AlertItem]:
 def get_vital_trends(patient_ids: List[int], db: Session) -> List[VitalTrend]:
     trends = []
     week_ago = datetime.utcnow() - timedelta(days=7)
-    heart_data = db.query(HealthData).filter(
-        HealthData.user_id.in_(patient_ids),
-        HealthData.heart_rate.isnot(None),
-        HealthData.created_at >= week_ago
-    ).all()
+    heart_rate = summarize(load_rollups(db, patient_ids, "heart_rate", week_ago))
     
-    if heart_data:
-        avg_heart_rate = sum(d.heart_rate for d in heart_data if d.heart_rate) / len(heart_data)
+    if heart_rate:
         trends.append(VitalTrend(
             metric="Heart Rate",
-            current_value=avg_heart_rate,
+            current_value=heart_rate["mean"],
             unit="bpm",
             trend="stable",
             change_percentage=0.0,
-            last_updated=datetime.utcnow()
+            last_updated=heart_rate["last_at"]
         ))
     
     return trends
\ No newline at end of file
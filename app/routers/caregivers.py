@@ -399,35 +399,3 @@ async def get_my_caregiver_id(
         "email": current_user.email,
         "qr_code_url": f"/caregivers/qr/{current_user.caregiver_id}"
     }
-
-@router.get("/dashboard")
-async def caregiver_dashboard(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get caregiver dashboard summary"""
-    verify_caregiver(current_user)
-    try:
-        relationships = get_approved_relationships(current_user.id, db)
-        patient_ids = [rel.patient_id for rel in relationships]
-        pending_count = db.query(CaregiverRelationship).filter(
-            CaregiverRelationship.caregiver_id == current_user.id,
-            CaregiverRelationship.status == "pending"
-        ).count()
-        return {
-            "total_patients": len(patient_ids),
-            "pending_requests": pending_count,
-            "caregiver_status": "active",
-            "recent_activity": [
-                {
-                    "patient_id": rel.patient_id,
-                    "relationship_type": rel.relationship_type,
-                    "status": rel.status,
-                    "since": rel.created_at
-                }
-                for rel in relationships[:5]
-            ]
-        }
-    except Exception:
-        logger.exception("Error building caregiver dashboard for caregiver_id=%s", getattr(current_user, "id", None))
-        raise HTTPException(status_code=500, detail="Failed to fetch caregiver dashboard")
\ No newline at end of file
@@ -3,7 +3,9 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import secrets
 from app.database import get_db
-from app.auth.security import create_access_token, verify_password, get_password_hash
+from app.auth.security import create_access_token
+from app.auth.hashing import verify_password_async, verify_and_update_async, get_password_hash_async
+from app.auth.principal_cache import invalidate_principal
 from app.models.caregiver import Doctor
 from app.models.user import UserSession
 from app.services.email_service import email_service
@@ -74,7 +76,8 @@ async def doctor_login(
             detail="Invalid doctor ID or password"
         )
     
-    if not verify_password(login_data.password, doctor.hashed_password):
+    password_valid, new_hash = await verify_and_update_async(login_data.password, doctor.hashed_password)
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid doctor ID or password"
@@ -86,6 +89,11 @@ async def doctor_login(
             detail="Doctor account is inactive"
         )
     
+    if new_hash:
+        # Stored hash used an outdated scheme or cost
+        doctor.hashed_password = new_hash
+        db.commit()
+    
     
     is_first_login = not doctor.email or doctor.created_by == "system"
     
@@ -142,7 +150,7 @@ async def doctor_first_login_setup(
     
     
     doctor.email = email
-    doctor.hashed_password = get_password_hash(new_password)
+    doctor.hashed_password = await get_password_hash_async(new_password)
     
     db.commit()
     
@@ -186,14 +194,15 @@ async def doctor_change_password(
     db: Session = Depends(get_db)
 ):
     """Doctor change password"""
-    if not verify_password(request_data.current_password, current_doctor.hashed_password):
+    if not await verify_password_async(request_data.current_password, current_doctor.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
-    current_doctor.hashed_password = get_password_hash(request_data.new_password)
+    current_doctor.hashed_password = await get_password_hash_async(request_data.new_password)
     db.commit()
+    invalidate_principal(current_doctor)
     
     
     if current_doctor.email:
@@ -249,6 +258,7 @@ async def doctor_logout(
     
     db.query(UserSession).filter(UserSession.user_id == current_doctor.id).update({"is_active": False})
     db.commit()
+    invalidate_principal(current_doctor)
     
     return {"message": "Logged out successfully"}
 
@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import enum
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import case, func, or_, select, tuple_
 from datetime import datetime, timedelta
 from app.database import get_db
 from app.auth.security import create_access_token, get_current_active_doctor
-from app.auth.hashing import verify_password
+from app.auth.hashing import verify_and_update_async
 from app.models.caregiver import Doctor
 from app.models.user import User, UserProfile
 from app.models.health import HealthData, FoodLog, WeeklyProgress
 from app.models.notification import Notification
+from app.models.patient_latest_state import PatientLatestState
+from app.services.latest_state import CRITICAL_HEART_RATE
+from app.services.daily_summary import summaries_query, combine
+from app.utils.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/doctors", tags=["doctors"])
 
@@ -40,8 +46,8 @@ async def doctor_login(
             detail="Invalid doctor ID or password"
         )
     
-    from app.auth.hashing import verify_password
-    if not verify_password(password, doctor.hashed_password):
+    password_valid, new_hash = await verify_and_update_async(password, doctor.hashed_password)
+    if not password_valid:
         print(f"Password verification failed for doctor: {doctor_id}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,6 +60,11 @@ async def doctor_login(
             detail="Doctor account is inactive"
         )
     
+    if new_hash:
+        # Stored hash used an outdated scheme or cost
+        doctor.hashed_password = new_hash
+        db.commit()
+    
     from app.auth.security import create_access_token
     access_token = create_access_token(
         data={"sub": doctor.doctor_id},
@@ -81,71 +92,128 @@ async def get_doctor_profile(
         "created_at": current_doctor.created_at
     }
 
+class PatientSort(str, enum.Enum):
+    STATUS = "status"
+    LAST_CHECKIN = "last_checkin"
+    NAME = "name"
+
+# Patients without any vitals yet sort as the oldest check-in
+NEVER = datetime(1970, 1, 1)
+SEVERITY = {"critical": 0, "monitor": 1}
+
+def status_severity():
+    return case(
+        (PatientLatestState.status == "critical", 0),
+        (PatientLatestState.status == "monitor", 1),
+        else_=2
+    )
+
+# Types of the values in each sort's cursor
+CURSOR_TYPES = {
+    PatientSort.NAME: (str, int),
+    PatientSort.LAST_CHECKIN: (datetime, int),
+    PatientSort.STATUS: (int, int),
+}
+
+def sort_key(sort: PatientSort):
+    """Key columns and whether the keyset runs descending"""
+    if sort == PatientSort.NAME:
+        return (func.coalesce(UserProfile.full_name, ""), User.id), False
+    if sort == PatientSort.LAST_CHECKIN:
+        return (func.coalesce(PatientLatestState.measured_at, NEVER), User.id), True
+    return (status_severity(), User.id), False
+
+def row_sort_key(sort: PatientSort, profile, user, latest) -> list:
+    if sort == PatientSort.NAME:
+        return [profile.full_name or "", user.id]
+    if sort == PatientSort.LAST_CHECKIN:
+        return [(latest.measured_at if latest else NEVER).isoformat(), user.id]
+    return [SEVERITY.get(latest.status if latest else None, 2), user.id]
+
+def patient_panel_query(doctor_id: str, status_filter: Optional[str] = None,
+                        sort: PatientSort = PatientSort.STATUS, after: Optional[list] = None):
+    """
+    A doctor's completed-profile patients with their latest state in one
+    indexed query, filtered by status and keyset-paginated on `sort`
+    """
+    keys, descending = sort_key(sort)
+    query = select(UserProfile, User, PatientLatestState).join(
+        User, User.id == UserProfile.user_id
+    ).outerjoin(
+        PatientLatestState, PatientLatestState.user_id == User.id
+    ).where(
+        UserProfile.doctor_id == doctor_id,
+        UserProfile.profile_completed == True
+    )
+    
+    if status_filter:
+        wanted = status_filter.lower()
+        if wanted == "stable":
+            query = query.where(or_(PatientLatestState.status == wanted, PatientLatestState.status.is_(None)))
+        else:
+            query = query.where(PatientLatestState.status == wanted)
+    
+    if after is not None:
+        position = tuple_(*keys)
+        query = query.where(position < tuple_(*after) if descending else position > tuple_(*after))
+    
+    return query.order_by(*(key.desc() for key in keys) if descending else keys)
+
+def patient_item(profile, user, latest) -> dict:
+    return {
+        "patient_id": user.id,
+        "patient_identifier": user.patient_id,
+        "full_name": profile.full_name,
+        "age": profile.age,
+        "gender": profile.gender,
+        "chronic_conditions": profile.chronic_conditions,
+        "latest_heart_rate": latest.heart_rate if latest else None,
+        "latest_blood_pressure": latest.blood_pressure if latest else None,
+        "latest_blood_glucose": latest.blood_glucose if latest else None,
+        "status": latest.status.title() if latest else "Stable",
+        "last_checkin": latest.measured_at if latest else None
+    }
+
 @router.get("/dashboard")
 async def get_doctor_dashboard(
     db: Session = Depends(get_db),
     current_doctor: Doctor = Depends(get_current_active_doctor)
 ):
-    patients = db.query(UserProfile).filter(
-        UserProfile.doctor_id == current_doctor.doctor_id,
-        UserProfile.profile_completed == True
-    ).all()
-    
-    total_patients = len(patients)
+    counts = db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(PatientLatestState.status == "critical").label("critical")
+        ).select_from(UserProfile).outerjoin(
+            PatientLatestState, PatientLatestState.user_id == UserProfile.user_id
+        ).where(
+            UserProfile.doctor_id == current_doctor.doctor_id,
+            UserProfile.profile_completed == True
+        )
+    ).one()
     
-    critical_patients = 0
-    for patient in patients:
-        latest_health = db.query(HealthData).filter(
-            HealthData.user_id == patient.user_id
-        ).order_by(HealthData.date.desc()).first()
-        
-        if latest_health and latest_health.heart_rate and latest_health.heart_rate > 120:
-            critical_patients += 1
+    # Most severe first, so today's critical alerts are always on this page
+    patients = db.execute(patient_panel_query(current_doctor.doctor_id).limit(10)).all()
     
     recent_alerts = []
-    today = datetime.now().date()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    
-    for patient in patients[:5]:
-        latest_health = db.query(HealthData).filter(
-            HealthData.user_id == patient.user_id
-        ).order_by(HealthData.date.desc()).first()
-        
-        if latest_health and latest_health.date >= start_of_day:
-            if latest_health.heart_rate and latest_heart_rate > 120:
-                recent_alerts.append({
-                    "type": "high_heart_rate",
-                    "message": f"High heart rate detected for {patient.full_name}",
-                    "severity": "high",
-                    "patient_name": patient.full_name
-                })
-    
-    patient_list = []
-    for patient in patients[:10]:
-        user = db.query(User).filter(User.id == patient.user_id).first()
-        latest_health = db.query(HealthData).filter(
-            HealthData.user_id == patient.user_id
-        ).order_by(HealthData.date.desc()).first()
-        
-        patient_list.append({
-            "patient_id": patient.user_id,
-            "patient_identifier": user.patient_id if user else "Unknown",
-            "full_name": patient.full_name,
-            "age": patient.age,
-            "gender": patient.gender,
-            "chronic_conditions": patient.chronic_conditions,
-            "latest_heart_rate": latest_health.heart_rate if latest_health else None,
-            "latest_blood_pressure": latest_health.blood_pressure if latest_health else None,
-            "status": "Critical" if latest_health and latest_health.heart_rate and latest_health.heart_rate > 120 else "Stable"
-        })
+    # measured_at is naive UTC
+    start_of_day = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    for profile, _, latest in patients:
+        if (latest and latest.measured_at >= start_of_day
+                and latest.heart_rate and latest.heart_rate > CRITICAL_HEART_RATE):
+            recent_alerts.append({
+                "type": "high_heart_rate",
+                "message": f"High heart rate detected for {profile.full_name}",
+                "severity": "high",
+                "patient_name": profile.full_name
+            })
     
     return {
         "doctor_id": current_doctor.doctor_id,
         "doctor_name": current_doctor.full_name,
-        "total_patients": total_patients,
-        "critical_patients": critical_patients,
-        "recent_alerts": recent_alerts,
-        "patients": patient_list
+        "total_patients": counts.total,
+        "critical_patients": counts.critical,
+        "recent_alerts": recent_alerts[:5],
+        "patients": [patient_item(*row) for row in patients]
     }
 
 @router.get("/patients/{patient_id}/dashboard")
@@ -167,9 +235,8 @@ async def get_patient_dashboard(
     
     user = db.query(User).filter(User.id == patient_id).first()
     
-    latest_health = db.query(HealthData).filter(
-        HealthData.user_id == patient_id
-    ).order_by(HealthData.date.desc()).first()
+    latest_state = db.get(PatientLatestState, patient_id)
+    latest_health = db.get(HealthData, latest_state.health_data_id) if latest_state and latest_state.health_data_id else None
     
     recent_food_logs = db.query(FoodLog).filter(
         FoodLog.user_id == patient_id
@@ -179,33 +246,17 @@ async def get_patient_dashboard(
         WeeklyProgress.user_id == patient_id
     ).order_by(WeeklyProgress.week_start_date.desc()).first()
     
-    week_ago = datetime.now() - timedelta(days=7)
+    week_ago = datetime.utcnow() - timedelta(days=7)
     
-    weekly_data = db.query(HealthData).filter(
-        HealthData.user_id == patient_id,
-        HealthData.date >= week_ago
-    ).all()
+    week = combine(db.scalars(summaries_query([patient_id], week_ago.date())))
     
     health_metrics = {
-        "avg_heart_rate": None,
+        "avg_heart_rate": week["avg_heart_rate"],
         "avg_blood_pressure": None,
-        "avg_blood_glucose": None,
-        "weekly_steps_avg": None
+        "avg_blood_glucose": week["avg_blood_glucose"],
+        "weekly_steps_avg": week["avg_daily_steps"]
     }
     
-    if weekly_data:
-        heart_rates = [d.heart_rate for d in weekly_data if d.heart_rate]
-        if heart_rates:
-            health_metrics["avg_heart_rate"] = sum(heart_rates) / len(heart_rates)
-        
-        glucose_levels = [d.blood_glucose for d in weekly_data if d.blood_glucose]
-        if glucose_levels:
-            health_metrics["avg_blood_glucose"] = sum(glucose_levels) / len(glucose_levels)
-        
-        steps = [d.steps for d in weekly_data if d.steps]
-        if steps:
-            health_metrics["weekly_steps_avg"] = sum(steps) / len(steps)
-    
     food_analysis = []
     for food_log in recent_food_logs[:5]:
         if food_log.ai_analysis:
@@ -226,11 +277,13 @@ async def get_patient_dashboard(
             "doctor_assigned": current_doctor.full_name
         },
         "current_vitals": {
-            "heart_rate": latest_health.heart_rate if latest_health else None,
-            "blood_pressure": latest_health.blood_pressure if latest_health else None,
-            "blood_glucose": latest_health.blood_glucose if latest_health else None,
+            "heart_rate": latest_state.heart_rate if latest_state else None,
+            "blood_pressure": latest_state.blood_pressure if latest_state else None,
+            "blood_glucose": latest_state.blood_glucose if latest_state else None,
+            "blood_oxygen": latest_state.blood_oxygen if latest_state else None,
             "steps_today": latest_health.steps if latest_health else None,
-            "last_updated": latest_health.date if latest_health else None
+            "last_updated": latest_state.measured_at if latest_state else None,
+            "status": latest_state.status if latest_state else None
         },
         "health_metrics": health_metrics,
         "weekly_progress": {
@@ -280,51 +333,34 @@ async def send_message_to_patient(
 @router.get("/patients")
 async def get_doctor_patients(
     status_filter: str = None,
+    sort: PatientSort = PatientSort.STATUS,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_doctor: Doctor = Depends(get_current_active_doctor)
 ):
-    patients = db.query(
-        UserProfile,
-        User
-    ).join(
-        User, User.id == UserProfile.user_id
-    ).filter(
-        UserProfile.doctor_id == current_doctor.doctor_id,
-        UserProfile.profile_completed == True
-    ).all()
-    
-    patient_list = []
-    for profile, user in patients:
-        latest_health = db.query(HealthData).filter(
-            HealthData.user_id == user.id
-        ).order_by(HealthData.date.desc()).first()
-        
-        patient_status = "Stable"
-        if latest_health:
-            if latest_health.heart_rate and latest_health.heart_rate > 120:
-                patient_status = "Critical"
-            elif latest_health.heart_rate and latest_health.heart_rate > 100:
-                patient_status = "Monitor"
-        
-        if status_filter and status_filter.lower() != patient_status.lower():
-            continue
-        
-        patient_list.append({
-            "patient_id": user.id,
-            "patient_identifier": user.patient_id,
-            "full_name": profile.full_name,
-            "age": profile.age,
-            "gender": profile.gender,
-            "chronic_conditions": profile.chronic_conditions,
-            "latest_heart_rate": latest_health.heart_rate if latest_health else None,
-            "latest_blood_pressure": latest_health.blood_pressure if latest_health else None,
-            "latest_blood_glucose": latest_health.blood_glucose if latest_health else None,
-            "status": patient_status,
-            "last_checkin": latest_health.date if latest_health else None
-        })
+    """
+    One page of the doctor's patients. Pass `next_cursor` back as `cursor`
+    for the next page; `total_patients` is only counted for the first page.
+    """
+    after = decode_cursor(cursor, *CURSOR_TYPES[sort], scope=sort.value) if cursor else None
+    query = patient_panel_query(current_doctor.doctor_id, status_filter, sort, after)
+    if after is None:
+        query = query.add_columns(func.count().over().label("total"))
+    
+    rows = db.execute(query.limit(limit + 1)).all()
+    page = rows[:limit]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        profile, user, latest = page[-1][:3]
+        next_cursor = encode_cursor(row_sort_key(sort, profile, user, latest), scope=sort.value)
     
     return {
         "doctor_id": current_doctor.doctor_id,
-        "total_patients": len(patient_list),
-        "patients": patient_list
-    }
\ No newline at end of file
+        "total_patients": (page[0].total if page else 0) if after is None else None,
+        "count": len(page),
+        "sort": sort.value,
+        "next_cursor": next_cursor,
+        "patients": [patient_item(*row[:3]) for row in page]
+    }
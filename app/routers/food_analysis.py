@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import Optional, List
 import uuid
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import tempfile
 import logging
 import json
@@ -12,6 +12,7 @@ from app.database import get_db
 from app.auth.security import get_current_active_user
 from app.models.user import User, UserProfile
 from app.models.health import FoodLog
+from app.services.daily_summary import apply_daily_summary_sync, accumulate_food_log
 from app.services.azure_ai import azure_ai_service
 from app.services.openai_service import OpenAIService
 
@@ -158,10 +159,11 @@ async def analyze_meal(
             ai_analysis=response,
             diet_score=diet_score,
             nutrients=response["nutrients"],
-            created_at=datetime.now()
+            created_at=datetime.now(timezone.utc)
         )
         
         db.add(food_log)
+        apply_daily_summary_sync(db, accumulate_food_log({}, food_log))
         db.commit()
         db.refresh(food_log)
         
@@ -304,10 +306,11 @@ async def log_meal_manual(
         ai_analysis=analysis_result,
         diet_score=diet_score,
         nutrients=analysis_result['nutrients'],
-        created_at=datetime.now()
+        created_at=datetime.now(timezone.utc)
     )
     
     db.add(food_log)
+    apply_daily_summary_sync(db, accumulate_food_log({}, food_log))
     db.commit()
     
     return {
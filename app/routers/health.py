@@ -1,11 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 import random
-from app.database import get_db
+from app.database import get_async_db
+from app.services.rollups import apply_rollups, samples_from_health_data
+from app.services.daily_summary import apply_daily_summary, accumulate_health_data, accumulate_food_log
+from app.services.latest_state import apply_latest_state, fold_health_data
+from app.services.leaderboard_engine import leaderboard_engine, progress_color, week_of
 from app.auth.security import get_current_active_user  
 from app.models.user import User, UserProfile
 from app.models.health import HealthData, FoodLog, WeeklyProgress, HealthInsight
+from app.models.daily_health_summary import DailyHealthSummary
+from app.models.patient_latest_state import PatientLatestState
 from app.schemas.health import (
     HealthDataCreate, HealthDataResponse, 
     FoodLogCreate, FoodLogResponse, 
@@ -28,84 +35,118 @@ def get_daily_tip():
     ]
     return random.choice(tips)
 
+def default_health_snapshot(user_id: int, **overrides) -> HealthDataResponse:
+    """Placeholder snapshot for users with no health data yet (not persisted)"""
+    values = dict(
+        id=0,
+        user_id=user_id,
+        steps=0,
+        sleep_time=480,
+        water_intake=2000,
+        blood_pressure="120/80",
+        heart_rate=72,
+        blood_glucose=90.0,
+        calories_burned=0,
+        date=datetime.now()
+    )
+    values.update(overrides)
+    return HealthDataResponse(**values)
+
+def dashboard_query(user_id: int, week_start: datetime, today_start: datetime):
+    """
+    Everything the dashboard needs in one statement: one row per recent meal
+    today (or a single row without one), each carrying the profile name,
+    today's DailyHealthSummary, latest HealthData (via patient_latest_state)
+    and this week's
+    WeeklyProgress.
+    """
+    week_progress_id = (
+        select(WeeklyProgress.id)
+        .where(WeeklyProgress.user_id == User.id, WeeklyProgress.week_start_date >= week_start)
+        .limit(1)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    recent_meal_ids = (
+        select(FoodLog.id)
+        .where(FoodLog.user_id == user_id, FoodLog.created_at >= today_start)
+        .order_by(FoodLog.created_at.desc())
+        .limit(5)
+    )
+
+    return (
+        select(
+            select(UserProfile.full_name)
+            .where(UserProfile.user_id == User.id)
+            .limit(1)
+            .correlate(User)
+            .scalar_subquery()
+            .label("full_name"),
+            DailyHealthSummary,
+            HealthData,
+            WeeklyProgress,
+            FoodLog,
+        )
+        .select_from(User)
+        .outerjoin(DailyHealthSummary, and_(
+            DailyHealthSummary.user_id == User.id,
+            DailyHealthSummary.day == today_start.date(),
+        ))
+        .outerjoin(PatientLatestState, PatientLatestState.user_id == User.id)
+        .outerjoin(HealthData, HealthData.id == PatientLatestState.health_data_id)
+        .outerjoin(WeeklyProgress, WeeklyProgress.id == week_progress_id)
+        .outerjoin(FoodLog, FoodLog.id.in_(recent_meal_ids))
+        .where(User.id == user_id)
+        .order_by(FoodLog.created_at.desc())
+    )
+
 @router.get("/dashboard", response_model=HealthDashboardResponse)
 async def get_health_dashboard(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     
     
     
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
-    welcome_name = profile.full_name if profile else current_user.username
-    
-    
-    
-    
-    health_data = db.query(HealthData).filter(
-        HealthData.user_id == current_user.id
-    ).order_by(HealthData.date.desc()).first()
-    
-    
-    if not health_data:
-        health_data = HealthData(
-            user_id=current_user.id,
-            steps=0,
-            sleep_time=480,
-            water_intake=0,
-            blood_pressure="120/80",
-            heart_rate=72,
-            blood_glucose=90.0,
-            calories_burned=0,
-            date=datetime.now()
-        )
-        db.add(health_data)
-        db.commit()
-        db.refresh(health_data)
+    # Stored timestamps and summary days are UTC
+    today = datetime.utcnow()
+    week_start = datetime.combine(week_of(today), datetime.min.time())
+    week_end = week_start + timedelta(days=6)
+    today_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    rows = (await db.execute(
+        dashboard_query(current_user.id, week_start, today_start)
+    )).all()
+    first = rows[0] if rows else None
+
+    profile_name = first.full_name if first else None
+    welcome_name = profile_name or current_user.username
+
+    # Users without data get in-memory defaults; nothing is written on a GET
+    health_data = first.HealthData if first and first.HealthData else default_health_snapshot(
+        current_user.id, water_intake=0, calories_burned=0
+    )
+    weekly_progress = first.WeeklyProgress if first and first.WeeklyProgress else WeeklyProgressResponse(
+        id=0,
+        user_id=current_user.id,
+        week_start_date=week_start,
+        week_end_date=week_end,
+        progress_score=0,
+        progress_color="red",
+        steps_goal=10000,
+        sleep_goal=480,
+        water_goal=2000
+    )
 
-    
     steps = health_data.steps if health_data.steps is not None else 0
     calories = health_data.calories_burned if health_data.calories_burned is not None else 0
     water = health_data.water_intake if health_data.water_intake is not None else 0
     
-    
-    
-    
-    today = datetime.now()
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-    
-    weekly_progress = db.query(WeeklyProgress).filter(
-        WeeklyProgress.user_id == current_user.id,
-        WeeklyProgress.week_start_date >= week_start
-    ).first()
-    
-    if not weekly_progress:
-        weekly_progress = WeeklyProgress(
-            user_id=current_user.id,
-            week_start_date=week_start,
-            week_end_date=week_end,
-            progress_score=0,
-            progress_color="red",
-            steps_goal=10000,
-            sleep_goal=480,
-            water_goal=2000
-        )
-        db.add(weekly_progress)
-        db.commit()
-        db.refresh(weekly_progress)
-    
-    
-    
-    
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_food_logs = db.query(FoodLog).filter(
-        FoodLog.user_id == current_user.id,
-        FoodLog.created_at >= today_start
-    ).order_by(FoodLog.created_at.desc()).limit(5).all()
-    
     recent_meals = []
-    for log in today_food_logs:
+    for row in rows:
+        log = row.FoodLog
+        if log is None:
+            continue
         recent_meals.append({
             "id": log.id,
             "meal_type": log.meal_type,
@@ -114,10 +155,9 @@ async def get_health_dashboard(
             "created_at": log.created_at
         })
     
-    diet_score = 0
-    if today_food_logs:
-        total_diet = sum(log.diet_score or 0 for log in today_food_logs)
-        diet_score = total_diet // len(today_food_logs)
+    today_summary = first.DailyHealthSummary if first else None
+    meal_count_today = today_summary.meal_count if today_summary else 0
+    diet_score = today_summary.diet_score_avg if today_summary else 0
     
     
     
@@ -186,7 +226,7 @@ async def get_health_dashboard(
         diet_score=diet_score,
         daily_tip=get_daily_tip(),
         recent_meals=recent_meals,
-        meal_count_today=len(today_food_logs),
+        meal_count_today=meal_count_today,
         
         
         daily_score=daily_score_obj,
@@ -198,7 +238,7 @@ async def get_health_dashboard(
 @router.post("/food-log", response_model=FoodLogResponse)
 async def log_food(
     food_data: FoodLogCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     
@@ -217,26 +257,30 @@ async def log_food(
         meal_type=food_data.meal_type,
         diet_score=food_data.diet_score or random.randint(60, 95),
         ai_analysis=ai_analysis,
-        nutrients=ai_analysis["nutrients"]
+        nutrients=ai_analysis["nutrients"],
+        created_at=datetime.now(timezone.utc)
     )
     
     db.add(food_log)
-    db.commit()
-    db.refresh(food_log)
+    await apply_daily_summary(db, accumulate_food_log({}, food_log))
+    await db.commit()
+    await db.refresh(food_log)
     return food_log
 
 @router.get("/weekly-progress", response_model=WeeklyProgressResponse)
 async def get_weekly_progress(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     today = datetime.now()
-    week_start = today - timedelta(days=today.weekday())
+    week_start = datetime.combine(week_of(today), datetime.min.time())
     
-    progress = db.query(WeeklyProgress).filter(
-        WeeklyProgress.user_id == current_user.id,
-        WeeklyProgress.week_start_date >= week_start
-    ).first()
+    progress = await db.scalar(
+        select(WeeklyProgress).where(
+            WeeklyProgress.user_id == current_user.id,
+            WeeklyProgress.week_start_date >= week_start
+        ).limit(1)
+    )
     
     if not progress:
         
@@ -256,27 +300,17 @@ async def get_weekly_progress(
 
 @router.get("/health-snapshot", response_model=HealthDataResponse)
 async def get_health_snapshot(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    snapshot = db.query(HealthData).filter(
-        HealthData.user_id == current_user.id
-    ).order_by(HealthData.date.desc()).first()
+    snapshot = await db.scalar(
+        select(HealthData).join(
+            PatientLatestState, PatientLatestState.health_data_id == HealthData.id
+        ).where(PatientLatestState.user_id == current_user.id)
+    )
     
     if not snapshot:
-        snapshot = HealthData(
-            user_id=current_user.id,
-            steps=0,
-            sleep_time=480,
-            water_intake=2000,
-            blood_pressure="120/80",
-            heart_rate=72,
-            blood_glucose=90.0,
-            date=datetime.now()
-        )
-        db.add(snapshot)
-        db.commit()
-        db.refresh(snapshot)
+        return default_health_snapshot(current_user.id, water_intake=2000)
     
     return snapshot
     
@@ -284,68 +318,74 @@ async def get_health_snapshot(
 @router.post("/health-data", response_model=HealthDataResponse)
 async def add_health_data(
     health_data: HealthDataCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     data_dict = health_data.dict()
-    data_dict['date'] = datetime.now()
+    # Device readings are UTC; a local timestamp would misorder the two
+    data_dict['date'] = datetime.now(timezone.utc)
     health_record = HealthData(user_id=current_user.id, **data_dict)
     db.add(health_record)
-    db.commit()
-    db.refresh(health_record)
+    await db.flush()
+    await apply_rollups(db, samples_from_health_data(health_record))
+    await apply_daily_summary(db, accumulate_health_data({}, health_record))
+    await apply_latest_state(db, fold_health_data({}, health_record))
+    await db.commit()
+    await db.refresh(health_record)
     return health_record
 
 @router.get("/food-logs", response_model=list[FoodLogResponse])
 async def get_food_logs(
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    logs = db.query(FoodLog).filter(
-        FoodLog.user_id == current_user.id
-    ).order_by(FoodLog.created_at.desc()).offset(skip).limit(limit).all()
+    logs = (await db.scalars(
+        select(FoodLog).where(
+            FoodLog.user_id == current_user.id
+        ).order_by(FoodLog.created_at.desc()).offset(skip).limit(limit)
+    )).all()
     return logs
 
 @router.post("/update-progress")
 async def update_weekly_progress(
     progress_data: ProgressUpdateRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    today = datetime.now()
-    week_start = today - timedelta(days=today.weekday())
+    week = week_of(datetime.now())
+    week_start = datetime.combine(week, datetime.min.time())
     week_end = week_start + timedelta(days=6)
     
-    if progress_data.progress_score >= 80:
-        progress_color = "green"
-    elif progress_data.progress_score >= 60:
-        progress_color = "yellow"
-    elif progress_data.progress_score >= 40:
-        progress_color = "orange"
-    else:
-        progress_color = "red"
+    color = progress_color(progress_data.progress_score)
     
-    weekly_progress = db.query(WeeklyProgress).filter(
-        WeeklyProgress.user_id == current_user.id,
-        WeeklyProgress.week_start_date >= week_start
-    ).first()
+    weekly_progress = await db.scalar(
+        select(WeeklyProgress).where(
+            WeeklyProgress.user_id == current_user.id,
+            WeeklyProgress.week_start_date >= week_start
+        ).order_by(WeeklyProgress.id.desc()).limit(1)
+    )
     
     if weekly_progress:
         weekly_progress.progress_score = progress_data.progress_score
-        weekly_progress.progress_color = progress_color
+        weekly_progress.progress_color = color
     else:
         weekly_progress = WeeklyProgress(
             user_id=current_user.id,
             week_start_date=week_start,
             week_end_date=week_end,
             progress_score=progress_data.progress_score,
-            progress_color=progress_color,
+            progress_color=color,
             steps_goal=10000,
             sleep_goal=480,
             water_goal=2000
         )
         db.add(weekly_progress)
     
-    db.commit()
+    await db.commit()
+    leaderboard_engine.update(
+        week, current_user.id, current_user.patient_id,
+        weekly_progress.progress_score, color, weekly_progress.steps_goal
+    )
     return {"message": "Progress updated successfully"}
\ No newline at end of file
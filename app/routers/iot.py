@@ -1,26 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ValidationError
+from typing import Optional, List
 from datetime import datetime
 import logging
 import json
 
-from app.database import get_db
-from app.models.iot_device import IoTDevice, VitalReading
+from app.database import get_async_db
+from app.models.iot_device import IoTDevice
 from app.config import settings
 from app.handler.emergency_handler import emergency_handler
+from app.handler.emergency_engine import emergency_engine
+from app.services.vital_ingest import ingest_readings, parse_timestamp
+from app.services.ingest_buffer import ingest_buffer, BufferFull
+from app.services.iot_hub_client import hub_client_manager, HubQueueFull, AZURE_IOT_AVAILABLE
 
 
-try:
-    from azure.iot.device import IoTHubDeviceClient, Message
-
-    AZURE_IOT_AVAILABLE = True
-except ImportError:
-    IoTHubDeviceClient = None
-    Message = None
-    AZURE_IOT_AVAILABLE = False
-
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/iot", tags=["IoT"])
 
@@ -64,7 +61,7 @@ async def forward_to_hub(data: HeartRateData):
         if data.heart_rate > 120:
             emergency_handler(data.heart_rate)
 
-        if not AZURE_IOT_AVAILABLE or IoTHubDeviceClient is None:
+        if not AZURE_IOT_AVAILABLE or not settings.IOT_HUB_CONNECTION_STRING:
             return {
                 "status": "success",
                 "message": "Data received (Azure IoT not configured)",
@@ -78,32 +75,19 @@ async def forward_to_hub(data: HeartRateData):
             "data_type": "heart_rate",
         }
 
-        device_client = IoTHubDeviceClient.create_from_connection_string(
-            settings.IOT_HUB_CONNECTION_STRING
-        )
-
-        try:
-            device_client.connect()
-
-            if Message is None:
-                raise Exception("Azure IoT Message class not available")
-            message = Message(json.dumps(message_payload))
-            message.content_encoding = "utf-8"
-            message.content_type = "application/json"
-
-            device_client.send_message(message)
-            logger.info("Successfully sent message to IoT Hub")
-
-        finally:
+        # Sent in the background over a persistent, batched connection
+        hub_client_manager.send(message_payload)
 
-            device_client.disconnect()
         return {
             "status": "success",
-            "message": "Heart rate data forwarded to IoT Hub",
+            "message": "Heart rate data queued for IoT Hub",
             "heart_rate": data.heart_rate,
             "device_id": "xx-pius-test",
         }
 
+    except HubQueueFull as e:
+        logger.warning(f"IoT Hub queue full, rejecting reading: {str(e)}")
+        raise HTTPException(status_code=503, detail="IoT Hub queue is full, retry later")
     except Exception as e:
         logger.error(f"Error forwarding data to IoT Hub: {str(e)}")
         return {
@@ -113,9 +97,19 @@ async def forward_to_hub(data: HeartRateData):
         }
 
 
+def to_reading(data: AzureFunctionData) -> dict:
+    return {
+        "device_id": data.device_id,
+        "heart_rate": data.heart_rate,
+        "blood_oxygen": None,
+        "is_emergency": False,
+        "timestamp": parse_timestamp(data.timestamp),
+    }
+
+
 @router.post("/webhook")
 async def receive_azure_function_data(
-    data: AzureFunctionData, db: Session = Depends(get_db)
+    data: AzureFunctionData, db: AsyncSession = Depends(get_async_db)
 ):
     """
     Receive data from Azure Function (IoT Hub webhook)
@@ -123,76 +117,133 @@ async def receive_azure_function_data(
     try:
         logger.info(f"Received data from Azure Function: {data.device_id}")
 
-        # fix this later, get user by device_id or email that
-        #  the person provides from the frontend
-        default_user_id = 1
-
-        device = (
-            db.query(IoTDevice)
-            .filter(IoTDevice.device_id == data.device_id)
-            .first()  # noqa
-        )
-
-        if not device:
-            device = IoTDevice(
-                user_id=default_user_id,
-                device_id=data.device_id,
-                device_type="smartwatch",
-                device_name=f"Device {data.device_id}",
-                manufacturer="Unknown",
-                model="Unknown",
-                connection_status="connected",
-                last_sync=datetime.now(),
-            )
-            db.add(device)
-            db.flush()
-
-        vital_reading = VitalReading(
-            device_id=device.id,
-            user_id=default_user_id,
-            heart_rate=data.heart_rate,
-            blood_oxygen=None,
-            is_emergency=False,
-            timestamp=datetime.fromisoformat(
-                data.timestamp.replace("Z", "+00:00")
-            ),  # noqa
-        )
-
-        db.add(vital_reading)
-
-        # Update device status
-        db.query(IoTDevice).filter(IoTDevice.id == device.id).update(
-            {
-                IoTDevice.last_sync: datetime.now(),
-                IoTDevice.connection_status: "connected",
-            }
-        )
+        if settings.IOT_WRITE_BEHIND_ENABLED:
+            # Spooled and acknowledged now, written to the DB by the flusher
+            await ingest_buffer.add(to_reading(data))
+            return JSONResponse(status_code=202, content={
+                "status": "accepted",
+                "message": "Data received from Azure Function and queued",
+                "device_id": data.device_id,
+                "heart_rate": data.heart_rate,
+            })
 
-        db.commit()
-        db.refresh(vital_reading)
+        reading_ids = await ingest_readings(db, [to_reading(data)])
 
         return {
             "status": "success",
             "message": "Data received from Azure Function and stored",
-            "reading_id": vital_reading.id,
+            "reading_id": reading_ids[0],
             "device_id": data.device_id,
             "heart_rate": data.heart_rate,
         }
 
+    except BufferFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Ingest buffer is full, retry later",
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error processing Azure Function data: {str(e)}")
         raise HTTPException(
             status_code=500, detail=f"Failed to process data: {str(e)}"
         )  # noqa
 
 
+async def iter_batch_items(request: Request):
+    """Yield raw items from a JSON array body or an NDJSON stream"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if isinstance(body, dict):
+        body = body.get("readings")
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of readings")
+    for item in body:
+        yield item
+
+
+async def store_chunk(db: AsyncSession, chunk: List[tuple], results: List[dict]):
+    try:
+        reading_ids = await ingest_readings(db, [reading for _, reading in chunk])
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error storing IoT batch chunk: {str(e)}")
+        for index, _ in chunk:
+            results.append({"index": index, "status": "failed", "error": "database error"})
+        return
+
+    for (index, _), reading_id in zip(chunk, reading_ids):
+        results.append({"index": index, "status": "stored", "reading_id": reading_id})
+
+
+@router.post("/webhook/batch")
+async def receive_azure_function_batch(
+    request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Receive many readings at once, as a JSON array (or {"readings": [...]})
+    or as an NDJSON stream (Content-Type: application/x-ndjson).
+    The whole batch is parsed and counted before anything is stored, so an
+    oversized batch is rejected with 413 without a partial write. Readings
+    are then stored in chunks of IOT_BATCH_CHUNK_SIZE and each item gets its
+    own status, so one bad reading does not reject the batch.
+    """
+    results = []
+    accepted = []
+    index = -1
+
+    async for item in iter_batch_items(request):
+        index += 1
+        if index >= settings.IOT_BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch exceeds {settings.IOT_BATCH_MAX_ITEMS} readings",
+            )
+        try:
+            if isinstance(item, bytes):
+                item = json.loads(item)
+            accepted.append((index, to_reading(AzureFunctionData(**item))))
+        except (ValueError, TypeError, ValidationError) as e:
+            results.append({"index": index, "status": "rejected", "error": str(e)})
+
+    for start in range(0, len(accepted), settings.IOT_BATCH_CHUNK_SIZE):
+        await store_chunk(db, accepted[start:start + settings.IOT_BATCH_CHUNK_SIZE], results)
+
+    results.sort(key=lambda result: result["index"])
+    stored = sum(1 for result in results if result["status"] == "stored")
+
+    return {
+        "status": "success" if stored == len(results) else "partial",
+        "received": len(results),
+        "stored": stored,
+        "results": results,
+    }
+
+
 @router.get("/devices/{user_id}")
-async def get_user_devices(user_id: int, db: Session = Depends(get_db)):
+async def get_user_devices(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get all IoT devices for a user
     """
-    devices = db.query(IoTDevice).filter(IoTDevice.user_id == user_id).all()
+    devices = (await db.scalars(
+        select(IoTDevice).where(IoTDevice.user_id == user_id)
+    )).all()
     return {"devices": devices}
 
 
@@ -201,4 +252,9 @@ async def iot_status():
     """
     Check IoT service status
     """
-    return {"status": "IoT service is running"}
+    return {
+        "status": "IoT service is running",
+        "hub_connections": hub_client_manager.stats(),
+        "ingest_buffer": ingest_buffer.stats(),
+        "emergency_engine": emergency_engine.stats(),
+    }
@@ -1,132 +1,136 @@
+import enum
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta
-from app.database import get_db
+from sqlalchemy import Date, desc, func, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta
+from app.database import get_db, get_async_db
 from app.auth.security import get_current_active_user
 from app.models.user import User
-from app.models.health import WeeklyProgress, HealthData
+from app.models.health import WeeklyProgress
+from app.models.daily_health_summary import DailyHealthSummary
+from app.services.daily_summary import summaries_query, combine
+from app.services.leaderboard_engine import leaderboard_engine, week_of, display_name, progress_color
+from app.utils.sql import date_bucket
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
 @router.get("/weekly")
 async def get_weekly_leaderboard(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    today = datetime.now()
-    week_start = today - timedelta(days=today.weekday())
-    
-    weekly_progress = db.query(
-        WeeklyProgress,
-        User
-    ).join(
-        User, User.id == WeeklyProgress.user_id
-    ).filter(
-        WeeklyProgress.week_start_date >= week_start
-    ).order_by(
-        desc(WeeklyProgress.progress_score)
-    ).limit(20).all()
+    week = week_of(datetime.now())
+    board = await leaderboard_engine.refresh(db, week)
     
-    leaderboard = []
-    for rank, (progress, user) in enumerate(weekly_progress, 1):
-        leaderboard.append({
+    def leaderboard_item(rank, entry):
+        return {
             "rank": rank,
-            "user_id": user.patient_id,
-            "display_name": f"User{user.patient_id[-4:]}" if user.patient_id else f"User{user.id}",
-            "progress_score": progress.progress_score,
-            "progress_color": progress.progress_color,
-            "steps_completed": progress.steps_goal,
-            "is_current_user": user.id == current_user.id
-        })
+            "user_id": entry.patient_id,
+            "display_name": display_name(entry.user_id, entry.patient_id),
+            "progress_score": entry.progress_score,
+            "progress_color": entry.progress_color,
+            "steps_completed": entry.steps_goal,
+            "is_current_user": entry.user_id == current_user.id
+        }
     
-    current_user_rank = None
-    current_user_data = None
-    for item in leaderboard:
-        if item["is_current_user"]:
-            current_user_rank = item["rank"]
-            current_user_data = item
-            break
+    leaderboard = [leaderboard_item(rank, entry) for rank, entry in board.top(10)]
     
-    if not current_user_data:
-        user_progress = db.query(WeeklyProgress).filter(
-            WeeklyProgress.user_id == current_user.id,
-            WeeklyProgress.week_start_date >= week_start
-        ).first()
-        
-        if user_progress:
-            current_user_rank = len(leaderboard) + 1
-            current_user_data = {
-                "rank": current_user_rank,
-                "user_id": current_user.patient_id,
-                "display_name": f"User{current_user.patient_id[-4:]}" if current_user.patient_id else f"User{current_user.id}",
-                "progress_score": user_progress.progress_score,
-                "progress_color": user_progress.progress_color,
-                "steps_completed": user_progress.steps_goal,
-                "is_current_user": True
-            }
+    current_user_rank = board.rank(current_user.id)
+    current_user_data = None
+    if current_user_rank is not None:
+        current_user_data = leaderboard_item(current_user_rank, board.entries[current_user.id])
     
     return {
-        "week_start": week_start.date().isoformat(),
-        "total_participants": len(leaderboard),
-        "leaderboard": leaderboard[:10],
+        "week_start": week.isoformat(),
+        "total_participants": len(board),
+        "leaderboard": leaderboard,
         "current_user_rank": current_user_rank,
         "current_user_data": current_user_data
     }
 
+class HistoryBucket(str, enum.Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+def history_query(db, user_id: int, bucket: str, start: datetime):
+    """
+    Per-bucket vitals from daily_health_summary, full-outer-joined to the
+    average WeeklyProgress score of the weeks starting in that bucket
+    """
+    day_bucket = date_bucket(db, DailyHealthSummary.day, bucket)
+    vitals = (
+        select(
+            day_bucket.label("bucket"),
+            func.sum(DailyHealthSummary.heart_rate_sum).label("heart_rate_sum"),
+            func.sum(DailyHealthSummary.heart_rate_count).label("heart_rate_count"),
+            func.sum(DailyHealthSummary.steps).label("steps"),
+            func.count().filter(DailyHealthSummary.steps > 0).label("step_days"),
+        )
+        .where(DailyHealthSummary.user_id == user_id, DailyHealthSummary.day >= start.date())
+        .group_by(day_bucket)
+        .subquery()
+    )
+    week_bucket = date_bucket(db, WeeklyProgress.week_start_date, bucket)
+    progress = (
+        select(
+            week_bucket.label("bucket"),
+            func.avg(WeeklyProgress.progress_score).label("progress_score"),
+        )
+        .where(WeeklyProgress.user_id == user_id, WeeklyProgress.week_start_date >= start)
+        .group_by(week_bucket)
+        .subquery()
+    )
+    bucket_start = type_coerce(func.coalesce(vitals.c.bucket, progress.c.bucket), Date)
+    return (
+        select(
+            bucket_start.label("bucket"), vitals.c.heart_rate_sum, vitals.c.heart_rate_count,
+            vitals.c.steps, vitals.c.step_days, progress.c.progress_score,
+        )
+        .select_from(vitals.join(progress, vitals.c.bucket == progress.c.bucket, full=True))
+        .order_by(bucket_start)
+    )
+
+def bucket_end(start: date, bucket: HistoryBucket) -> date:
+    if bucket == HistoryBucket.DAY:
+        return start
+    if bucket == HistoryBucket.WEEK:
+        return start + timedelta(days=6)
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
 @router.get("/history")
 async def get_user_progress_history(
     days: int = 30,
-    db: Session = Depends(get_db),
+    bucket: HistoryBucket = HistoryBucket.WEEK,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
-    
-    progress_history = db.query(WeeklyProgress).filter(
-        WeeklyProgress.user_id == current_user.id,
-        WeeklyProgress.week_start_date >= start_date
-    ).order_by(
-        WeeklyProgress.week_start_date
-    ).all()
-    
-    health_history = db.query(HealthData).filter(
-        HealthData.user_id == current_user.id,
-        HealthData.date >= start_date
-    ).order_by(
-        HealthData.date
-    ).all()
+    start_date = datetime.utcnow() - timedelta(days=days)
+    rows = (await db.execute(history_query(db, current_user.id, bucket.value, start_date))).all()
     
     history_data = []
-    for progress in progress_history:
-        week_health = [h for h in health_history if h.date >= progress.week_start_date and h.date <= progress.week_end_date]
-        
-        avg_heart_rate = None
-        avg_steps = None
-        
-        if week_health:
-            heart_rates = [h.heart_rate for h in week_health if h.heart_rate]
-            if heart_rates:
-                avg_heart_rate = sum(heart_rates) / len(heart_rates)
-            
-            steps = [h.steps for h in week_health if h.steps]
-            if steps:
-                avg_steps = sum(steps) / len(steps)
-        
-        history_data.append({
-            "week_start": progress.week_start_date.date().isoformat(),
-            "week_end": progress.week_end_date.date().isoformat(),
-            "progress_score": progress.progress_score,
-            "progress_color": progress.progress_color,
-            "avg_heart_rate": avg_heart_rate,
-            "avg_steps": avg_steps,
-            "achievements": ["Weekly Goal Met"] if progress.progress_score >= 80 else []
-        })
+    for row in rows:
+        item = {
+            "bucket_start": row.bucket.isoformat(),
+            "bucket_end": bucket_end(row.bucket, bucket).isoformat(),
+            "progress_score": round(row.progress_score) if row.progress_score is not None else None,
+            "progress_color": progress_color(row.progress_score) if row.progress_score is not None else None,
+            "avg_heart_rate": row.heart_rate_sum / row.heart_rate_count if row.heart_rate_count else None,
+            "avg_steps": row.steps / row.step_days if row.step_days else None,
+            "achievements": ["Weekly Goal Met"] if (row.progress_score or 0) >= 80 else []
+        }
+        if bucket == HistoryBucket.WEEK:
+            item["week_start"], item["week_end"] = item["bucket_start"], item["bucket_end"]
+        history_data.append(item)
     
     return {
         "user_id": current_user.patient_id,
         "period_days": days,
-        "total_weeks": len(history_data),
+        "bucket": bucket.value,
+        "total_buckets": len(history_data),
+        "total_weeks": len(history_data) if bucket == HistoryBucket.WEEK else None,
         "history": history_data
     }
 
@@ -159,14 +163,12 @@ async def get_user_achievements(
             "unlocked_at": datetime.now().isoformat()
         })
     
-    health_data = db.query(HealthData).filter(
-        HealthData.user_id == current_user.id
-    ).order_by(
-        desc(HealthData.date)
-    ).limit(30).all()
+    last_30_days = combine(db.scalars(summaries_query(
+        [current_user.id], (datetime.utcnow() - timedelta(days=30)).date()
+    )))
     
-    if health_data:
-        avg_heart_rate = sum([h.heart_rate for h in health_data if h.heart_rate]) / len([h for h in health_data if h.heart_rate])
+    if last_30_days["days"]:
+        avg_heart_rate = last_30_days["avg_heart_rate"]
         if avg_heart_rate and avg_heart_rate < 80:
             achievements.append({
                 "id": "healthy_heart",
@@ -176,7 +178,7 @@ async def get_user_achievements(
                 "unlocked_at": datetime.now().isoformat()
             })
     
-    total_steps = sum([h.steps for h in health_data if h.steps])
+    total_steps = last_30_days["total_steps"]
     if total_steps and total_steps > 100000:
         achievements.append({
             "id": "step_master",
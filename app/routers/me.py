@@ -0,0 +1,22 @@
+from typing import Union
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.auth.security import get_current_active_user_or_admin
+from app.models.user import User
+from app.models.admin import Admin
+from app.services.unread_counters import unread_cache
+
+router = APIRouter(prefix="/me", tags=["me"])
+
+@router.get("/badges")
+async def get_badges(
+    db: AsyncSession = Depends(get_async_db),
+    current: Union[User, Admin] = Depends(get_current_active_user_or_admin)
+):
+    """Unread notification and message counts in one cached read"""
+    if isinstance(current, Admin):
+        return {"notifications": 0, "messages": 0, "total": 0}
+
+    counts = await unread_cache.counts(db, current.id)
+    return {**counts, "total": sum(counts.values())}
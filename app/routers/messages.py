@@ -1,15 +1,20 @@
 # back/app/routers/messages.py
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func
-from typing import List, Dict
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status, WebSocket, WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, or_, and_, func
+from typing import List, Dict, Optional
 import json
 
-from app.database import get_db
+from app.database import get_async_db
 from app.auth.security import get_current_user
 from app.models.user import User
 from app.models.caregiver import Message, CaregiverRelationship
+from app.services.backplane import Backplane, backplane
+from app.services.ws_registry import Connection, ConnectionRegistry
+from app.services.conversations import (
+    history_query, inbox_query, mark_read, record_message
+)
+from app.services.unread_counters import unread_cache
 from app.schemas.message import (
     MessageCreate, MessageResponse, ConversationResponse, 
     MessageReadRequest, TypingStatus
@@ -17,54 +22,52 @@ from app.schemas.message import (
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
-# WebSocket connection manager for real-time messaging
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+# WebSocket connections for real-time messaging; sockets held by other
+# workers are reached through the backplane
+class ConnectionManager(ConnectionRegistry):
+    scope = "messages"
+    
+    def __init__(self, backplane: Backplane, **kwargs):
+        super().__init__(backplane, **kwargs)
         self.typing_status: Dict[int, Dict] = {}  # {user_id: {with_user_id: is_typing}}
     
-    async def connect(self, user_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+    async def connect(self, user_id: int, websocket: WebSocket) -> Connection:
+        connection = await super().connect(user_id, websocket)
         print(f"✅ User {user_id} connected to messaging WebSocket")
+        return connection
     
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        if user_id in self.typing_status:
-            del self.typing_status[user_id]
-        print(f"❌ User {user_id} disconnected from messaging WebSocket")
+    async def disconnect(self, connection: Connection, code: Optional[int] = None):
+        if connection.closed:
+            return
+        await super().disconnect(connection, code)
+        if connection.user_id not in self.connections:
+            self.typing_status.pop(connection.user_id, None)
+        print(f"❌ User {connection.user_id} disconnected from messaging WebSocket")
     
     async def send_personal_message(self, message: dict, user_id: int):
-        """Send message to specific user if they're connected"""
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(message)
-                return True
-            except Exception as e:
-                print(f"❌ Error sending to user {user_id}: {e}")
-                self.disconnect(user_id)
-        return False
+        """Send message to specific user if they're connected to any worker"""
+        delivered = await self.send_local(user_id, message)
+        routed = await self.backplane.send(self.scope, user_id, message)
+        return delivered or routed > 0
     
     async def broadcast_typing(self, user_id: int, to_user_id: int, is_typing: bool):
         """Broadcast typing status"""
-        if to_user_id in self.active_connections:
-            await self.send_personal_message({
-                "type": "typing",
-                "from_user_id": user_id,
-                "is_typing": is_typing
-            }, to_user_id)
+        await self.send_personal_message({
+            "type": "typing",
+            "from_user_id": user_id,
+            "is_typing": is_typing
+        }, to_user_id)
     
     def is_user_online(self, user_id: int) -> bool:
-        return user_id in self.active_connections
+        return self.backplane.is_online(self.scope, user_id)
 
-manager = ConnectionManager()
+manager = ConnectionManager(backplane)
 
 # Helper function to verify caregiver-patient relationship
-async def verify_can_message(sender_id: int, receiver_id: int, db: Session) -> bool:
+async def verify_can_message(sender_id: int, receiver_id: int, db: AsyncSession) -> bool:
     """Check if sender can message receiver"""
     # Check if they have an approved caregiver relationship (either direction)
-    relationship = db.query(CaregiverRelationship).filter(
+    relationship = await db.scalar(select(CaregiverRelationship.id).where(
         or_(
             and_(
                 CaregiverRelationship.caregiver_id == sender_id,
@@ -76,7 +79,7 @@ async def verify_can_message(sender_id: int, receiver_id: int, db: Session) -> b
             )
         ),
         CaregiverRelationship.status == "approved"
-    ).first()
+    ).limit(1))
     
     return relationship is not None
 
@@ -86,11 +89,11 @@ async def verify_can_message(sender_id: int, receiver_id: int, db: Session) -> b
 async def send_message(
     message_data: MessageCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a new message"""
     # Verify receiver exists
-    receiver = db.query(User).filter(User.id == message_data.receiver_id).first()
+    receiver = await db.get(User, message_data.receiver_id)
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver not found")
     
@@ -110,8 +113,10 @@ async def send_message(
         is_read=False
     )
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    await db.flush()
+    await db.refresh(db_message)
+    await record_message(db, db_message)
+    await db.commit()
     
     # Send real-time notification via WebSocket
     await manager.send_personal_message({
@@ -146,81 +151,53 @@ async def send_message(
 @router.get("/conversations", response_model=List[ConversationResponse])
 async def get_conversations(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all conversations for current user"""
-    # Get all users current user has messaged or been messaged by
-    sent_messages = db.query(Message.receiver_id).filter(
-        Message.sender_id == current_user.id
-    ).distinct().subquery()
-    
-    received_messages = db.query(Message.sender_id).filter(
-        Message.receiver_id == current_user.id
-    ).distinct().subquery()
-    
-    # Get unique user IDs
-    conversation_user_ids = db.query(User.id).filter(
-        or_(
-            User.id.in_(sent_messages),
-            User.id.in_(received_messages)
-        )
-    ).all()
+    """Get all conversations for current user, most recent activity first"""
+    rows = (await db.execute(inbox_query(current_user.id))).all()
     
     conversations = []
-    for (user_id,) in conversation_user_ids:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            continue
-        
-        # Get last message between users
-        last_message = db.query(Message).filter(
-            or_(
-                and_(Message.sender_id == current_user.id, Message.receiver_id == user_id),
-                and_(Message.sender_id == user_id, Message.receiver_id == current_user.id)
-            )
-        ).order_by(Message.created_at.desc()).first()
-        
-        # Count unread messages from this user
-        unread_count = db.query(func.count(Message.id)).filter(
-            Message.sender_id == user_id,
-            Message.receiver_id == current_user.id,
-            Message.is_read == False
-        ).scalar()
-        
+    for conversation, user, unread_count in rows:
         # Determine user type
         user_type = "doctor" if user.email and "doctor" in user.email.lower() else \
                     ("caregiver" if user.is_caregiver else "patient")
         
-        conversation = ConversationResponse(
+        conversations.append(ConversationResponse(
             user_id=user.id,
             user_name=f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or user.email,
             user_email=user.email,
             user_type=user_type,
             patient_id=user.patient_id,
             caregiver_id=user.caregiver_id,
-            last_message=last_message.content if last_message else None,
-            last_message_time=last_message.created_at if last_message else None,
+            last_message=conversation.last_message_preview,
+            last_message_time=conversation.last_message_at,
             unread_count=unread_count,
             is_online=manager.is_user_online(user.id)
-        )
-        conversations.append(conversation)
-    
-    # Sort by last message time
-    conversations.sort(key=lambda x: x.last_message_time or datetime.min, reverse=True)
+        ))
     
     return conversations
 
 @router.get("/conversation/{user_id}", response_model=List[MessageResponse])
 async def get_conversation_messages(
     user_id: int,
-    limit: int = 50,
-    offset: int = 0,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get messages in a conversation with specific user"""
+    """
+    Get messages in a conversation with specific user, oldest first.
+    
+    Scroll back with `before_id` set to the oldest message already loaded;
+    sync with `after_id` set to the newest one, repeating while a full page
+    comes back.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+    
     # Verify user exists
-    other_user = db.query(User).filter(User.id == user_id).first()
+    other_user = await db.get(User, user_id)
     if not other_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -232,22 +209,24 @@ async def get_conversation_messages(
             detail="You can only view conversations with users you have an approved relationship with"
         )
     
-    # Get messages
-    messages = db.query(Message).filter(
-        or_(
-            and_(Message.sender_id == current_user.id, Message.receiver_id == user_id),
-            and_(Message.sender_id == user_id, Message.receiver_id == current_user.id)
-        )
-    ).order_by(Message.created_at.desc()).offset(offset).limit(limit).all()
+    messages = list((await db.scalars(
+        history_query(current_user.id, user_id, before_id, after_id).limit(limit)
+    )).all())
+    
+    # Newest-first pages come back in chronological order
+    if after_id is None:
+        messages.reverse()
     
-    # Reverse to get chronological order
-    messages.reverse()
+    # Every message is between the two users already loaded
+    people = {
+        user.id: (f"{user.first_name or ''} {user.last_name or ''}".strip(), user.email)
+        for user in (current_user, other_user)
+    }
     
-    # Prepare response with user details
     response = []
     for msg in messages:
-        sender = db.query(User).filter(User.id == msg.sender_id).first()
-        receiver = db.query(User).filter(User.id == msg.receiver_id).first()
+        sender_name, sender_email = people[msg.sender_id]
+        receiver_name, receiver_email = people[msg.receiver_id]
         
         response.append(MessageResponse(
             id=msg.id,
@@ -256,10 +235,10 @@ async def get_conversation_messages(
             content=msg.content,
             is_read=msg.is_read,
             created_at=msg.created_at,
-            sender_name=f"{sender.first_name or ''} {sender.last_name or ''}".strip() if sender else None,
-            sender_email=sender.email if sender else None,
-            receiver_name=f"{receiver.first_name or ''} {receiver.last_name or ''}".strip() if receiver else None,
-            receiver_email=receiver.email if receiver else None
+            sender_name=sender_name,
+            sender_email=sender_email,
+            receiver_name=receiver_name,
+            receiver_email=receiver_email
         ))
     
     return response
@@ -268,44 +247,34 @@ async def get_conversation_messages(
 async def mark_messages_as_read(
     read_request: MessageReadRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark messages as read"""
-    messages = db.query(Message).filter(
-        Message.id.in_(read_request.message_ids),
-        Message.receiver_id == current_user.id
-    ).all()
-    
-    for message in messages:
-        message.is_read = True
+    marked = await mark_read(db, current_user.id, read_request.message_ids)
+    await db.commit()
     
-    db.commit()
-    
-    return {"message": f"Marked {len(messages)} messages as read"}
+    return {"message": f"Marked {marked} messages as read"}
 
 @router.get("/unread-count")
 async def get_unread_count(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get total unread message count"""
-    count = db.query(func.count(Message.id)).filter(
-        Message.receiver_id == current_user.id,
-        Message.is_read == False
-    ).scalar()
-    
-    return {"unread_count": count}
+    counts = await unread_cache.counts(db, current_user.id)
+    return {"unread_count": counts["messages"]}
 
 # WebSocket endpoint for real-time messaging
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket, user_id: int):
     """WebSocket connection for real-time messaging"""
-    await manager.connect(user_id, websocket)
+    connection = await manager.connect(user_id, websocket)
     
     try:
         while True:
-            # Receive messages from client
+            # Receive messages from client; any frame counts as a heartbeat
             data = await websocket.receive_json()
+            manager.touch(connection)
             message_type = data.get("type")
             
             if message_type == "typing":
@@ -316,10 +285,10 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, db: Session = D
             
             elif message_type == "ping":
                 # Keep connection alive
-                await websocket.send_json({"type": "pong"})
+                await manager.send_to(connection, {"type": "pong"})
             
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        await manager.disconnect(connection)
     except Exception as e:
         print(f"WebSocket error for user {user_id}: {e}")
-        manager.disconnect(user_id)
+        await manager.disconnect(connection)
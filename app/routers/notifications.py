@@ -1,65 +1,123 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from typing import Union, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, status, WebSocket, WebSocketDisconnect
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Union, Dict, Optional
+from datetime import datetime, timezone
+import asyncio
+import enum
 import json
+import logging
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_async_db
 from app.auth.security import get_current_active_user_or_admin
 from app.models.user import User
 from app.models.admin import Admin
 from app.models.notification import Notification
+from app.services.backplane import backplane
+from app.services.caregiver_map import caregiver_map
+from app.services.unread_counters import add_delta, apply_unread, unread_cache
+from app.services.notification_feed import FEED_TYPES, feed_query, group_page
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.services.ws_registry import Connection, ConnectionRegistry
 from app.schemas.notification import NotificationResponse, NotificationGroupResponse, NotificationCreate
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
+logger = logging.getLogger(__name__)
 
-# WebSocket connection manager for real-time notifications
-class NotificationConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
-    
-    async def connect(self, user_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+# WebSocket connections for real-time notifications; sockets held by other
+# workers are reached through the backplane
+class NotificationConnectionManager(ConnectionRegistry):
+    scope = "notifications"
+    
+    async def connect(self, user_id: int, websocket: WebSocket) -> Connection:
+        connection = await super().connect(user_id, websocket)
         print(f"✅ User {user_id} connected to notification WebSocket")
+        return connection
     
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        print(f"❌ User {user_id} disconnected from notification WebSocket")
+    async def disconnect(self, connection: Connection, code: Optional[int] = None):
+        if connection.closed:
+            return
+        await super().disconnect(connection, code)
+        print(f"❌ User {connection.user_id} disconnected from notification WebSocket")
     
     async def send_notification(self, user_id: int, notification: dict):
-        """Send notification to specific user if they're connected"""
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(notification)
-                return True
-            except Exception as e:
-                print(f"❌ Error sending notification to user {user_id}: {e}")
-                self.disconnect(user_id)
-        return False
-    
-    async def broadcast_to_caregivers(self, patient_id: int, notification: dict, db: Session):
-        """Send notification to all caregivers of a patient"""
-        from app.models.caregiver import CaregiverRelationship
+        """Send notification to specific user if they're connected to any worker"""
+        delivered = await self.send_local(user_id, notification)
+        routed = await self.backplane.send(self.scope, user_id, notification)
+        return delivered or routed > 0
+    
+    def is_user_online(self, user_id: int) -> bool:
+        return self.backplane.is_online(self.scope, user_id)
+    
+    async def _send_within(self, user_id: int, notification: dict, timeout: float) -> bool:
+        try:
+            return await asyncio.wait_for(self.send_notification(user_id, notification), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Notification to user {user_id} timed out after {timeout}s")
+            return False
+    
+    async def broadcast_to_caregivers(self, patient_id: int, notification: dict, db: AsyncSession,
+                                      record: Optional[dict] = None) -> dict:
+        """
+        Send notification to all caregivers of a patient at once, each send
+        bounded by WS_SEND_TIMEOUT_SECONDS. With `record` (Notification
+        columns), also store one row per caregiver in a single insert.
+        """
+        caregiver_ids = await caregiver_map.caregivers_for(db, patient_id)
+        if not caregiver_ids:
+            return {"recipients": 0, "delivered": 0}
+        
+        async def persist():
+            await db.execute(insert(Notification), [
+                {"user_id": caregiver_id, **record} for caregiver_id in caregiver_ids
+            ])
+            deltas = {}
+            for caregiver_id in caregiver_ids:
+                add_delta(deltas, caregiver_id, "notifications", 1)
+            await apply_unread(db, deltas)
+            await db.commit()
         
-        relationships = db.query(CaregiverRelationship).filter(
-            CaregiverRelationship.patient_id == patient_id,
-            CaregiverRelationship.status == "approved"
-        ).all()
+        timeout = settings.WS_SEND_TIMEOUT_SECONDS
+        sends = asyncio.gather(*(
+            self._send_within(caregiver_id, notification, timeout) for caregiver_id in caregiver_ids
+        ), return_exceptions=True)
+        if not record:
+            results = await sends
+        else:
+            # A failed insert must not hold back the live alert
+            stored, results = await asyncio.gather(persist(), sends, return_exceptions=True)
+            if isinstance(stored, Exception):
+                logger.error(f"Failed to store caregiver notifications for patient {patient_id}: {stored}")
+                await db.rollback()
         
-        for rel in relationships:
-            await self.send_notification(rel.caregiver_id, notification)
+        return {
+            "recipients": len(caregiver_ids),
+            "delivered": sum(1 for result in results if result is True),
+        }
+
+notification_manager = NotificationConnectionManager(backplane)
 
-notification_manager = NotificationConnectionManager()
+class NotificationType(str, enum.Enum):
+    SYSTEM = "system"
+    CAREGIVER = "caregiver"
+    DOCTOR = "doctor"
 
 @router.get("/", response_model=NotificationGroupResponse)
 async def get_notifications(
-    db: Session = Depends(get_db),
+    notification_type: Optional[NotificationType] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
     current: Union[User, Admin] = Depends(get_current_active_user_or_admin)
 ):
-    
-    
+    """
+    The newest `limit` notifications of each type. Page further back in one
+    group with `notification_type` and that group's `next_cursors` entry as
+    `cursor`; pass `since` to sync only notifications created after it.
+    """
     if isinstance(current, Admin):
         return NotificationGroupResponse(
             system=[],
@@ -67,26 +125,34 @@ async def get_notifications(
             doctor=[]
         )
     
+    if cursor is not None and notification_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A cursor belongs to one notification_type"
+        )
+    before_id = None
+    if cursor:
+        [before_id] = decode_cursor(cursor, int)
+    types = [notification_type.value] if notification_type else FEED_TYPES
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
     
-    notifications = db.query(Notification).filter(
-        Notification.user_id == current.id
-    ).order_by(Notification.created_at.desc()).all()
-    
-    
-    system = [n for n in notifications if n.notification_type == "system"]
-    caregiver = [n for n in notifications if n.notification_type == "caregiver"]
-    doctor = [n for n in notifications if n.notification_type == "doctor"]
+    notifications = (await db.scalars(feed_query(current.id, types, limit, since, before_id))).all()
+    groups = group_page(notifications, types, limit)
     
     return NotificationGroupResponse(
-        system=system,
-        caregiver=caregiver,
-        doctor=doctor
+        **{notification_type: groups.get(notification_type, {"items": []})["items"]
+           for notification_type in FEED_TYPES},
+        next_cursors={
+            notification_type: encode_cursor([group["next_id"]]) if group["next_id"] else None
+            for notification_type, group in groups.items()
+        }
     )
 
 @router.post("/mark-read/{notification_id}")
 async def mark_notification_read(
     notification_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current: Union[User, Admin] = Depends(get_current_active_user_or_admin)
 ):
     if isinstance(current, Admin):
@@ -95,10 +161,10 @@ async def mark_notification_read(
             detail="Admins don't have user notifications"
         )
     
-    notification = db.query(Notification).filter(
+    notification = await db.scalar(select(Notification).where(
         Notification.id == notification_id,
         Notification.user_id == current.id
-    ).first()
+    ))
     
     if not notification:
         raise HTTPException(
@@ -107,28 +173,24 @@ async def mark_notification_read(
         )
     
     notification.is_read = True
-    db.commit()
+    await db.commit()
     return {"message": "Notification marked as read"}
 
 @router.get("/unread-count")
 async def get_unread_count(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current: Union[User, Admin] = Depends(get_current_active_user_or_admin)
 ):
     if isinstance(current, Admin):
         return {"unread_count": 0}
     
-    count = db.query(Notification).filter(
-        Notification.user_id == current.id,
-        Notification.is_read == False
-    ).count()
-    
-    return {"unread_count": count}
+    counts = await unread_cache.counts(db, current.id)
+    return {"unread_count": counts["notifications"]}
 
 @router.post("/create")
 async def create_notification(
     notification_data: NotificationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current: Union[User, Admin] = Depends(get_current_active_user_or_admin)
 ):
     """Create a new notification (for internal use or admin)"""
@@ -145,8 +207,8 @@ async def create_notification(
     )
     
     db.add(notification)
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
     
     # Send real-time notification via WebSocket
     await notification_manager.send_notification(notification.user_id, {
@@ -167,21 +229,22 @@ async def create_notification(
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: int):
     """WebSocket connection for real-time notifications"""
-    await notification_manager.connect(user_id, websocket)
+    connection = await notification_manager.connect(user_id, websocket)
     
     try:
         while True:
-            # Receive messages from client (keep-alive pings)
+            # Receive messages from client (keep-alive pings and pongs)
             data = await websocket.receive_json()
+            notification_manager.touch(connection)
             
             if data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
+                await notification_manager.send_to(connection, {"type": "pong"})
             
     except WebSocketDisconnect:
-        notification_manager.disconnect(user_id)
+        await notification_manager.disconnect(connection)
     except Exception as e:
         print(f"WebSocket error for user {user_id}: {e}")
-        notification_manager.disconnect(user_id)
+        await notification_manager.disconnect(connection)
 
 # Helper function to send notification (can be imported by other routers)
 async def send_notification_to_user(
@@ -191,7 +254,7 @@ async def send_notification_to_user(
     message: str,
     sender_id: int = None,
     sender_type: str = None,
-    db: Session = None
+    db: AsyncSession = None
 ):
     """Helper function to create and send notification"""
     if not db:
@@ -207,8 +270,8 @@ async def send_notification_to_user(
     )
     
     db.add(notification)
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
     
     # Send via WebSocket
     await notification_manager.send_notification(user_id, {
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from app.database import get_db
 from app.auth.security import create_access_token
-from app.auth.hashing import verify_password
+from app.auth.hashing import verify_and_update_async
 from app.models.admin import Admin
 from pydantic import BaseModel, EmailStr, Field
 
@@ -40,21 +40,9 @@ async def admin_login(
     print(f"DEBUG: Found admin - ID: {admin.id}, Email: {admin.email}")
     print(f"DEBUG: Hashed password exists: {bool(admin.hashed_password)}")
     
-    # Debug: Show first few chars of hash
-    if admin.hashed_password:
-        print(f"DEBUG: Hash (first 30 chars): {admin.hashed_password[:30]}...")
-    
-    # Test password directly
-    print(f"DEBUG: Testing password: {request.password}")
-    from app.auth.hashing import get_password_hash
-    test_hash = get_password_hash(request.password)
-    print(f"DEBUG: Test hash (first 30 chars): {test_hash[:30]}...")
-    print(f"DEBUG: Hashes match: {admin.hashed_password == test_hash}")
-    
-    if not verify_password(request.password, admin.hashed_password):
+    password_valid, new_hash = await verify_and_update_async(request.password, admin.hashed_password)
+    if not password_valid:
         print(f"DEBUG: Password verification FAILED")
-        print(f"DEBUG: Stored hash: {admin.hashed_password[:50]}...")
-        print(f"DEBUG: Computed hash: {test_hash[:50]}...")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -68,6 +56,10 @@ async def admin_login(
             detail="Admin account is deactivated"
         )
     
+    if new_hash:
+        # Stored hash used an outdated scheme or cost
+        admin.hashed_password = new_hash
+    
     # Update last login time
     admin.last_login = datetime.now()
     db.commit()
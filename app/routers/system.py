@@ -2,6 +2,10 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.database import get_db
+from app.auth.hashing import hashing_pool
+from app.services.backplane import backplane
+from app.services.ws_registry import registry_stats
+from app.services.unread_counters import unread_cache
 from app.services.openai_service import logger
 import os
 
@@ -22,5 +26,10 @@ async def system_health(db: Session = Depends(get_db)):
         status["database"] = "connected"
     except Exception as e:
         status["database"] = f"error: {str(e)}"
+
+    status["password_hashing"] = hashing_pool.stats()
+    status["websocket_backplane"] = backplane.stats()
+    status["websockets"] = registry_stats()
+    status["unread_cache"] = unread_cache.stats()
         
     return status
\ No newline at end of file
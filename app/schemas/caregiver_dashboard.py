@@ -5,6 +5,7 @@ from enum import Enum
 
 class DashboardStats(BaseModel):
     total_patients: int = 0
+    pending_requests: int = 0
     active_patients: int = 0
     critical_patients: int = 0
     pending_tasks: int = 0
@@ -69,7 +70,17 @@ class AlertItem(BaseModel):
     timestamp: datetime
     is_read: bool = False
 
+class RecentActivity(BaseModel):
+    patient_id: int
+    relationship_type: Optional[str] = None
+    status: str
+    since: Optional[datetime] = None
+
 class CaregiverDashboardResponse(BaseModel):
+    total_patients: int = 0
+    pending_requests: int = 0
+    caregiver_status: str = "active"
+    recent_activity: List[RecentActivity] = []
     stats: DashboardStats
     recent_patients: List[PatientOverview]
     upcoming_tasks: List[TaskOverview]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 from typing import List
 
@@ -26,4 +26,6 @@ class NotificationResponse(NotificationBase):
 class NotificationGroupResponse(BaseModel):
     system: List[NotificationResponse]
     caregiver: List[NotificationResponse]
-    doctor: List[NotificationResponse]
\ No newline at end of file
+    doctor: List[NotificationResponse]
+    # Pass back as `cursor` with `notification_type` for the next page of a group
+    next_cursors: Dict[str, Optional[str]] = Field(default_factory=dict)
@@ -0,0 +1,389 @@
+"""
+Pub/sub backplane that lets a worker reach WebSocket connections held by
+the other gunicorn workers.
+
+Every worker subscribes to the shared presence channel and to its own
+worker channel. Connection managers register a delivery callback per scope
+("messages", "notifications") and report connects and disconnects with
+`join` / `leave`. Workers announce those on the presence channel, and each
+one republishes a snapshot of its users every WS_PRESENCE_INTERVAL_SECONDS.
+That way every worker knows, in memory, which workers hold which users:
+- `is_online` answers cluster-wide without a round trip.
+- `send` publishes only to the channels of the workers holding the user.
+- A worker that dies without saying goodbye drops out after three missed
+  snapshots.
+
+WS_BACKPLANE_URL selects the transport:
+- "memory://" (the default) keeps everything in this process.
+- "redis://[[username]:password@]host[:port][/db]" uses any server speaking
+  the Redis PUBLISH / SUBSCRIBE protocol; "rediss://" connects over TLS.
+"""
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from urllib.parse import urlparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[int, dict], Awaitable[bool]]
+Handler = Callable[[dict], None]
+
+PRESENCE_CHANNEL = "presence"
+PRESENCE_EXPIRY_INTERVALS = 3
+
+
+def worker_channel(worker_id: str) -> str:
+    return f"worker:{worker_id}"
+
+
+class Backplane:
+    """Presence and routing on top of a transport implemented by subclasses"""
+
+    def __init__(self, worker_id: Optional[str] = None, presence_interval: float = 15.0):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.presence_interval = presence_interval
+        self._deliver: Dict[str, Deliver] = {}
+        self._handlers: Dict[str, Handler] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._local: Dict[str, Counter] = {}
+        # worker_id -> (scope -> user ids, last heard from)
+        self._remote: Dict[str, Tuple[Dict[str, Set[int]], float]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.started = False
+
+        self.published = 0
+        self.received = 0
+        self.publish_errors = 0
+
+    # -- transport -------------------------------------------------------
+
+    async def _open(self, channels) -> None:
+        raise NotImplementedError
+
+    async def _publish(self, channel: str, data: str) -> None:
+        raise NotImplementedError
+
+    async def _close(self) -> None:
+        raise NotImplementedError
+
+    # -- lifecycle -------------------------------------------------------
+
+    def register(self, scope: str, deliver: Deliver) -> None:
+        """Local delivery for `scope`: deliver(user_id, payload) -> delivered"""
+        self._deliver[scope] = deliver
+        self._local.setdefault(scope, Counter())
+
+    def on(self, topic: str, handler: Handler) -> None:
+        """Run handler(payload) when another worker broadcasts on `topic`"""
+        self._handlers[topic] = handler
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        await self._open([PRESENCE_CHANNEL, worker_channel(self.worker_id)])
+        self._loop = asyncio.get_running_loop()
+        self.started = True
+        # Ask the others for their users instead of waiting for a heartbeat
+        await self._broadcast({"op": "sync"})
+        await self._announce_snapshot()
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if not self.started:
+            return
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+        await self._broadcast({"op": "bye"})
+        self.started = False
+        await self._close()
+        self._remote.clear()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.presence_interval)
+            self._expire_workers()
+            await self._announce_snapshot()
+
+    # -- presence --------------------------------------------------------
+
+    async def join(self, scope: str, user_id: int) -> None:
+        users = self._local.setdefault(scope, Counter())
+        users[user_id] += 1
+        if users[user_id] == 1:
+            await self._broadcast({"op": "join", "scope": scope, "user_id": user_id})
+
+    async def leave(self, scope: str, user_id: int) -> None:
+        users = self._local.setdefault(scope, Counter())
+        if users[user_id] <= 1:
+            users.pop(user_id, None)
+            await self._broadcast({"op": "leave", "scope": scope, "user_id": user_id})
+        else:
+            users[user_id] -= 1
+
+    def workers_for(self, scope: str, user_id: int) -> Set[str]:
+        """Other live workers holding a connection for the user"""
+        deadline = time.monotonic() - self.presence_interval * PRESENCE_EXPIRY_INTERVALS
+        return {
+            worker_id for worker_id, (scopes, seen) in self._remote.items()
+            if seen >= deadline and user_id in scopes.get(scope, ())
+        }
+
+    def is_online(self, scope: str, user_id: int) -> bool:
+        return bool(self._local.get(scope, {}).get(user_id)) or bool(self.workers_for(scope, user_id))
+
+    def _expire_workers(self):
+        deadline = time.monotonic() - self.presence_interval * PRESENCE_EXPIRY_INTERVALS
+        for worker_id in [w for w, (_, seen) in self._remote.items() if seen < deadline]:
+            logger.warning(f"Backplane worker {worker_id} stopped sending presence")
+            del self._remote[worker_id]
+
+    async def _announce_snapshot(self):
+        await self._broadcast({
+            "op": "snapshot",
+            "users": {scope: list(users) for scope, users in self._local.items()},
+        })
+
+    # -- routing ---------------------------------------------------------
+
+    async def send(self, scope: str, user_id: int, payload: dict) -> int:
+        """Publish to the workers holding the user; returns how many were targeted"""
+        workers = self.workers_for(scope, user_id)
+        for worker_id in workers:
+            await self._emit(worker_channel(worker_id), {
+                "op": "deliver", "scope": scope, "user_id": user_id, "payload": payload,
+            })
+        return len(workers)
+
+    async def broadcast(self, topic: str, payload: dict) -> None:
+        """Tell every other worker; used for cache invalidation"""
+        await self._broadcast({"op": "event", "topic": topic, "payload": payload})
+
+    def broadcast_nowait(self, topic: str, payload: dict) -> None:
+        """`broadcast` from sync code, including threadpool endpoints"""
+        if self.started and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(
+                lambda: self._loop.create_task(self.broadcast(topic, payload))
+            )
+
+    async def _broadcast(self, message: dict):
+        await self._emit(PRESENCE_CHANNEL, message)
+
+    async def _emit(self, channel: str, message: dict):
+        if not self.started:
+            return
+        try:
+            await self._publish(channel, json.dumps({**message, "origin": self.worker_id}, default=str))
+            self.published += 1
+        except Exception as e:
+            self.publish_errors += 1
+            logger.error(f"Backplane publish to {channel} failed: {e}")
+
+    async def _dispatch(self, data) -> None:
+        message = json.loads(data)
+        origin = message.pop("origin", None)
+        if origin == self.worker_id:
+            return
+        self.received += 1
+        op = message.get("op")
+
+        if op == "deliver":
+            deliver = self._deliver.get(message["scope"])
+            if deliver:
+                await deliver(message["user_id"], message["payload"])
+            return
+
+        if op == "event":
+            handler = self._handlers.get(message["topic"])
+            if handler:
+                handler(message["payload"])
+            return
+
+        if op == "bye":
+            self._remote.pop(origin, None)
+            return
+        if op == "sync":
+            await self._announce_snapshot()
+            return
+
+        scopes, _ = self._remote.get(origin, ({}, 0.0))
+        if op == "snapshot":
+            scopes = {scope: set(users) for scope, users in message["users"].items()}
+        elif op == "join":
+            scopes.setdefault(message["scope"], set()).add(message["user_id"])
+        elif op == "leave":
+            scopes.get(message["scope"], set()).discard(message["user_id"])
+        self._remote[origin] = (scopes, time.monotonic())
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "transport": type(self).__name__,
+            "started": self.started,
+            "local_users": {scope: len(users) for scope, users in self._local.items()},
+            "remote_workers": len(self._remote),
+            "published": self.published,
+            "received": self.received,
+            "publish_errors": self.publish_errors,
+        }
+
+
+class InProcessBus:
+    """Channel fan-out between backplanes in one process"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set["InProcessBackplane"]] = {}
+
+    async def publish(self, channel: str, data: str):
+        for backplane in list(self.subscribers.get(channel, ())):
+            await backplane._dispatch(data)
+
+
+_default_bus = InProcessBus()
+
+
+class InProcessBackplane(Backplane):
+    def __init__(self, bus: Optional[InProcessBus] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.bus = bus or _default_bus
+        self._channels = []
+
+    async def _open(self, channels):
+        self._channels = list(channels)
+        for channel in self._channels:
+            self.bus.subscribers.setdefault(channel, set()).add(self)
+
+    async def _publish(self, channel, data):
+        await self.bus.publish(channel, data)
+
+    async def _close(self):
+        for channel in self._channels:
+            self.bus.subscribers.get(channel, set()).discard(self)
+
+
+class RedisBackplane(Backplane):
+    """
+    PUBLISH / SUBSCRIBE through redis-py, so TLS ("rediss://"), ACL users
+    and database selection come from the URL. The subscriber reconnects
+    with backoff. `start` waits at most `connect_timeout` for it; past that
+    the worker serves its own sockets only, and the listener keeps trying
+    in the background. Publishes while disconnected are dropped and
+    counted, as a dropped socket send was before.
+    """
+
+    def __init__(self, url: str, prefix: str = "hewal3:ws:", connect_timeout: float = 5.0, **kwargs):
+        super().__init__(**kwargs)
+        import redis.asyncio as aioredis
+
+        # Raises ValueError for a URL redis-py cannot use
+        self._client = aioredis.from_url(url, socket_connect_timeout=connect_timeout)
+        self.prefix = prefix
+        self.connect_timeout = connect_timeout
+        self.connected = False
+        self._channels = []
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    async def _open(self, channels):
+        self._channels = [self.prefix + channel for channel in channels]
+        self._subscribed = asyncio.Event()
+        self._listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Backplane not reachable within {self.connect_timeout:.1f}s; "
+                "delivering to local connections until it is"
+            )
+
+    async def _listen(self):
+        backoff = 0.1
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(*self._channels)
+                confirmed = 0
+                while confirmed < len(self._channels):
+                    reply = await pubsub.get_message(timeout=None)
+                    if reply and reply["type"] == "subscribe":
+                        confirmed += 1
+                self.connected = True
+                self._subscribed.set()
+                backoff = 0.1
+                if self.started:
+                    # Reconnected, or connected after a degraded start: presence
+                    # published while we were away is lost
+                    await self._broadcast({"op": "sync"})
+                    await self._announce_snapshot()
+                async for reply in pubsub.listen():
+                    if reply["type"] != "message":
+                        continue
+                    try:
+                        await self._dispatch(reply["data"])
+                    except Exception as e:
+                        logger.error(f"Backplane message handling failed: {e}")
+                raise ConnectionError("Backplane subscription ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.connected = False
+                logger.warning(f"Backplane subscriber disconnected: {e}; retrying in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+            finally:
+                self.connected = False
+                await pubsub.aclose()
+
+    async def _publish(self, channel, data):
+        if not self.connected:
+            raise ConnectionError("Backplane is not connected")
+        await self._client.publish(self.prefix + channel, data)
+
+    async def _close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self._client.connection_pool.disconnect()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "connected": self.connected}
+
+
+def create_backplane(url: str, connect_timeout: float = 5.0, **kwargs) -> Backplane:
+    """
+    The backplane for WS_BACKPLANE_URL. A URL that cannot be used is logged
+    and falls back to in-process delivery rather than failing the import.
+    """
+    scheme = urlparse(url).scheme
+    if scheme in ("", "memory"):
+        return InProcessBackplane(**kwargs)
+    if scheme in ("redis", "rediss", "unix"):
+        try:
+            return RedisBackplane(url, connect_timeout=connect_timeout, **kwargs)
+        except (ImportError, ValueError) as e:
+            logger.error(f"WS_BACKPLANE_URL is unusable ({e}); using the in-process backplane")
+            return InProcessBackplane(**kwargs)
+    logger.error(f"Unsupported WS_BACKPLANE_URL scheme {scheme!r}; using the in-process backplane")
+    return InProcessBackplane(**kwargs)
+
+
+backplane = create_backplane(
+    settings.WS_BACKPLANE_URL,
+    presence_interval=settings.WS_PRESENCE_INTERVAL_SECONDS,
+    connect_timeout=settings.WS_BACKPLANE_CONNECT_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,97 @@
+"""
+Process-local cache of each patient's approved caregivers, used to fan out
+alerts without a relationship query per event.
+
+Entries expire after CAREGIVER_MAP_TTL_SECONDS. A patient's entry is also
+dropped once a transaction that inserted, updated or deleted one of their
+relationship rows commits. That happens on this worker directly and on the
+other workers through the backplane.
+"""
+from typing import Tuple
+import threading
+import logging
+
+from cachetools import TTLCache
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.caregiver import CaregiverRelationship
+from app.services.backplane import backplane
+
+logger = logging.getLogger(__name__)
+
+TOPIC = "caregiver_map"
+DIRTY_KEY = "caregiver_map_dirty"
+
+
+class CaregiverMap:
+    def __init__(self, maxsize: int, ttl: int):
+        self.enabled = ttl > 0 and maxsize > 0
+        self._cache = TTLCache(maxsize=max(maxsize, 1), ttl=max(ttl, 1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def caregivers_for(self, db, patient_id: int) -> Tuple[int, ...]:
+        """Approved caregiver ids for the patient, from cache or one query"""
+        if self.enabled:
+            with self._lock:
+                cached = self._cache.get(patient_id)
+                if cached is not None:
+                    self.hits += 1
+                    return cached
+                self.misses += 1
+
+        caregiver_ids = tuple((await db.scalars(select(CaregiverRelationship.caregiver_id).where(
+            CaregiverRelationship.patient_id == patient_id,
+            CaregiverRelationship.status == "approved"
+        ).order_by(CaregiverRelationship.caregiver_id))).all())
+
+        if self.enabled:
+            with self._lock:
+                self._cache[patient_id] = caregiver_ids
+        return caregiver_ids
+
+    def invalidate(self, patient_id: int) -> None:
+        with self._lock:
+            self._cache.pop(patient_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._cache)
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+caregiver_map = CaregiverMap(
+    maxsize=settings.CAREGIVER_MAP_MAXSIZE,
+    ttl=settings.CAREGIVER_MAP_TTL_SECONDS,
+)
+
+
+def _mark_dirty(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None and target.patient_id is not None:
+        session.info.setdefault(DIRTY_KEY, set()).add(target.patient_id)
+
+
+def _invalidate_committed(session):
+    for patient_id in session.info.pop(DIRTY_KEY, ()):
+        caregiver_map.invalidate(patient_id)
+        backplane.broadcast_nowait(TOPIC, {"patient_id": patient_id})
+
+
+def _discard_rolled_back(session, previous_transaction):
+    session.info.pop(DIRTY_KEY, None)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(CaregiverRelationship, _event, _mark_dirty)
+event.listen(Session, "after_commit", _invalidate_committed)
+event.listen(Session, "after_soft_rollback", _discard_rolled_back)
+
+backplane.on(TOPIC, lambda payload: caregiver_map.invalidate(payload["patient_id"]))
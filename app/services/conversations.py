@@ -0,0 +1,209 @@
+"""
+Incremental maintenance of `conversations`.
+
+Each pair of users who have exchanged messages has one row keyed by
+(user_low_id, user_high_id). Sending a message upserts the row in the same
+transaction as the message insert: the last message moves forward only for a
+higher message id, and the receiver's unread counter is incremented in SQL so
+concurrent sends never lose a count. Marking messages read flips only rows
+that were still unread and decrements the matching counters by exactly that
+many. `rebuild_conversations` recomputes the table from `messages`.
+"""
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, tuple_, update
+
+from app.models.caregiver import Message
+from app.models.conversation import Conversation
+from app.models.user import User
+from app.services.unread_counters import add_delta, apply_unread
+from app.utils.sql import greatest, least, upsert
+
+PREVIEW_LENGTH = 200
+
+
+def conversation_key(user_id: int, other_id: int) -> Tuple[int, int]:
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+def preview(content: Optional[str]) -> Optional[str]:
+    return content[:PREVIEW_LENGTH] if content else content
+
+
+def conversation_upsert(db):
+    table = Conversation.__table__
+    stmt = upsert(db, table)
+    excluded = stmt.excluded
+    newer = excluded.last_message_id > table.c.last_message_id
+
+    def latest(column):
+        return case((newer, excluded[column]), else_=table.c[column])
+
+    return stmt.on_conflict_do_update(
+        index_elements=["user_low_id", "user_high_id"],
+        set_={
+            **{column: latest(column) for column in
+               ("last_message_id", "last_sender_id", "last_message_preview", "last_message_at")},
+            "unread_low": table.c.unread_low + excluded.unread_low,
+            "unread_high": table.c.unread_high + excluded.unread_high,
+            "updated_at": func.now(),
+        },
+    )
+
+
+async def record_message(db, message: Message) -> None:
+    """Fold a flushed message into its conversation; caller commits"""
+    low, high = conversation_key(message.sender_id, message.receiver_id)
+    unread = 0 if message.is_read else 1
+    await db.execute(conversation_upsert(db), [{
+        "user_low_id": low,
+        "user_high_id": high,
+        "last_message_id": message.id,
+        "last_sender_id": message.sender_id,
+        "last_message_preview": preview(message.content),
+        "last_message_at": message.created_at,
+        "unread_low": unread if message.receiver_id == low else 0,
+        "unread_high": unread if message.receiver_id == high else 0,
+    }])
+    await apply_unread(db, add_delta({}, message.receiver_id, "messages", unread))
+
+
+async def mark_read(db, reader_id: int, message_ids) -> int:
+    """
+    Mark the reader's unread messages among `message_ids` as read and take
+    them off the conversation counters; caller commits. Returns how many
+    messages changed.
+    """
+    senders = (await db.execute(
+        update(Message).where(
+            Message.id.in_(message_ids),
+            Message.receiver_id == reader_id,
+            Message.is_read == False
+        ).values(is_read=True).returning(Message.sender_id)
+    )).scalars().all()
+
+    counts: Dict[int, int] = {}
+    for sender_id in senders:
+        counts[sender_id] = counts.get(sender_id, 0) + 1
+    rows = []
+    for sender_id, count in counts.items():
+        low, high = conversation_key(reader_id, sender_id)
+        rows.append({"low": low, "high": high,
+                     "read_low": count if reader_id == low else 0,
+                     "read_high": count if reader_id == high else 0})
+    if rows:
+        await db.execute(unread_decrement(db), rows)
+        await apply_unread(db, add_delta({}, reader_id, "messages", -len(senders)))
+    return len(senders)
+
+
+def unread_decrement(db):
+    return update(Conversation.__table__).where(
+        Conversation.user_low_id == bindparam("low"),
+        Conversation.user_high_id == bindparam("high")
+    ).values(
+        unread_low=greatest(db, Conversation.unread_low - bindparam("read_low"), 0),
+        unread_high=greatest(db, Conversation.unread_high - bindparam("read_high"), 0)
+    )
+
+
+def partner_id(user_id: int):
+    return case((Conversation.user_low_id == user_id, Conversation.user_high_id),
+                else_=Conversation.user_low_id)
+
+
+def unread_for(user_id: int):
+    return case((Conversation.user_low_id == user_id, Conversation.unread_low),
+                else_=Conversation.unread_high)
+
+
+def involving(user_id: int):
+    return or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+
+
+def inbox_query(user_id: int):
+    """(Conversation, partner User, unread count) rows, most recent activity first"""
+    return select(Conversation, User, unread_for(user_id).label("unread_count")).join(
+        User, User.id == partner_id(user_id)
+    ).where(involving(user_id)).order_by(
+        Conversation.last_message_at.desc(), Conversation.last_message_id.desc()
+    )
+
+
+def message_position(message_id: int):
+    """(created_at, id) of a message, for keyset comparisons"""
+    return tuple_(
+        select(Message.created_at).where(Message.id == message_id).scalar_subquery(),
+        message_id
+    )
+
+
+def history_query(user_id: int, other_id: int, before_id: Optional[int] = None,
+                  after_id: Optional[int] = None):
+    """
+    Messages between two users on the pair index. With `after_id` the page
+    runs oldest first from just after that message (sync); otherwise newest
+    first, ending just before `before_id` when given.
+    """
+    low, high = conversation_key(user_id, other_id)
+    position = tuple_(Message.created_at, Message.id)
+    query = select(Message).where(Message.user_low_id == low, Message.user_high_id == high)
+    if after_id is not None:
+        return query.where(position > message_position(after_id)).order_by(
+            Message.created_at, Message.id
+        )
+    if before_id is not None:
+        query = query.where(position < message_position(before_id))
+    return query.order_by(Message.created_at.desc(), Message.id.desc())
+
+
+def backfill_message_pairs(db) -> int:
+    """Fill the pair columns of messages written before they existed"""
+    result = db.execute(
+        update(Message).where(Message.user_low_id.is_(None)).values(
+            user_low_id=least(db, Message.sender_id, Message.receiver_id),
+            user_high_id=greatest(db, Message.sender_id, Message.receiver_id)
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def rebuild_conversations(db, chunk_size: int = 5000) -> int:
+    """Recompute the whole table from `messages`"""
+    db.execute(delete(Conversation))
+
+    low = least(db, Message.sender_id, Message.receiver_id)
+    high = greatest(db, Message.sender_id, Message.receiver_id)
+    pairs = select(
+        low.label("user_low_id"),
+        high.label("user_high_id"),
+        func.max(Message.id).label("last_message_id"),
+        func.count().filter(and_(Message.is_read == False, Message.receiver_id == low)).label("unread_low"),
+        func.count().filter(and_(Message.is_read == False, Message.receiver_id == high)).label("unread_high"),
+    ).group_by(low, high).subquery()
+
+    rows = db.execute(
+        select(pairs, Message.sender_id, Message.content, Message.created_at).join(
+            Message, Message.id == pairs.c.last_message_id
+        ).execution_options(yield_per=chunk_size)
+    ).mappings()
+
+    total = 0
+    for chunk in rows.partitions():
+        db.execute(insert(Conversation), [
+            {
+                "user_low_id": row["user_low_id"],
+                "user_high_id": row["user_high_id"],
+                "last_message_id": row["last_message_id"],
+                "last_sender_id": row["sender_id"],
+                "last_message_preview": preview(row["content"]),
+                "last_message_at": row["created_at"],
+                "unread_low": row["unread_low"],
+                "unread_high": row["unread_high"],
+            }
+            for row in chunk
+        ])
+        total += len(chunk)
+    db.commit()
+    return total
@@ -0,0 +1,171 @@
+"""
+Incremental maintenance of `daily_health_summary`.
+
+Write paths convert what they store into per (user_id, day) increments and
+merge them with one additive INSERT ... ON CONFLICT DO UPDATE in their own
+transaction. Days are UTC dates, like every other stored timestamp: naive
+timestamps are taken as UTC and aware ones converted to it.
+`rebuild_daily_summaries` recomputes the table from raw rows.
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, func, select
+
+from app.models.daily_health_summary import DailyHealthSummary
+from app.models.health import FoodLog, HealthData
+from app.models.iot_device import VitalReading
+from app.utils.sql import upsert
+
+COUNTERS = (
+    "health_entries", "steps", "water_intake", "calories_burned",
+    "heart_rate_sum", "heart_rate_count", "glucose_sum", "glucose_count",
+    "vital_count", "emergency_count", "meal_count", "diet_score_total",
+)
+
+Increments = Dict[Tuple[int, date], dict]
+
+
+def summary_day(ts: datetime) -> date:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.date()
+
+
+def _bucket(increments: Increments, user_id: int, ts: datetime) -> dict:
+    key = (user_id, summary_day(ts))
+    row = increments.get(key)
+    if row is None:
+        row = increments[key] = dict.fromkeys(COUNTERS, 0)
+    return row
+
+
+def accumulate_health_data(increments: Increments, record) -> Increments:
+    row = _bucket(increments, record.user_id, record.date or datetime.utcnow())
+    row["health_entries"] += 1
+    row["steps"] += record.steps or 0
+    row["water_intake"] += record.water_intake or 0
+    row["calories_burned"] += record.calories_burned or 0
+    if record.heart_rate:
+        row["heart_rate_sum"] += record.heart_rate
+        row["heart_rate_count"] += 1
+    if record.blood_glucose:
+        row["glucose_sum"] += record.blood_glucose
+        row["glucose_count"] += 1
+    return increments
+
+
+def accumulate_food_log(increments: Increments, log) -> Increments:
+    row = _bucket(increments, log.user_id, log.created_at or datetime.utcnow())
+    row["meal_count"] += 1
+    row["diet_score_total"] += log.diet_score or 0
+    return increments
+
+
+def accumulate_readings(increments: Increments, readings: Iterable[dict]) -> Increments:
+    """From VitalReading row dicts as written by the ingest pipeline"""
+    for reading in readings:
+        if reading["user_id"] is None:
+            continue
+        row = _bucket(increments, reading["user_id"], reading["timestamp"])
+        row["vital_count"] += 1
+        if reading.get("is_emergency"):
+            row["emergency_count"] += 1
+        if reading.get("heart_rate") is not None:
+            row["heart_rate_sum"] += reading["heart_rate"]
+            row["heart_rate_count"] += 1
+        if reading.get("glucose_level") is not None:
+            row["glucose_sum"] += reading["glucose_level"]
+            row["glucose_count"] += 1
+    return increments
+
+
+def summary_upsert(db):
+    table = DailyHealthSummary.__table__
+    stmt = upsert(db, table)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "day"],
+        set_={
+            **{name: table.c[name] + stmt.excluded[name] for name in COUNTERS},
+            "updated_at": func.now(),
+        },
+    )
+
+
+def _rows(increments: Increments) -> List[dict]:
+    return [
+        {"user_id": user_id, "day": day, **values}
+        for (user_id, day), values in sorted(increments.items())
+    ]
+
+
+async def apply_daily_summary(db, increments: Increments) -> None:
+    """Merge increments into the summary; caller commits"""
+    if increments:
+        await db.execute(summary_upsert(db), _rows(increments))
+
+
+def apply_daily_summary_sync(db, increments: Increments) -> None:
+    if increments:
+        db.execute(summary_upsert(db), _rows(increments))
+
+
+def summaries_query(user_ids: List[int], start: date, end: date = None):
+    end = end or datetime.utcnow().date()
+    return (
+        select(DailyHealthSummary)
+        .where(
+            DailyHealthSummary.user_id.in_(user_ids),
+            DailyHealthSummary.day >= start,
+            DailyHealthSummary.day <= end,
+        )
+        .order_by(DailyHealthSummary.user_id, DailyHealthSummary.day)
+    )
+
+
+def combine(summaries: Iterable[DailyHealthSummary]) -> dict:
+    """Fold day rows into period averages (None where nothing was recorded)"""
+    summaries = list(summaries)
+    heart_rate_count = sum(s.heart_rate_count for s in summaries)
+    glucose_count = sum(s.glucose_count for s in summaries)
+    step_days = [s.steps for s in summaries if s.steps]
+    return {
+        "days": len(summaries),
+        "avg_heart_rate": sum(s.heart_rate_sum for s in summaries) / heart_rate_count if heart_rate_count else None,
+        "avg_blood_glucose": sum(s.glucose_sum for s in summaries) / glucose_count if glucose_count else None,
+        "avg_daily_steps": sum(step_days) / len(step_days) if step_days else None,
+        "total_steps": sum(step_days),
+    }
+
+
+def rebuild_daily_summaries(db, chunk_size: int = 5000) -> int:
+    """Recompute the whole table from health_data, food_logs and vital_readings"""
+    db.execute(delete(DailyHealthSummary))
+
+    sources = (
+        (select(HealthData), accumulate_health_data),
+        (select(FoodLog), accumulate_food_log),
+    )
+    for query, add in sources:
+        increments: Increments = {}
+        for record in db.scalars(query.execution_options(yield_per=chunk_size)):
+            add(increments, record)
+            if len(increments) >= chunk_size:
+                apply_daily_summary_sync(db, increments)
+                increments = {}
+        apply_daily_summary_sync(db, increments)
+
+    columns = select(
+        VitalReading.user_id, VitalReading.timestamp, VitalReading.heart_rate,
+        VitalReading.glucose_level, VitalReading.is_emergency,
+    ).execution_options(yield_per=chunk_size)
+    increments = {}
+    for reading in db.execute(columns).mappings():
+        accumulate_readings(increments, [reading])
+        if len(increments) >= chunk_size:
+            apply_daily_summary_sync(db, increments)
+            increments = {}
+    apply_daily_summary_sync(db, increments)
+
+    db.commit()
+    return db.scalar(select(func.count()).select_from(DailyHealthSummary))
@@ -0,0 +1,392 @@
+"""
+Write-behind buffer for single vital readings posted to /iot/webhook.
+
+Accepted readings are appended to a local spool file before the request is
+acknowledged, held in memory, and written to `vital_readings` in batches by
+a background task once IOT_BUFFER_FLUSH_SIZE readings are pending or
+IOT_BUFFER_FLUSH_INTERVAL_MS has passed. When IOT_BUFFER_MAX_SIZE readings
+are pending, new readings are refused so callers back off (HTTP 429).
+
+The spool is split into segments: a flush closes the active segment and
+deletes the closed ones only after the batch is committed, so readings
+acknowledged before a crash are replayed by `recover()` on the next start.
+
+Every worker process writes its own segments, named after an owner id, and
+holds an exclusive flock on the owner's lock file while it lives.
+`recover()` only claims segments whose owner lock can be taken, i.e. whose
+process has exited, and renames them into its own name before replaying.
+Each reading carries an `ingest_key`, so a replay of readings that were in
+fact committed before the crash stores nothing twice.
+
+All spool file work runs on one dedicated writer thread, in submission
+order, so neither the write (nor its fsync) nor segment rotation blocks the
+event loop. After IOT_BUFFER_MAX_FLUSH_ATTEMPTS failed flushes in a row the
+batch is retried reading by reading. Readings the database rejects
+outright go to the `<spool>.dead` file (NDJSON) instead of blocking every
+later flush. Connection and operational errors are never dead-lettered.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import asyncio
+import glob
+import json
+import logging
+import os
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so every foreign segment counts as orphaned
+    fcntl = None
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.config import settings
+from app.database import async_session_scope
+from app.services.vital_ingest import ingest_readings
+
+logger = logging.getLogger(__name__)
+
+
+# Worth retrying as they are; anything else is a problem with the readings
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)
+
+
+class BufferFull(Exception):
+    pass
+
+
+def _encode(reading: dict) -> str:
+    return json.dumps({
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in reading.items()
+    })
+
+
+def _decode(line: str) -> dict:
+    reading = json.loads(line)
+    reading["timestamp"] = datetime.fromisoformat(reading["timestamp"])
+    return reading
+
+
+class IngestBuffer:
+    def __init__(self, spool_path: str, max_size: int, flush_size: int,
+                 flush_interval_ms: int, fsync: bool = False,
+                 max_flush_attempts: int = 3, session_scope=async_session_scope):
+        self.spool_path = spool_path
+        self.max_size = max(max_size, 1)
+        self.flush_size = max(min(flush_size, self.max_size), 1)
+        self.flush_interval = max(flush_interval_ms, 1) / 1000
+        self.fsync = fsync
+        self.max_flush_attempts = max(max_flush_attempts, 1)
+        self.session_scope = session_scope
+        self.dead_letter_path = f"{spool_path}.dead"
+
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.pending: List[dict] = []
+        self._segments: List[str] = []
+        self._spool = None
+        self._owner_lock = None
+        self._segment_seq = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spool")
+        self._failed_attempts = 0
+        # Taken by a flush but not yet stored; still counts against max_size
+        self._in_flight = 0
+
+        self.accepted = 0
+        self.flushed = 0
+        self.rejected = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+
+    # -- spool -----------------------------------------------------------
+
+    def _segments_by_owner(self) -> Dict[str, List[str]]:
+        """Segments on disk grouped by owner id (lock-only owners too), oldest first"""
+        prefix = f"{self.spool_path}."
+        owners: Dict[str, List[str]] = {}
+        for path in glob.glob(f"{glob.escape(self.spool_path)}.*"):
+            owner, _, seq = path[len(prefix):].rpartition(".")
+            if seq.isdigit():
+                owners.setdefault(owner, []).append(path)
+            elif seq == "lock" and owner != "recover":
+                owners.setdefault(owner, [])
+        for paths in owners.values():
+            paths.sort(key=lambda path: int(path.rsplit(".", 1)[-1]))
+        return owners
+
+    def _lock(self, path: str, blocking: bool = False):
+        """Open `path` and flock it; None if another process holds it"""
+        handle = open(path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                handle.close()
+                return None
+        return handle
+
+    def _next_segment_path(self) -> str:
+        # Held for the life of the process, before any segment exists
+        if self._owner_lock is None:
+            Path(self.spool_path).parent.mkdir(parents=True, exist_ok=True)
+            self._owner_lock = self._lock(f"{self.spool_path}.{self.owner}.lock", blocking=True)
+        self._segment_seq += 1
+        return f"{self.spool_path}.{self.owner}.{self._segment_seq}"
+
+    def _open_segment(self):
+        self._spool = open(self._next_segment_path(), "a", encoding="utf-8")
+
+    def _close_segment(self):
+        if self._spool is not None:
+            self._spool.close()
+            self._segments.append(self._spool.name)
+            self._spool = None
+
+    def _spool_write(self, reading: dict):
+        if self._spool is None:
+            self._open_segment()
+        self._spool.write(_encode(reading) + "\n")
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def _remove_segments(self, paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _dead_letter_write(self, readings: List[dict]):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead:
+            dead.writelines(_encode(reading) + "\n" for reading in readings)
+            dead.flush()
+            os.fsync(dead.fileno())
+
+    def _in_writer(self, fn, *args) -> asyncio.Future:
+        """Queue spool work on the writer thread; submitted before returning"""
+        return asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+
+    def _bind_loop(self):
+        # Lock, event and flusher task belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._flush_lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._task = None
+
+    # -- public API ------------------------------------------------------
+
+    async def add(self, reading: dict):
+        """Spool and queue a reading; raises BufferFull under backpressure"""
+        if len(self.pending) + self._in_flight >= self.max_size:
+            self.rejected += 1
+            raise BufferFull("Ingest buffer is full")
+
+        self._bind_loop()
+        reading = {**reading, "ingest_key": uuid.uuid4().hex}
+        # Queued ahead of any rotation a flush that takes this reading makes,
+        # so its line always lands in a segment that flush owns
+        written = self._in_writer(self._spool_write, reading)
+        self.pending.append(reading)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self.pending) >= self.flush_size:
+            self._wakeup.set()
+
+        try:
+            await written
+        except Exception:
+            if reading in self.pending:
+                self.pending.remove(reading)
+            raise
+        self.accepted += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        self._bind_loop()
+        async with self._flush_lock:
+            if not self.pending:
+                return 0
+
+            batch, self.pending = self.pending, []
+            self._in_flight = len(batch)
+            try:
+                await self._in_writer(self._close_segment)
+                segments = list(self._segments)
+
+                if self._failed_attempts >= self.max_flush_attempts:
+                    stored, rest = await self._flush_one_by_one(batch)
+                else:
+                    stored, rest = await self._flush_batch(batch)
+            except BaseException:
+                self.pending = batch + self.pending
+                raise
+            finally:
+                self._in_flight = 0
+            if rest:
+                # Keep readings (and their spool segments) for the next attempt
+                self.pending = rest + self.pending
+                self.flushed += stored
+                return stored
+
+            self._failed_attempts = 0
+            await self._in_writer(self._remove_segments, segments)
+            self._segments = [path for path in self._segments if path not in segments]
+            self.flushed += stored
+            return stored
+
+    async def _flush_batch(self, batch: List[dict]):
+        """(stored, readings left pending)"""
+        try:
+            async with self.session_scope() as db:
+                await ingest_readings(db, batch)
+        except Exception as e:
+            self.failed_flushes += 1
+            self._failed_attempts += 1
+            logger.error(f"Ingest buffer flush of {len(batch)} readings failed: {str(e)}")
+            return 0, batch
+        return len(batch), []
+
+    async def _flush_one_by_one(self, batch: List[dict]):
+        """
+        Isolate the readings that keep a batch failing: store each on its own
+        and dead-letter the ones rejected for anything but a transient error.
+        """
+        stored, dead = 0, []
+        for index, reading in enumerate(batch):
+            try:
+                async with self.session_scope() as db:
+                    await ingest_readings(db, [reading])
+            except TRANSIENT_ERRORS as e:
+                self.failed_flushes += 1
+                logger.error(f"Ingest buffer flush failed: {str(e)}")
+                rest = batch[index:]
+                break
+            except Exception as e:
+                logger.error(f"Dead-lettering vital reading {reading['ingest_key']}: {str(e)}")
+                dead.append(reading)
+                continue
+            stored += 1
+        else:
+            rest = []
+
+        if dead:
+            await self._in_writer(self._dead_letter_write, dead)
+            self.dead_lettered += len(dead)
+        return stored, rest
+
+    def _claim_orphans(self) -> List[str]:
+        """Rename segments of exited owners into this owner's name"""
+        claimed = []
+        for owner, paths in self._segments_by_owner().items():
+            if owner == self.owner:
+                continue
+            # Segments without an owner id predate per-process spools
+            lock_path = f"{self.spool_path}.{owner}.lock" if owner else None
+            lock = self._lock(lock_path) if lock_path else None
+            if lock_path and lock is None:
+                continue  # owner is still running
+            try:
+                for path in paths:
+                    claimed_path = self._next_segment_path()
+                    os.rename(path, claimed_path)
+                    claimed.append(claimed_path)
+                if lock_path:
+                    os.remove(lock_path)
+            finally:
+                if lock is not None:
+                    lock.close()
+        return claimed
+
+    def _claim_and_read(self):
+        Path(self.spool_path).parent.mkdir(parents=True, exist_ok=True)
+        # One worker claims at a time; the others leave the orphans to it
+        recovering = self._lock(f"{self.spool_path}.recover.lock")
+        if recovering is None:
+            return [], []
+        try:
+            leftovers = self._claim_orphans()
+        finally:
+            recovering.close()
+
+        readings = []
+        for path in leftovers:
+            with open(path, encoding="utf-8") as spool:
+                for line in spool:
+                    if line.strip():
+                        try:
+                            readings.append(_decode(line))
+                        except (ValueError, KeyError):
+                            # Torn final line from a crash mid-write
+                            logger.warning(f"Skipping unreadable spool line in {path}")
+        return leftovers, readings
+
+    async def recover(self) -> int:
+        """Replay spool segments left behind by exited processes"""
+        leftovers, readings = await self._in_writer(self._claim_and_read)
+        if not leftovers:
+            return 0
+
+        self._bind_loop()
+        async with self._flush_lock:
+            self.pending = readings + self.pending
+            self._segments = leftovers + self._segments
+        logger.info(f"Recovered {len(readings)} spooled vital readings")
+        return await self.flush()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if not self.pending:
+            await self._in_writer(self._release_spool)
+
+    def _release_spool(self):
+        self._close_segment()
+        self._remove_segments(self._segments)
+        self._segments = []
+        if self._owner_lock is not None:
+            os.remove(self._owner_lock.name)
+            self._owner_lock.close()
+            self._owner_lock = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.IOT_WRITE_BEHIND_ENABLED,
+            "pending": len(self.pending),
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+ingest_buffer = IngestBuffer(
+    spool_path=settings.IOT_BUFFER_SPOOL_PATH,
+    max_size=settings.IOT_BUFFER_MAX_SIZE,
+    flush_size=settings.IOT_BUFFER_FLUSH_SIZE,
+    flush_interval_ms=settings.IOT_BUFFER_FLUSH_INTERVAL_MS,
+    fsync=settings.IOT_BUFFER_FSYNC,
+    max_flush_attempts=settings.IOT_BUFFER_MAX_FLUSH_ATTEMPTS,
+)
@@ -0,0 +1,263 @@
+"""
+Long-lived IoT Hub device connections with a batching outbound queue.
+
+One `HubConnection` exists per device connection string. It connects lazily
+on the first send, stays connected between batches and reconnects with
+backoff when a send fails. Messages are queued and drained by a background
+task that takes up to IOT_HUB_BATCH_SIZE of them (or whatever arrives within
+IOT_HUB_BATCH_LINGER_MS) and sends them back to back over the open
+connection from one worker thread. Each payload is still its own IoT Hub
+message with a single JSON object body, so hub routes and consumers see the
+same messages as before.
+
+`FakeHubTransport` records what would have been sent and is used by tests
+and when the Azure SDK is not installed.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.config import settings
+
+try:
+    from azure.iot.device import IoTHubDeviceClient, Message
+
+    AZURE_IOT_AVAILABLE = True
+except ImportError:
+    IoTHubDeviceClient = None
+    Message = None
+    AZURE_IOT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class HubQueueFull(Exception):
+    pass
+
+
+class AzureDeviceTransport:
+    """Blocking Azure device client; called from worker threads"""
+
+    def __init__(self, connection_string: str):
+        self.connection_string = connection_string
+        self._client = None
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None and self._client.connected
+
+    def connect(self):
+        if self._client is None:
+            self._client = IoTHubDeviceClient.create_from_connection_string(
+                self.connection_string
+            )
+        self._client.connect()
+
+    def send(self, payload: dict):
+        message = Message(json.dumps(payload))
+        message.content_encoding = "utf-8"
+        message.content_type = "application/json"
+        self._client.send_message(message)
+
+    def disconnect(self):
+        if self._client is not None:
+            try:
+                self._client.shutdown()
+            finally:
+                self._client = None
+
+
+class FakeHubTransport:
+    """In-memory transport; `fail_next` makes the next N sends raise"""
+
+    def __init__(self, connection_string: str = "fake"):
+        self.connection_string = connection_string
+        self.connected = False
+        self.connect_count = 0
+        self.messages: List[dict] = []
+        self.fail_next = 0
+
+    def connect(self):
+        self.connected = True
+        self.connect_count += 1
+
+    def send(self, payload: dict):
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            self.connected = False
+            raise ConnectionError("simulated IoT Hub failure")
+        self.messages.append(payload)
+
+    def disconnect(self):
+        self.connected = False
+
+
+class HubConnection:
+    def __init__(self, transport, batch_size: int, linger: float,
+                 max_queue: int, max_retries: int):
+        self.transport = transport
+        self.batch_size = max(batch_size, 1)
+        self.linger = max(linger, 0)
+        self.max_retries = max(max_retries, 0)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(max_queue, 1))
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sent_messages = 0
+        self.sent_batches = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    def enqueue(self, payload: dict):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queue and worker belong to the loop that created them
+            self._loop = loop
+            self.queue = asyncio.Queue(maxsize=self.queue.maxsize)
+            self._worker = None
+
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            raise HubQueueFull("IoT Hub send queue is full")
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def _next_batch(self) -> List[dict]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._send(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _send_from(self, batch: List[dict], progress: List[int]):
+        """Worker thread: one message per payload, resuming at progress[0]"""
+        while progress[0] < len(batch):
+            self.transport.send(batch[progress[0]])
+            progress[0] += 1
+            self.sent_messages += 1
+
+    async def _send(self, batch: List[dict]):
+        # Retries resume after the last delivered payload instead of resending it
+        progress = [0]
+        for attempt in range(self.max_retries + 1):
+            try:
+                if not self.transport.connected:
+                    if self.sent_batches or attempt:
+                        self.reconnects += 1
+                    await asyncio.to_thread(self.transport.connect)
+                await asyncio.to_thread(self._send_from, batch, progress)
+                self.sent_batches += 1
+                return
+            except Exception as e:
+                logger.warning(
+                    f"IoT Hub send failed (attempt {attempt + 1}): {str(e)}"
+                )
+                try:
+                    await asyncio.to_thread(self.transport.disconnect)
+                except Exception:
+                    pass
+                if attempt < self.max_retries:
+                    await asyncio.sleep(min(0.1 * 2 ** attempt, 5))
+
+        self.dropped += len(batch) - progress[0]
+        logger.error(f"Dropped {len(batch) - progress[0]} IoT Hub message(s) after retries")
+
+    async def flush(self):
+        if self._worker is not None and not self._worker.done():
+            await self.queue.join()
+
+    async def close(self):
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        await asyncio.to_thread(self.transport.disconnect)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.transport.connected,
+            "queue_depth": self.queue.qsize(),
+            "sent_messages": self.sent_messages,
+            "sent_batches": self.sent_batches,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+def _default_transport(connection_string: str):
+    if AZURE_IOT_AVAILABLE and connection_string:
+        return AzureDeviceTransport(connection_string)
+    return FakeHubTransport(connection_string)
+
+
+class HubClientManager:
+    """Keeps one HubConnection per device connection string"""
+
+    def __init__(self, transport_factory: Callable = _default_transport,
+                 batch_size: int = settings.IOT_HUB_BATCH_SIZE,
+                 linger_ms: int = settings.IOT_HUB_BATCH_LINGER_MS,
+                 max_queue: int = settings.IOT_HUB_QUEUE_MAXSIZE,
+                 max_retries: int = settings.IOT_HUB_MAX_RETRIES):
+        self.transport_factory = transport_factory
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.connections: Dict[str, HubConnection] = {}
+
+    def connection(self, connection_string: str) -> HubConnection:
+        conn = self.connections.get(connection_string)
+        if conn is None:
+            conn = HubConnection(
+                self.transport_factory(connection_string),
+                batch_size=self.batch_size,
+                linger=self.linger,
+                max_queue=self.max_queue,
+                max_retries=self.max_retries,
+            )
+            self.connections[connection_string] = conn
+        return conn
+
+    def send(self, payload: dict, connection_string: Optional[str] = None):
+        """Queue a message; raises HubQueueFull when the connection is saturated"""
+        self.connection(
+            connection_string or settings.IOT_HUB_CONNECTION_STRING
+        ).enqueue(payload)
+
+    async def flush(self):
+        for conn in list(self.connections.values()):
+            await conn.flush()
+
+    async def close(self):
+        for conn in list(self.connections.values()):
+            await conn.close()
+        self.connections.clear()
+
+    def stats(self) -> dict:
+        # Connection strings carry the device key, so only expose the host/device part
+        return {
+            key.split(";SharedAccessKey")[0] or "default": conn.stats()
+            for key, conn in self.connections.items()
+        }
+
+
+hub_client_manager = HubClientManager()
@@ -0,0 +1,170 @@
+"""
+Incremental maintenance of `patient_latest_state`.
+
+Health-data writes and IoT ingest fold what they store into one row per
+patient and merge it with INSERT ... ON CONFLICT DO UPDATE in their own
+transaction. Each vital keeps its most recent non-null value, so a reading
+that only carries SpO2 does not clear the last heart rate; rows older than
+the stored state only fill vitals that are still unknown. The status
+classification is recomputed in the same statement.
+
+Timestamps are stored as naive UTC, like the vital rollups. Writers pass
+aware timestamps or naive UTC ones; naive values are taken as UTC.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, delete, func, select
+
+from app.handler.emergency_engine import VitalRuleEngine
+from app.models.health import HealthData
+from app.models.iot_device import VitalReading
+from app.models.patient_latest_state import PatientLatestState
+from app.utils.sql import greatest, upsert
+
+VITALS = ("heart_rate", "blood_pressure", "blood_glucose", "blood_oxygen", "temperature")
+
+CRITICAL_HEART_RATE = 120
+MONITOR_HEART_RATE = 100
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def classify(heart_rate=None, blood_oxygen=None, blood_glucose=None) -> str:
+    if ((heart_rate is not None and heart_rate > CRITICAL_HEART_RATE)
+            or (blood_oxygen is not None and blood_oxygen < VitalRuleEngine.SPO2_CRITICAL)
+            or (blood_glucose is not None and not (
+                VitalRuleEngine.GLUCOSE_HYPO_CRITICAL <= blood_glucose <= VitalRuleEngine.GLUCOSE_HYPER_CRITICAL))):
+        return "critical"
+    if ((heart_rate is not None and heart_rate > MONITOR_HEART_RATE)
+            or (blood_oxygen is not None and blood_oxygen < VitalRuleEngine.SPO2_LOW)
+            or (blood_glucose is not None and not (
+                VitalRuleEngine.GLUCOSE_HYPO <= blood_glucose <= VitalRuleEngine.GLUCOSE_HYPER))):
+        return "monitor"
+    return "stable"
+
+
+def status_case(heart_rate, blood_oxygen, blood_glucose):
+    """`classify` as a SQL expression (NULL comparisons are never true)"""
+    return case(
+        (heart_rate > CRITICAL_HEART_RATE, "critical"),
+        (blood_oxygen < VitalRuleEngine.SPO2_CRITICAL, "critical"),
+        (blood_glucose < VitalRuleEngine.GLUCOSE_HYPO_CRITICAL, "critical"),
+        (blood_glucose > VitalRuleEngine.GLUCOSE_HYPER_CRITICAL, "critical"),
+        (heart_rate > MONITOR_HEART_RATE, "monitor"),
+        (blood_oxygen < VitalRuleEngine.SPO2_LOW, "monitor"),
+        (blood_glucose < VitalRuleEngine.GLUCOSE_HYPO, "monitor"),
+        (blood_glucose > VitalRuleEngine.GLUCOSE_HYPER, "monitor"),
+        else_="stable",
+    )
+
+
+def _fold(states: Dict[int, dict], user_id: int, measured_at: datetime, values: dict,
+          health_data_id: Optional[int] = None):
+    measured_at = _naive_utc(measured_at)
+    state = states.get(user_id)
+    if state is None:
+        state = states[user_id] = {"user_id": user_id, "measured_at": measured_at,
+                                   "health_data_id": None, **dict.fromkeys(VITALS)}
+    newer = measured_at >= state["measured_at"]
+    for vital in VITALS:
+        value = values.get(vital)
+        if value is not None and (newer or state[vital] is None):
+            state[vital] = value
+    if health_data_id is not None and (newer or state["health_data_id"] is None):
+        state["health_data_id"] = health_data_id
+    if newer:
+        state["measured_at"] = measured_at
+
+
+def fold_health_data(states: Dict[int, dict], record) -> Dict[int, dict]:
+    _fold(states, record.user_id, record.date or datetime.now(), {
+        "heart_rate": record.heart_rate,
+        "blood_pressure": record.blood_pressure,
+        "blood_glucose": record.blood_glucose,
+    }, health_data_id=record.id)
+    return states
+
+
+def fold_readings(states: Dict[int, dict], readings: Iterable[dict]) -> Dict[int, dict]:
+    """From VitalReading row dicts as written by the ingest pipeline"""
+    for reading in readings:
+        if reading["user_id"] is None:
+            continue
+        systolic, diastolic = reading.get("blood_pressure_systolic"), reading.get("blood_pressure_diastolic")
+        _fold(states, reading["user_id"], reading["timestamp"], {
+            "heart_rate": reading.get("heart_rate"),
+            "blood_pressure": f"{systolic}/{diastolic}" if systolic and diastolic else None,
+            "blood_glucose": reading.get("glucose_level"),
+            "blood_oxygen": reading.get("blood_oxygen"),
+            "temperature": reading.get("temperature"),
+        })
+    return states
+
+
+def latest_state_upsert(db):
+    table = PatientLatestState.__table__
+    stmt = upsert(db, table)
+    excluded = stmt.excluded
+    newer = excluded.measured_at >= table.c.measured_at
+
+    def merged(column):
+        return case(
+            (newer, func.coalesce(excluded[column], table.c[column])),
+            else_=func.coalesce(table.c[column], excluded[column]),
+        )
+
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            **{vital: merged(vital) for vital in VITALS},
+            "health_data_id": merged("health_data_id"),
+            "status": status_case(merged("heart_rate"), merged("blood_oxygen"), merged("blood_glucose")),
+            "measured_at": greatest(db, table.c.measured_at, excluded.measured_at),
+            "updated_at": func.now(),
+        },
+    )
+
+
+def _rows(states: Dict[int, dict]) -> List[dict]:
+    return [
+        {**state, "status": classify(state["heart_rate"], state["blood_oxygen"], state["blood_glucose"])}
+        for _, state in sorted(states.items())
+    ]
+
+
+async def apply_latest_state(db, states: Dict[int, dict]) -> None:
+    """Merge folded states into the table; caller commits"""
+    if states:
+        await db.execute(latest_state_upsert(db), _rows(states))
+
+
+def apply_latest_state_sync(db, states: Dict[int, dict]) -> None:
+    if states:
+        db.execute(latest_state_upsert(db), _rows(states))
+
+
+def rebuild_latest_states(db, chunk_size: int = 5000) -> int:
+    """Recompute the whole table from health_data and vital_readings"""
+    db.execute(delete(PatientLatestState))
+
+    states: Dict[int, dict] = {}
+    for record in db.scalars(select(HealthData).execution_options(yield_per=chunk_size)):
+        fold_health_data(states, record)
+    columns = select(
+        VitalReading.user_id, VitalReading.timestamp, VitalReading.heart_rate,
+        VitalReading.blood_pressure_systolic, VitalReading.blood_pressure_diastolic,
+        VitalReading.glucose_level, VitalReading.blood_oxygen, VitalReading.temperature,
+    ).execution_options(yield_per=chunk_size)
+    for reading in db.execute(columns).mappings():
+        fold_readings(states, [reading])
+
+    rows = _rows(states)
+    for start in range(0, len(rows), chunk_size):
+        db.execute(latest_state_upsert(db), rows[start:start + chunk_size])
+    db.commit()
+    return len(rows)
@@ -0,0 +1,183 @@
+"""
+In-memory weekly leaderboard.
+
+Each week keeps a SortedList of (-progress_score, user_id) keys next to a
+dict of the entries themselves, so updating a user, listing the top N and
+finding one user's exact rank are all O(log n). Ties share a rank
+(competition ranking: 100, 90, 90, 80 -> 1, 2, 2, 4).
+
+Boards are built from `weekly_progress` on startup (`rebuild`) and updated
+by POST /health/update-progress. Each worker holds its own copy; a board
+older than LEADERBOARD_REFRESH_SECONDS, or one that only holds updates
+because its week was never loaded, is reloaded on the next read so
+updates made through other workers show up. The reload sorts in a worker
+thread and keeps local updates that landed while it ran.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from sqlalchemy import select
+
+from app.config import settings
+from app.models.health import WeeklyProgress
+from app.models.user import User
+
+
+def week_of(ts: datetime) -> date:
+    """Monday of the week containing `ts`"""
+    return (ts - timedelta(days=ts.weekday())).date()
+
+
+def progress_color(score: float) -> str:
+    if score >= 80:
+        return "green"
+    if score >= 60:
+        return "yellow"
+    if score >= 40:
+        return "orange"
+    return "red"
+
+
+def display_name(user_id: int, patient_id: Optional[str]) -> str:
+    return f"User{patient_id[-4:]}" if patient_id else f"User{user_id}"
+
+
+@dataclass
+class Entry:
+    user_id: int
+    patient_id: Optional[str]
+    progress_score: int
+    progress_color: Optional[str]
+    steps_goal: Optional[int]
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return (-self.progress_score, self.user_id)
+
+
+class WeekBoard:
+    def __init__(self, loaded_at: Optional[float] = None):
+        self.keys = SortedList()
+        self.entries: Dict[int, Entry] = {}
+        # None until the week has been loaded from the database
+        self.loaded_at = loaded_at
+        # user_id -> monotonic time of the last update() applied here
+        self.updated_at: Dict[int, float] = {}
+
+    @classmethod
+    def from_rows(cls, rows, loaded_at: float) -> "WeekBoard":
+        """Build in one sort; later rows for a user win"""
+        board = cls(loaded_at)
+        board.entries = {entry.user_id: entry for entry in (Entry(*row) for row in rows)}
+        board.keys = SortedList(entry.key for entry in board.entries.values())
+        return board
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def upsert(self, entry: Entry):
+        previous = self.entries.get(entry.user_id)
+        if previous is not None:
+            self.keys.remove(previous.key)
+        self.entries[entry.user_id] = entry
+        self.keys.add(entry.key)
+
+    def remove(self, user_id: int):
+        entry = self.entries.pop(user_id, None)
+        if entry is not None:
+            self.keys.remove(entry.key)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        # (-score,) sorts before every (-score, user_id) key with that score
+        return self.keys.bisect_left((-entry.progress_score,)) + 1
+
+    def top(self, n: int) -> List[Tuple[int, Entry]]:
+        ranked = []
+        for position, (negative_score, user_id) in enumerate(self.keys.islice(0, n)):
+            if ranked and ranked[-1][1].progress_score == -negative_score:
+                rank = ranked[-1][0]
+            else:
+                rank = position + 1
+            ranked.append((rank, self.entries[user_id]))
+        return ranked
+
+
+class LeaderboardEngine:
+    def __init__(self, refresh_seconds: int = settings.LEADERBOARD_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.boards: Dict[date, WeekBoard] = {}
+
+    def board(self, week: date) -> WeekBoard:
+        board = self.boards.get(week)
+        if board is None:
+            board = self.boards[week] = WeekBoard()
+        return board
+
+    def update(self, week: date, user_id: int, patient_id: Optional[str], progress_score: int,
+               progress_color: Optional[str], steps_goal: Optional[int] = None):
+        board = self.board(week)
+        board.upsert(Entry(user_id, patient_id, progress_score, progress_color, steps_goal))
+        board.updated_at[user_id] = time.monotonic()
+
+    def is_stale(self, week: date) -> bool:
+        board = self.boards.get(week)
+        return (board is None or board.loaded_at is None
+                or time.monotonic() - board.loaded_at > self.refresh_seconds)
+
+    @staticmethod
+    def week_query(week: date):
+        start = datetime.combine(week, datetime.min.time())
+        return (
+            select(
+                WeeklyProgress.user_id, User.patient_id, WeeklyProgress.progress_score,
+                WeeklyProgress.progress_color, WeeklyProgress.steps_goal,
+            )
+            .join(User, User.id == WeeklyProgress.user_id)
+            .where(
+                WeeklyProgress.week_start_date >= start,
+                WeeklyProgress.week_start_date < start + timedelta(days=7),
+                WeeklyProgress.progress_score.is_not(None),
+            )
+            .order_by(WeeklyProgress.id)
+        )
+
+    def install(self, week: date, board: WeekBoard) -> WeekBoard:
+        """Replace a week's board, keeping updates made since it was read"""
+        previous = self.boards.get(week)
+        if previous is not None:
+            for user_id, updated_at in previous.updated_at.items():
+                if updated_at >= board.loaded_at and user_id in previous.entries:
+                    board.upsert(previous.entries[user_id])
+                    board.updated_at[user_id] = updated_at
+        self.boards[week] = board
+        return board
+
+    def load_rows(self, week: date, rows) -> WeekBoard:
+        return self.install(week, WeekBoard.from_rows(rows, time.monotonic()))
+
+    async def refresh(self, db, week: date) -> WeekBoard:
+        if not self.is_stale(week):
+            return self.boards[week]
+        started = time.monotonic()
+        rows = (await db.execute(self.week_query(week))).all()
+        # Sorting a large board takes long enough to stall the event loop
+        board = await asyncio.to_thread(WeekBoard.from_rows, rows, started)
+        return self.install(week, board)
+
+    def rebuild(self, db, week: Optional[date] = None) -> int:
+        """Load a week (default: the current one) with a sync session"""
+        week = week or week_of(datetime.now())
+        return len(self.load_rows(week, db.execute(self.week_query(week)).all()))
+
+    def stats(self) -> dict:
+        return {week.isoformat(): len(board) for week, board in self.boards.items()}
+
+
+leaderboard_engine = LeaderboardEngine()
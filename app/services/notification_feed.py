@@ -0,0 +1,92 @@
+"""
+Queries behind the grouped notification feed, and retention.
+
+A feed page takes the newest `limit` notifications of each type with one
+index seek per type on (user_id, notification_type, created_at, id). The
+seeks are combined with UNION ALL, so the whole page is a single statement
+and its size no longer depends on the length of the account's history.
+Cursors are notification ids. Their position is resolved in SQL, so
+comparisons use the stored created_at exactly as written.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, delete, func, or_, select, tuple_, union_all
+
+from app.models.notification import Notification
+from app.services.unread_counters import add_delta, apply_unread_sync
+
+FEED_TYPES = ("system", "caregiver", "doctor")
+
+
+def _position(notification_id: int):
+    return tuple_(
+        select(Notification.created_at).where(Notification.id == notification_id).scalar_subquery(),
+        notification_id
+    )
+
+
+def feed_query(user_id: int, types: Sequence[str], limit: int,
+               since: Optional[datetime] = None, before_id: Optional[int] = None):
+    """
+    Up to limit + 1 notifications per type, newest first; the extra row
+    tells the caller another page exists
+    """
+    newest_first = (Notification.created_at.desc(), Notification.id.desc())
+    pages = []
+    for notification_type in types:
+        page = select(Notification.id).where(
+            Notification.user_id == user_id,
+            Notification.notification_type == notification_type
+        )
+        if since is not None:
+            page = page.where(Notification.created_at > since)
+        if before_id is not None:
+            page = page.where(tuple_(Notification.created_at, Notification.id) < _position(before_id))
+        pages.append(select(page.order_by(*newest_first).limit(limit + 1).subquery()))
+
+    ids = pages[0] if len(pages) == 1 else union_all(*pages)
+    return select(Notification).where(Notification.id.in_(ids)).order_by(*newest_first)
+
+
+def group_page(notifications, types: Sequence[str], limit: int) -> Dict[str, dict]:
+    """{type: {"items": [...], "next_id": id or None}} from a `feed_query` result"""
+    groups = {notification_type: [] for notification_type in types}
+    for notification in notifications:
+        groups[notification.notification_type].append(notification)
+    return {
+        notification_type: {
+            "items": items[:limit],
+            "next_id": items[limit - 1].id if len(items) > limit else None,
+        }
+        for notification_type, items in groups.items()
+    }
+
+
+def purge_notifications(db, read_days: int, unread_days: int,
+                        now: Optional[datetime] = None, chunk_size: int = 5000) -> int:
+    """
+    Delete read notifications older than `read_days` and any older than
+    `unread_days`, in chunks so no single transaction holds long locks
+    """
+    now = now or datetime.utcnow()
+    expired = or_(
+        and_(Notification.is_read == True, Notification.created_at < now - timedelta(days=read_days)),
+        Notification.created_at < now - timedelta(days=unread_days)
+    )
+    deleted = 0
+    while True:
+        ids: List[int] = db.scalars(select(Notification.id).where(expired).limit(chunk_size)).all()
+        if not ids:
+            return deleted
+        deltas = {}
+        for user_id, unread in db.execute(
+            select(Notification.user_id, func.count()).where(
+                Notification.id.in_(ids), Notification.is_read == False
+            ).group_by(Notification.user_id)
+        ):
+            add_delta(deltas, user_id, "notifications", -unread)
+        db.execute(delete(Notification).where(Notification.id.in_(ids)))
+        apply_unread_sync(db, deltas)
+        db.commit()
+        deleted += len(ids)
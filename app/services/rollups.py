@@ -0,0 +1,220 @@
+"""
+Incrementally maintained minute / hour / day aggregates of vitals.
+
+Ingest paths turn rows into (user_id, metric, timestamp, value) samples and
+call `apply_rollups` in the same transaction; samples are pre-aggregated per
+bucket in Python and merged into `vital_rollups` with one
+INSERT ... ON CONFLICT DO UPDATE executemany.
+
+Readers use `rollup_query` / `load_rollups`, which pick the coarsest
+granularity that still resolves the requested window, and `summarize` to
+fold buckets into overall min/max/mean/count/last. Only whole buckets of
+that granularity are read. The partial ones at either edge of the window
+come from finer buckets (hours, then minutes), so a window never takes in
+readings from before its start.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import and_, case, or_, select
+
+from app.models.vital_rollup import VitalRollup
+from app.utils.sql import greatest, least, upsert
+
+GRANULARITIES = ("minute", "hour", "day")
+FINER = {"day": "hour", "hour": "minute"}
+BUCKET_LENGTH = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Source column -> metric name; glucose is stored under one name for both sources
+VITAL_READING_METRICS = {
+    "heart_rate": "heart_rate",
+    "blood_oxygen": "blood_oxygen",
+    "blood_pressure_systolic": "blood_pressure_systolic",
+    "blood_pressure_diastolic": "blood_pressure_diastolic",
+    "temperature": "temperature",
+    "glucose_level": "blood_glucose",
+}
+
+HEALTH_DATA_METRICS = {
+    "heart_rate": "heart_rate",
+    "blood_glucose": "blood_glucose",
+    "steps": "steps",
+    "water_intake": "water_intake",
+    "sleep_time": "sleep_time",
+    "calories_burned": "calories_burned",
+}
+
+Sample = Tuple[int, str, datetime, float]
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    ts = _naive_utc(ts)
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def samples_from_readings(readings: Iterable[dict]) -> List[Sample]:
+    """Samples from VitalReading row dicts (needs user_id and timestamp)"""
+    samples = []
+    for reading in readings:
+        for column, metric in VITAL_READING_METRICS.items():
+            value = reading.get(column)
+            if value is not None:
+                samples.append((reading["user_id"], metric, reading["timestamp"], float(value)))
+    return samples
+
+
+def samples_from_health_data(record) -> List[Sample]:
+    samples = []
+    for column, metric in HEALTH_DATA_METRICS.items():
+        value = getattr(record, column, None)
+        # 0 is the column default for counters that were not recorded
+        if value:
+            samples.append((record.user_id, metric, record.date, float(value)))
+    return samples
+
+
+def build_rollup_rows(samples: Iterable[Sample]) -> List[dict]:
+    buckets: Dict[tuple, dict] = {}
+    for user_id, metric, ts, value in samples:
+        ts = _naive_utc(ts)
+        for granularity in GRANULARITIES:
+            key = (user_id, metric, granularity, bucket_start(ts, granularity))
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = {
+                    "user_id": user_id, "metric": metric,
+                    "granularity": granularity, "bucket_start": key[3],
+                    "count": 1, "sum": value, "min": value, "max": value,
+                    "last_value": value, "last_at": ts,
+                }
+                continue
+            row["count"] += 1
+            row["sum"] += value
+            row["min"] = min(row["min"], value)
+            row["max"] = max(row["max"], value)
+            if ts >= row["last_at"]:
+                row["last_value"], row["last_at"] = value, ts
+
+    # Stable order keeps concurrent upserts from deadlocking on PostgreSQL
+    return [buckets[key] for key in sorted(buckets, key=lambda k: (k[0], k[1], k[2], k[3]))]
+
+
+def rollup_upsert(db):
+    table = VitalRollup.__table__
+    stmt = upsert(db, table)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "metric", "granularity", "bucket_start"],
+        set_={
+            "count": table.c["count"] + excluded["count"],
+            "sum": table.c["sum"] + excluded["sum"],
+            "min": least(db, table.c["min"], excluded["min"]),
+            "max": greatest(db, table.c["max"], excluded["max"]),
+            "last_value": case(
+                (excluded.last_at >= table.c.last_at, excluded.last_value),
+                else_=table.c.last_value,
+            ),
+            "last_at": greatest(db, table.c.last_at, excluded.last_at),
+        },
+    )
+
+
+async def apply_rollups(db, samples: Iterable[Sample]) -> None:
+    """Merge samples into the rollups; caller commits"""
+    rows = build_rollup_rows(samples)
+    if rows:
+        await db.execute(rollup_upsert(db), rows)
+
+
+def apply_rollups_sync(db, samples: Iterable[Sample]) -> None:
+    rows = build_rollup_rows(samples)
+    if rows:
+        db.execute(rollup_upsert(db), rows)
+
+
+def choose_granularity(start: datetime, end: datetime) -> str:
+    """Coarsest granularity that still gives a couple of buckets for the window"""
+    window = end - start
+    if window >= timedelta(days=2):
+        return "day"
+    if window >= timedelta(hours=2):
+        return "hour"
+    return "minute"
+
+
+def window_pieces(start: datetime, end: datetime, granularity: str) -> List[Tuple[str, datetime, datetime]]:
+    """
+    (granularity, first bucket_start, bucket_start bound) ranges covering
+    [start, end): whole buckets at `granularity` and the partial edges from
+    finer ones. Minutes are the finest, so an edge minute is read whole.
+    """
+    if granularity == "minute":
+        return [("minute", bucket_start(start, "minute"), end)]
+    first = bucket_start(start, granularity)
+    if first < start:
+        first += BUCKET_LENGTH[granularity]
+    last = bucket_start(end, granularity)
+    if first >= last:
+        return window_pieces(start, end, FINER[granularity])
+
+    pieces = [(granularity, first, last)]
+    if start < first:
+        pieces = window_pieces(start, first, FINER[granularity]) + pieces
+    if last < end:
+        pieces += window_pieces(last, end, FINER[granularity])
+    return pieces
+
+
+def rollup_query(user_ids: List[int], metric: Union[str, List[str]], start: datetime,
+                 end: Optional[datetime] = None, granularity: Optional[str] = None):
+    start, end = _naive_utc(start), _naive_utc(end or datetime.utcnow())
+    granularity = granularity or choose_granularity(start, end)
+    # The bucket holding `end` is read too
+    pieces = window_pieces(start, end + timedelta(microseconds=1), granularity)
+    return (
+        select(VitalRollup)
+        .where(
+            VitalRollup.user_id.in_(user_ids),
+            VitalRollup.metric.in_(metric) if isinstance(metric, list) else VitalRollup.metric == metric,
+            or_(*(
+                and_(VitalRollup.granularity == piece_granularity,
+                     VitalRollup.bucket_start >= first,
+                     VitalRollup.bucket_start < bound)
+                for piece_granularity, first, bound in pieces
+            )),
+        )
+        .order_by(VitalRollup.user_id, VitalRollup.bucket_start)
+    )
+
+
+def load_rollups(db, user_ids: List[int], metric: Union[str, List[str]], start: datetime,
+                 end: Optional[datetime] = None, granularity: Optional[str] = None) -> List[VitalRollup]:
+    """Sync-session convenience wrapper around `rollup_query`"""
+    return db.scalars(rollup_query(user_ids, metric, start, end, granularity)).all()
+
+
+def summarize(buckets: Iterable[VitalRollup]) -> Optional[dict]:
+    buckets = [bucket for bucket in buckets if bucket.count]
+    if not buckets:
+        return None
+
+    count = sum(bucket.count for bucket in buckets)
+    latest = max(buckets, key=lambda bucket: bucket.last_at)
+    return {
+        "count": count,
+        "mean": sum(bucket.sum for bucket in buckets) / count,
+        "min": min(bucket.min for bucket in buckets),
+        "max": max(bucket.max for bucket in buckets),
+        "last_value": latest.last_value,
+        "last_at": latest.last_at,
+    }
@@ -0,0 +1,208 @@
+"""
+Per-user unread counters behind the badge endpoints.
+
+`unread_counters` holds one row per user. Each change lands in the same
+transaction as the rows it counts:
+- ORM notification inserts, read-flag changes and deletes adjust it from
+  mapper events on the flushing connection.
+- Core writes call `apply_unread` / `apply_unread_sync` themselves: the bulk
+  caregiver insert, message send and mark-read, and the retention purge.
+
+Reads go through a per-process TTL cache. When a transaction that changed a
+user's counters commits, their entry is dropped here and, through the
+backplane, on the other workers.
+`rebuild_unread_counters` recomputes the table from notifications and
+messages.
+"""
+from typing import Dict, Iterable
+import threading
+
+from cachetools import TTLCache
+from sqlalchemy import bindparam, delete, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.caregiver import Message
+from app.models.notification import Notification
+from app.models.unread_counter import UnreadCounter
+from app.services.backplane import backplane
+from app.utils.sql import greatest, upsert
+
+KINDS = ("notifications", "messages")
+TOPIC = "unread_counters"
+DIRTY_KEY = "unread_counters_dirty"
+
+# {user_id: {kind: delta}}
+Deltas = Dict[int, Dict[str, int]]
+
+
+def add_delta(deltas: Deltas, user_id: int, kind: str, delta: int) -> Deltas:
+    if user_id is not None and delta:
+        row = deltas.setdefault(user_id, dict.fromkeys(KINDS, 0))
+        row[kind] += delta
+    return deltas
+
+
+def _statements(db, deltas: Deltas):
+    """Increments as an additive upsert, decrements as an update clamped at zero"""
+    table = UnreadCounter.__table__
+    increments = [
+        {"user_id": user_id, **{kind: max(row[kind], 0) for kind in KINDS}}
+        for user_id, row in sorted(deltas.items()) if any(row[kind] > 0 for kind in KINDS)
+    ]
+    decrements = [
+        {"counter_user_id": user_id, **{f"read_{kind}": max(-row[kind], 0) for kind in KINDS}}
+        for user_id, row in sorted(deltas.items()) if any(row[kind] < 0 for kind in KINDS)
+    ]
+    if increments:
+        stmt = upsert(db, table)
+        yield stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                **{kind: table.c[kind] + stmt.excluded[kind] for kind in KINDS},
+                "updated_at": func.now(),
+            },
+        ), increments
+    if decrements:
+        yield update(table).where(table.c.user_id == bindparam("counter_user_id")).values(
+            **{kind: greatest(db, table.c[kind] - bindparam(f"read_{kind}"), 0) for kind in KINDS}
+        ), decrements
+
+
+def mark_changed(db, user_ids: Iterable[int]) -> None:
+    """Drop the users' cached counters once the transaction commits"""
+    db.info.setdefault(DIRTY_KEY, set()).update(user_ids)
+
+
+async def apply_unread(db, deltas: Deltas) -> None:
+    """Apply deltas in the caller's transaction; caller commits"""
+    for statement, rows in _statements(db, deltas):
+        await db.execute(statement, rows)
+    mark_changed(db, deltas)
+
+
+def apply_unread_sync(db, deltas: Deltas) -> None:
+    for statement, rows in _statements(db, deltas):
+        db.execute(statement, rows)
+    mark_changed(db, deltas)
+
+
+class UnreadCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.enabled = ttl > 0 and maxsize > 0
+        self._cache = TTLCache(maxsize=max(maxsize, 1), ttl=max(ttl, 1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def counts(self, db, user_id: int) -> Dict[str, int]:
+        if self.enabled:
+            with self._lock:
+                cached = self._cache.get(user_id)
+                if cached is not None:
+                    self.hits += 1
+                    return dict(cached)
+                self.misses += 1
+
+        row = (await db.execute(
+            select(*(UnreadCounter.__table__.c[kind] for kind in KINDS)).where(UnreadCounter.user_id == user_id)
+        )).first()
+        counts = {kind: (row[i] if row else 0) for i, kind in enumerate(KINDS)}
+
+        if self.enabled:
+            with self._lock:
+                self._cache[user_id] = counts
+        return dict(counts)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._cache)
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+unread_cache = UnreadCache(
+    maxsize=settings.UNREAD_CACHE_MAXSIZE,
+    ttl=settings.UNREAD_CACHE_TTL_SECONDS,
+)
+
+
+def rebuild_unread_counters(db) -> int:
+    """Recompute the whole table from notifications and messages"""
+    db.execute(delete(UnreadCounter))
+
+    deltas: Deltas = {}
+    for user_id, count in db.execute(
+        select(Notification.user_id, func.count()).where(Notification.is_read == False)
+        .group_by(Notification.user_id)
+    ):
+        add_delta(deltas, user_id, "notifications", count)
+    for user_id, count in db.execute(
+        select(Message.receiver_id, func.count()).where(Message.is_read == False)
+        .group_by(Message.receiver_id)
+    ):
+        add_delta(deltas, user_id, "messages", count)
+
+    apply_unread_sync(db, deltas)
+    db.commit()
+    unread_cache.clear()
+    return len(deltas)
+
+
+# -- ORM notification writes --------------------------------------------------
+
+def _adjust(connection, target, delta: int):
+    deltas = add_delta({}, target.user_id, "notifications", delta)
+    if not deltas:
+        return
+    for statement, rows in _statements(connection, deltas):
+        connection.execute(statement, rows)
+    session = Session.object_session(target)
+    if session is not None:
+        mark_changed(session, deltas)
+
+
+def _on_insert(mapper, connection, target):
+    if not target.is_read:
+        _adjust(connection, target, 1)
+
+
+def _on_update(mapper, connection, target):
+    history = inspect(target).attrs.is_read.history
+    if history.has_changes():
+        was_read = any(history.deleted)
+        if target.is_read and not was_read:
+            _adjust(connection, target, -1)
+        elif not target.is_read and was_read:
+            _adjust(connection, target, 1)
+
+
+def _on_delete(mapper, connection, target):
+    if not target.is_read:
+        _adjust(connection, target, -1)
+
+
+def _invalidate_committed(session):
+    for user_id in session.info.pop(DIRTY_KEY, ()):
+        unread_cache.invalidate(user_id)
+        backplane.broadcast_nowait(TOPIC, {"user_id": user_id})
+
+
+def _discard_rolled_back(session, previous_transaction):
+    session.info.pop(DIRTY_KEY, None)
+
+
+event.listen(Notification, "after_insert", _on_insert)
+event.listen(Notification, "after_update", _on_update)
+event.listen(Notification, "after_delete", _on_delete)
+event.listen(Session, "after_commit", _invalidate_committed)
+event.listen(Session, "after_soft_rollback", _discard_rolled_back)
+
+backplane.on(TOPIC, lambda payload: unread_cache.invalidate(payload["user_id"]))
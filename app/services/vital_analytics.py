@@ -0,0 +1,241 @@
+"""
+Vectorized trend statistics over vital rollups.
+
+`load_window` reads a window of rollup buckets for any number of patients
+and metrics in one query and lays it out as columnar NumPy arrays shaped
+(patients, metrics, buckets), NaN where a bucket has no data. The finer
+buckets that clip the window's edges are folded into the slot of the
+partial bucket they belong to.
+`metric_reports` then computes every statistic for every patient and
+metric in one pass; nothing loops per metric or per patient.
+
+Per-bucket statistics (recent average, half-split trend, slope,
+percentiles) are taken over bucket means, like the original per-metric
+code; average / min / max / data_points are exact over the raw readings.
+"""
+import warnings
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.models.vital_rollup import VitalRollup
+from app.services.rollups import bucket_start, choose_granularity, rollup_query
+
+RECENT_BUCKETS = 5
+TREND_THRESHOLD = 0.1
+PERCENTILES = (10, 50, 90)
+
+ROW_COLUMNS = (
+    VitalRollup.user_id, VitalRollup.metric, VitalRollup.bucket_start, VitalRollup.count,
+    VitalRollup.sum, VitalRollup.min, VitalRollup.max, VitalRollup.last_value, VitalRollup.last_at,
+)
+
+
+def _coarsen(rows: List[tuple], granularity: str) -> List[tuple]:
+    """Merge ROW_COLUMNS tuples that fall in the same `granularity` bucket"""
+    merged: Dict[tuple, tuple] = {}
+    for row in rows:
+        key = (row[0], row[1], bucket_start(row[2], granularity))
+        other = merged.get(key)
+        if other is None:
+            merged[key] = key + tuple(row[3:])
+            continue
+        latest = row if (row[8] or datetime.min) >= (other[8] or datetime.min) else other
+        merged[key] = key + (other[3] + row[3], other[4] + row[4], min(other[5], row[5]),
+                             max(other[6], row[6]), latest[7], latest[8])
+    return list(merged.values())
+
+
+def _epoch(ts: datetime) -> float:
+    # Rollup timestamps are naive UTC
+    return ts.replace(tzinfo=timezone.utc).timestamp()
+
+
+@dataclass
+class VitalWindow:
+    user_ids: List[int]
+    metrics: List[str]
+    timestamps: List[datetime]
+    count: np.ndarray
+    sum: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    last_value: np.ndarray
+    last_at: np.ndarray  # epoch seconds
+
+    @classmethod
+    def from_rows(cls, rows: Iterable, user_ids: List[int], metrics: List[str],
+                  granularity: Optional[str] = None) -> "VitalWindow":
+        """
+        Rows are ROW_COLUMNS tuples (or VitalRollup objects). With
+        `granularity`, rows are merged into buckets of that size first.
+        """
+        rows = [
+            row if isinstance(row, tuple) else tuple(getattr(row, c.key) for c in ROW_COLUMNS)
+            for row in rows
+        ]
+        rows = [row for row in rows if row[3]]
+        if granularity:
+            rows = _coarsen(rows, granularity)
+        timestamps = sorted({row[2] for row in rows})
+
+        user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+        metric_index = {metric: i for i, metric in enumerate(metrics)}
+        time_index = {ts: i for i, ts in enumerate(timestamps)}
+        rows = [row for row in rows if row[0] in user_index and row[1] in metric_index]
+
+        shape = (len(user_ids), len(metrics), len(timestamps))
+        window = cls(
+            user_ids=list(user_ids), metrics=list(metrics), timestamps=timestamps,
+            count=np.zeros(shape), sum=np.zeros(shape),
+            min=np.full(shape, np.nan), max=np.full(shape, np.nan),
+            last_value=np.full(shape, np.nan), last_at=np.full(shape, np.nan),
+        )
+        if rows:
+            columns = list(zip(*rows))
+            at = (
+                np.fromiter((user_index[u] for u in columns[0]), dtype=np.intp, count=len(rows)),
+                np.fromiter((metric_index[m] for m in columns[1]), dtype=np.intp, count=len(rows)),
+                np.fromiter((time_index[t] for t in columns[2]), dtype=np.intp, count=len(rows)),
+            )
+            window.count[at] = columns[3]
+            window.sum[at] = columns[4]
+            window.min[at] = np.array(columns[5], dtype=float)
+            window.max[at] = np.array(columns[6], dtype=float)
+            window.last_value[at] = np.array(columns[7], dtype=float)
+            window.last_at[at] = [_epoch(ts) if ts else np.nan for ts in columns[8]]
+        return window
+
+    @property
+    def means(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+
+
+def load_window(db, user_ids: List[int], metrics: List[str], start: datetime,
+                end: Optional[datetime] = None, granularity: Optional[str] = None) -> VitalWindow:
+    """One query for all patients and metrics (sync session)"""
+    end = end or datetime.utcnow()
+    granularity = granularity or choose_granularity(start, end)
+    query = rollup_query(user_ids, metrics, start, end, granularity).with_only_columns(*ROW_COLUMNS)
+    return VitalWindow.from_rows(db.execute(query).all(), user_ids, metrics, granularity)
+
+
+def _masked_mean(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    total = np.where(mask, values, 0.0).sum(axis=-1)
+    n = mask.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, total / n, np.nan)
+
+
+def compute_statistics(window: VitalWindow) -> Dict[str, np.ndarray]:
+    """Every statistic as a (patients, metrics) array"""
+    means = window.means
+    valid = ~np.isnan(means)
+    n = valid.sum(axis=-1)
+    data_points = window.count.sum(axis=-1)
+    has_data = data_points > 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average = np.where(has_data, window.sum.sum(axis=-1) / data_points, np.nan)
+    minimum = np.where(has_data, np.fmin.reduce(window.min, axis=-1, initial=np.inf), np.nan)
+    maximum = np.where(has_data, np.fmax.reduce(window.max, axis=-1, initial=-np.inf), np.nan)
+
+    # Position of each valid bucket among the valid ones, from the start and from the end
+    position = np.cumsum(valid, axis=-1) - 1
+    from_end = n[..., None] - 1 - position
+    recent_average = _masked_mean(means, valid & (from_end < RECENT_BUCKETS))
+
+    first_half = _masked_mean(means, valid & (position < (n // 2)[..., None]))
+    second_half = _masked_mean(means, valid & (position >= (n // 2)[..., None]))
+    comparable = n >= 2
+    improving = comparable & (second_half > first_half * (1 + TREND_THRESHOLD))
+    declining = comparable & (second_half < first_half * (1 - TREND_THRESHOLD))
+
+    # Least-squares slope of bucket means, per day
+    if window.timestamps:
+        t0 = window.timestamps[0]
+        days = np.array([(ts - t0).total_seconds() / 86400 for ts in window.timestamps])
+    else:
+        days = np.zeros(0)
+    days = np.broadcast_to(days, means.shape)
+    t_mean = _masked_mean(days, valid)[..., None]
+    y_mean = _masked_mean(means, valid)[..., None]
+    dt = np.where(valid, days - t_mean, 0.0)
+    dy = np.where(valid, means - y_mean, 0.0)
+    variance = (dt * dt).sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(comparable & (variance > 0), (dt * dy).sum(axis=-1) / variance, np.nan)
+
+    if means.shape[-1]:
+        with warnings.catch_warnings():
+            # All-NaN rows (no data) come back as NaN, which is what we want
+            warnings.simplefilter("ignore", RuntimeWarning)
+            percentiles = np.nanpercentile(means, PERCENTILES, axis=-1)
+        last_at = np.where(np.isnan(window.last_at), -np.inf, window.last_at)
+        latest = np.argmax(last_at, axis=-1)[..., None]
+        latest_value = np.take_along_axis(window.last_value, latest, axis=-1)[..., 0]
+        latest_at = np.take_along_axis(window.last_at, latest, axis=-1)[..., 0]
+    else:
+        percentiles = np.full((len(PERCENTILES),) + means.shape[:-1], np.nan)
+        latest_value = latest_at = np.full(means.shape[:-1], np.nan)
+
+    return {
+        "has_data": has_data,
+        "average": average,
+        "min": minimum,
+        "max": maximum,
+        "recent_average": recent_average,
+        "trend": np.where(improving, "improving", np.where(declining, "declining", "stable")),
+        "slope_per_day": slope,
+        "percentiles": percentiles,
+        "data_points": data_points,
+        "latest_value": latest_value,
+        "latest_at": latest_at,
+    }
+
+
+def _number(value) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def metric_reports(window: VitalWindow, names: Dict[str, str]) -> Dict[int, Dict[str, dict]]:
+    """
+    Per patient, a report per trend name. `names` maps trend name -> metric;
+    names whose metric is missing from the window report no data.
+    """
+    stats = compute_statistics(window)
+    metric_index = {metric: i for i, metric in enumerate(window.metrics)}
+    reports = {}
+    for p, user_id in enumerate(window.user_ids):
+        report = {}
+        for name, metric in names.items():
+            m = metric_index.get(metric)
+            if m is None or not stats["has_data"][p, m]:
+                report[name] = {
+                    "has_data": False,
+                    "message": f"No {name.replace('_', ' ')} data available",
+                }
+                continue
+            report[name] = {
+                "has_data": True,
+                "average": float(stats["average"][p, m]),
+                "min": float(stats["min"][p, m]),
+                "max": float(stats["max"][p, m]),
+                "recent_average": float(stats["recent_average"][p, m]),
+                "trend": str(stats["trend"][p, m]),
+                "slope_per_day": _number(stats["slope_per_day"][p, m]),
+                "percentiles": {
+                    f"p{q}": _number(stats["percentiles"][i, p, m]) for i, q in enumerate(PERCENTILES)
+                },
+                "data_points": int(stats["data_points"][p, m]),
+                "critical_count": 0,
+                "latest_value": float(stats["latest_value"][p, m]),
+                "latest_timestamp": datetime.fromtimestamp(
+                    stats["latest_at"][p, m], timezone.utc
+                ).replace(tzinfo=None).isoformat(),
+            }
+        reports[user_id] = report
+    return reports
@@ -0,0 +1,223 @@
+"""
+Batched persistence of vital readings coming from IoT Hub / Azure Functions.
+
+A batch resolves every referenced device with one SELECT (creating unknown
+devices in one flush), writes all readings with a single multi-row INSERT
+and touches `iot_devices.last_sync` with one UPDATE, merges the readings
+into the vital rollups, daily health summary and patient latest state,
+then commits once. Stored readings also pass through the
+emergency rule engine; resulting EmergencyEvent rows are written in the
+same transaction and pushed to caregivers after the commit.
+
+Readings replayed from the write-behind spool carry an `ingest_key`; a
+key that is already stored is skipped, so a replay never duplicates rows
+or counts them twice in the aggregates.
+"""
+from datetime import datetime
+from typing import List, Optional
+import logging
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.iot_device import IoTDevice, VitalReading
+from app.models.emergency import EmergencyEvent
+from app.handler.emergency_engine import emergency_engine
+from app.services.rollups import apply_rollups, samples_from_readings
+from app.services.daily_summary import accumulate_readings, apply_daily_summary
+from app.services.latest_state import apply_latest_state, fold_readings
+from app.utils.sql import upsert
+
+logger = logging.getLogger(__name__)
+
+# fix this later, get user by device_id or email that
+#  the person provides from the frontend
+DEFAULT_USER_ID = 1
+
+
+def parse_timestamp(value: Optional[str]) -> datetime:
+    if not value:
+        return datetime.now()
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+async def find_devices(db: AsyncSession, device_ids: List[str]) -> dict:
+    """Map external device ids to the IoTDevice rows already registered"""
+    return {
+        device.device_id: device
+        for device in (await db.scalars(
+            select(IoTDevice).where(IoTDevice.device_id.in_(set(device_ids)))
+        )).all()
+    }
+
+
+async def register_devices(db: AsyncSession, device_ids: List[str]) -> dict:
+    """Register unknown devices (to DEFAULT_USER_ID) in one flush"""
+    new_devices = [
+        IoTDevice(
+            user_id=DEFAULT_USER_ID,
+            device_id=device_id,
+            device_type="smartwatch",
+            device_name=f"Device {device_id}",
+            manufacturer="Unknown",
+            model="Unknown",
+            connection_status="connected",
+            last_sync=datetime.now(),
+        )
+        for device_id in device_ids
+    ]
+    db.add_all(new_devices)
+    await db.flush()
+    return {device.device_id: device for device in new_devices}
+
+
+async def insert_keyed(db: AsyncSession, rows: List[dict]):
+    """
+    Insert rows carrying an `ingest_key`, skipping keys already stored.
+    Returns the rows actually inserted and their ids.
+    """
+    result = await db.execute(
+        upsert(db, VitalReading.__table__)
+        .on_conflict_do_nothing(index_elements=["ingest_key"])
+        .returning(VitalReading.id, VitalReading.ingest_key),
+        rows,
+    )
+    stored = {key: reading_id for reading_id, key in result}
+    rows = [row for row in rows if row["ingest_key"] in stored]
+    return rows, [stored[row["ingest_key"]] for row in rows]
+
+
+async def store_derived(db: AsyncSession, rows: List[dict], reading_ids: List[int],
+                        devices: dict) -> List[EmergencyEvent]:
+    """
+    Everything that follows the INSERT of a batch: emergency flags and
+    events, device last_sync and the aggregate tables. Caller commits.
+    """
+    # Flags is_emergency on the rows that raised an alert
+    reported = [row["is_emergency"] for row in rows]
+    alerts = emergency_engine.process_readings(rows) if settings.EMERGENCY_DETECTION_ENABLED else []
+    flagged = [reading_id for row, reading_id, was_flagged in zip(rows, reading_ids, reported)
+               if row["is_emergency"] and not was_flagged]
+    if flagged:
+        await db.execute(
+            update(VitalReading).where(VitalReading.id.in_(flagged)).values(is_emergency=True)
+        )
+
+    # One last_sync touch per batch instead of per reading
+    await db.execute(
+        update(IoTDevice)
+        .where(IoTDevice.id.in_({device.id for device in devices.values()}))
+        .values(last_sync=datetime.now(), connection_status="connected")
+    )
+
+    await apply_rollups(db, samples_from_readings(rows))
+    await apply_daily_summary(db, accumulate_readings({}, rows))
+    await apply_latest_state(db, fold_readings({}, rows))
+
+    events = [
+        EmergencyEvent(
+            user_id=alert.user_id,
+            event_type=alert.event_type,
+            severity=alert.severity,
+            status="active",
+            description=alert.description,
+            triggered_at=alert.triggered_at,
+        )
+        for alert in alerts
+    ]
+    db.add_all(events)
+    return events
+
+
+async def store_readings(db: AsyncSession, readings: List[dict], devices: dict):
+    """INSERT a batch, derive everything from it and commit: (ids, rows, events)"""
+    rows = []
+    for reading in readings:
+        device = devices[reading["device_id"]]
+        row = {key: value for key, value in reading.items() if key != "device_id"}
+        row["device_id"] = device.id
+        row["user_id"] = device.user_id
+        row.setdefault("is_emergency", False)
+        rows.append(row)
+
+    if all(row.get("ingest_key") for row in rows):
+        rows, reading_ids = await insert_keyed(db, rows)
+    else:
+        # SQLite has no ordering sentinel and would fall back to row-at-a-time
+        # inserts; it assigns rowids in VALUES order, so sort the ids instead.
+        ordered = db.bind.dialect.name != "sqlite"
+        result = await db.execute(
+            insert(VitalReading).returning(VitalReading.id, sort_by_parameter_order=ordered),
+            rows,
+        )
+        reading_ids = list(result.scalars())
+        if not ordered:
+            reading_ids.sort()
+
+    # Engine state only advances if the batch commits, so a retry still alerts
+    engine_state = emergency_engine.snapshot({row["user_id"] for row in rows})
+    try:
+        events = await store_derived(db, rows, reading_ids, devices)
+        await db.commit()
+    except BaseException:
+        emergency_engine.restore(engine_state)
+        raise
+    return reading_ids, rows, events
+
+
+async def ingest_readings(db: AsyncSession, readings: List[dict]) -> List[int]:
+    """
+    Persist readings and return their ids in input order.
+
+    Each reading is a dict with `device_id` (external id), `timestamp`
+    (datetime) and any VitalReading measurement columns. When every reading
+    carries an `ingest_key`, readings whose key is already stored are
+    skipped and left out of the returned ids.
+    """
+    if not readings:
+        return []
+
+    device_ids = [r["device_id"] for r in readings]
+    devices = await find_devices(db, device_ids)
+    missing = [device_id for device_id in set(device_ids) if device_id not in devices]
+    user_ids = {device.user_id for device in devices.values()}
+    if missing:
+        user_ids.add(DEFAULT_USER_ID)
+
+    # Held before the first write, so a batch waiting here holds no DB locks
+    async with emergency_engine.hold(user_ids):
+        if missing:
+            devices.update(await register_devices(db, missing))
+        reading_ids, rows, events = await store_readings(db, readings, devices)
+    logger.info(f"Ingested {len(rows)} vital readings from {len(devices)} device(s)")
+
+    if events:
+        await notify_caregivers(db, events)
+    return reading_ids
+
+
+async def notify_caregivers(db: AsyncSession, events: List[EmergencyEvent]):
+    """Push new emergency events to the patients' caregivers and store them as notifications"""
+    from app.routers.notifications import notification_manager
+
+    for event in events:
+        logger.warning(f"Emergency {event.event_type} ({event.severity}) for user {event.user_id}")
+        try:
+            await notification_manager.broadcast_to_caregivers(event.user_id, {
+                "type": "emergency",
+                "event_id": event.id,
+                "patient_id": event.user_id,
+                "event_type": event.event_type,
+                "severity": event.severity,
+                "description": event.description,
+                "triggered_at": event.triggered_at.isoformat(),
+            }, db, record={
+                "notification_type": "system",
+                "title": f"Emergency: {event.event_type.replace('_', ' ')}",
+                "message": event.description,
+                "sender_id": event.user_id,
+                "sender_type": "emergency",
+            })
+        except Exception as e:
+            logger.error(f"Failed to push emergency event {event.id}: {str(e)}")
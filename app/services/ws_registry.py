@@ -0,0 +1,167 @@
+"""
+Per-worker registry of WebSocket connections, shared by the messaging and
+notification managers.
+
+A user may hold any number of connections (phone, tablet, browser tabs).
+Each connection gets a bounded send queue drained by its own writer task,
+so sending never waits on a client. When a client falls WS_SEND_QUEUE_SIZE
+messages behind, it is closed with 1013 and reconnects and resyncs; it does
+not hold up everyone else.
+
+Dead sockets are detected below the application: uvicorn sends
+protocol-level pings (--ws-ping-interval, 20 s by default) that every
+client answers on its own, and closes connections whose pong does not
+arrive within --ws-ping-timeout. The server sends no heartbeat frames of
+its own.
+
+For deployments whose clients send their own keep-alive frames (the
+endpoints answer {"type": "ping"} with {"type": "pong"}), setting
+WS_IDLE_TIMEOUT_SECONDS > 0 also closes connections that have sent
+nothing for that long. It is off by default, because listen-only clients
+such as most notification sockets never send anything.
+"""
+from typing import Dict, List, Optional
+import asyncio
+import itertools
+import logging
+import time
+import weakref
+
+from fastapi import WebSocket
+
+from app.config import settings
+from app.services.backplane import Backplane
+
+logger = logging.getLogger(__name__)
+
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_GOING_AWAY = 1001
+
+_registries = weakref.WeakSet()
+_connection_ids = itertools.count(1)
+
+
+class Connection:
+    def __init__(self, user_id: int, websocket: WebSocket, queue_size: int):
+        self.id = next(_connection_ids)
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+
+class ConnectionRegistry:
+    scope = "default"
+
+    def __init__(self, backplane: Backplane, queue_size: Optional[int] = None,
+                 idle_timeout: Optional[float] = None):
+        self.backplane = backplane
+        self.queue_size = max(queue_size or settings.WS_SEND_QUEUE_SIZE, 1)
+        self.idle_timeout = settings.WS_IDLE_TIMEOUT_SECONDS if idle_timeout is None else idle_timeout
+        self.connections: Dict[int, Dict[int, Connection]] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self.opened = 0
+        self.sent = 0
+        self.send_errors = 0
+        self.evicted_slow = 0
+        self.evicted_idle = 0
+
+        backplane.register(self.scope, self.send_local)
+        _registries.add(self)
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> Connection:
+        await websocket.accept()
+        connection = Connection(user_id, websocket, self.queue_size)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.connections.setdefault(user_id, {})[connection.id] = connection
+        self.opened += 1
+        if self.idle_timeout > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.create_task(self._sweep())
+        await self.backplane.join(self.scope, user_id)
+        return connection
+
+    async def disconnect(self, connection: Connection, code: Optional[int] = None):
+        """Forget a connection; safe to call more than once"""
+        if connection.closed:
+            return
+        connection.closed = True
+        user_connections = self.connections.get(connection.user_id, {})
+        user_connections.pop(connection.id, None)
+        if not user_connections:
+            self.connections.pop(connection.user_id, None)
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        if code is not None:
+            try:
+                await connection.websocket.close(code=code)
+            except Exception:
+                pass
+        await self.backplane.leave(self.scope, connection.user_id)
+
+    def touch(self, connection: Connection):
+        connection.last_seen = time.monotonic()
+
+    async def send_to(self, connection: Connection, message: dict) -> bool:
+        try:
+            connection.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.evicted_slow += 1
+            logger.warning(f"{self.scope} connection {connection.id} for user {connection.user_id} is too slow; closing")
+            await self.disconnect(connection, CLOSE_TRY_AGAIN_LATER)
+            return False
+
+    async def send_local(self, user_id: int, message: dict) -> bool:
+        """Queue a message on every connection the user has on this worker"""
+        queued = False
+        for connection in self.user_connections(user_id):
+            queued = await self.send_to(connection, message) or queued
+        return queued
+
+    def user_connections(self, user_id: int) -> List[Connection]:
+        return list(self.connections.get(user_id, {}).values())
+
+    async def _write(self, connection: Connection):
+        try:
+            while True:
+                message = await connection.queue.get()
+                await connection.websocket.send_json(message)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.send_errors += 1
+            logger.warning(f"{self.scope} send to user {connection.user_id} failed: {e}")
+            await self.disconnect(connection)
+
+    async def _sweep(self):
+        while self.connections:
+            await asyncio.sleep(self.idle_timeout / 2)
+            deadline = time.monotonic() - self.idle_timeout
+            for user_connections in list(self.connections.values()):
+                for connection in list(user_connections.values()):
+                    if connection.last_seen < deadline:
+                        self.evicted_idle += 1
+                        await self.disconnect(connection, CLOSE_GOING_AWAY)
+
+    def stats(self) -> dict:
+        depths = [c.queue.qsize() for user in self.connections.values() for c in user.values()]
+        return {
+            "users": len(self.connections),
+            "connections": len(depths),
+            "opened": self.opened,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "sent": self.sent,
+            "send_errors": self.send_errors,
+            "evicted_slow": self.evicted_slow,
+            "evicted_idle": self.evicted_idle,
+        }
+
+
+def registry_stats() -> dict:
+    return {registry.scope: registry.stats() for registry in _registries}
@@ -0,0 +1,64 @@
+"""
+Opaque keyset-pagination cursors: the sort key of the last row returned,
+as url-safe base64 JSON, optionally tagged with the scope (e.g. the sort
+order) it belongs to.
+"""
+from datetime import datetime
+import base64
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(values: List[Any], scope: Optional[str] = None) -> str:
+    if scope is not None:
+        values = [scope, *values]
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor"
+    )
+
+
+def _convert(value: Any, kind: type) -> Any:
+    if kind is datetime:
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                pass
+        raise _invalid_cursor()
+    # bool is an int to isinstance
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise _invalid_cursor()
+    return value
+
+
+def decode_cursor(cursor: str, *types: type, scope: Optional[str] = None) -> List[Any]:
+    """
+    Values of a cursor made by `encode_cursor`. With `types` (int, str or
+    datetime, the latter sent as ISO text) the cursor must hold exactly one
+    value of each, returned converted; with `scope` it must have been made
+    for that scope. Anything else is a 400.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        values = None
+    if not isinstance(values, list):
+        raise _invalid_cursor()
+    if scope is not None:
+        if not values or values[0] != scope:
+            raise _invalid_cursor()
+        values = values[1:]
+    if types:
+        if len(values) != len(types):
+            raise _invalid_cursor()
+        values = [_convert(value, kind) for value, kind in zip(values, types)]
+    return values
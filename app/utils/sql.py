@@ -0,0 +1,46 @@
+"""
+Small dialect helpers for statements that differ between PostgreSQL and
+the SQLite fallback. Both dialects support INSERT ... ON CONFLICT.
+"""
+from sqlalchemy import Date, cast, func, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def dialect_name(db) -> str:
+    """Dialect of a Session, AsyncSession, SyncSessionAdapter or engine"""
+    bind = getattr(db, "bind", None) or db
+    return bind.dialect.name
+
+
+def upsert(db, table):
+    """`insert()` for the session's dialect, exposing `on_conflict_do_update`"""
+    if dialect_name(db) == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def least(db, *args):
+    # SQLite's multi-argument min()/max() are the scalar forms
+    if dialect_name(db) == "postgresql":
+        return func.least(*args)
+    return func.min(*args)
+
+
+def greatest(db, *args):
+    if dialect_name(db) == "postgresql":
+        return func.greatest(*args)
+    return func.max(*args)
+
+
+def date_bucket(db, column, bucket: str):
+    """Start date of the day / week (Monday) / month containing `column`"""
+    if dialect_name(db) == "postgresql":
+        return cast(func.date_trunc(bucket, column), Date)
+    modifiers = {"day": (), "week": ("weekday 0", "-6 days"), "month": ("start of month",)}
+    return type_coerce(func.date(column, *modifiers[bucket]), Date)
+
+
+def seconds_between(db, later, earlier):
+    if dialect_name(db) == "postgresql":
+        return func.extract("epoch", later - earlier)
+    return (func.julianday(later) - func.julianday(earlier)) * 86400.0
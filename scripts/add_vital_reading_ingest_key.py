@@ -0,0 +1,39 @@
+"""
+Add vital_readings.ingest_key and its unique index, used by the write-behind
+buffer to skip readings already stored when it replays a spool. Run before
+deploying with IOT_WRITE_BEHIND_ENABLED.
+
+Usage: python scripts/add_vital_reading_ingest_key.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+from sqlalchemy import inspect, text
+
+from app.database import engine
+from app.models.iot_device import VitalReading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate():
+    existing = {column["name"] for column in inspect(engine).get_columns("vital_readings")}
+    if "ingest_key" not in existing:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE vital_readings ADD COLUMN ingest_key VARCHAR(32)"))
+        logger.info("✅ Added vital_readings.ingest_key")
+    for index in VitalReading.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+        logger.info(f"✅ Index {index.name} ready")
+
+
+if __name__ == "__main__":
+    try:
+        migrate()
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
@@ -0,0 +1,56 @@
+"""
+Throughput benchmark for the streaming emergency rule engine.
+
+Usage: python scripts/benchmark_emergency_engine.py [readings] [users]
+Exits non-zero when the engine processes fewer than 5,000 readings/s.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.handler.emergency_engine import VitalRuleEngine
+
+TARGET_READINGS_PER_SECOND = 5000
+
+
+def generate(readings: int, users: int):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(readings):
+        batch.append((
+            i % users,
+            start + timedelta(seconds=3 * (i // users)),
+            rng.randint(55, 140),
+            rng.uniform(84, 100),
+            rng.uniform(50, 320) if i % 20 == 0 else None,
+        ))
+    return batch
+
+
+def run(readings: int = 200_000, users: int = 1_000) -> float:
+    engine = VitalRuleEngine()
+    batch = generate(readings, users)
+
+    started = time.perf_counter()
+    for user_id, at, heart_rate, blood_oxygen, glucose in batch:
+        engine.process(user_id, at, heart_rate, blood_oxygen, glucose)
+    elapsed = time.perf_counter() - started
+
+    rate = readings / elapsed
+    print(f"{readings} readings / {users} users in {elapsed:.2f}s "
+          f"-> {rate:,.0f} readings/s, {engine.alerts_raised} alerts")
+    return rate
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    rate = run(*args)
+    if rate < TARGET_READINGS_PER_SECOND:
+        print(f"❌ Below target of {TARGET_READINGS_PER_SECOND} readings/s")
+        sys.exit(1)
+    print("✅ Throughput target met")
@@ -0,0 +1,44 @@
+"""
+Create the notification feed indexes if missing, then delete notifications
+past retention: read ones older than NOTIFICATION_RETENTION_DAYS, any older
+than NOTIFICATION_UNREAD_RETENTION_DAYS. Meant to run daily from cron.
+
+Usage: python scripts/purge_notifications.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.models.notification import Notification
+from app.services.notification_feed import purge_notifications
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def purge():
+    # create_all skips indexes on tables that already exist
+    for index in Notification.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+        logger.info(f"✅ Index {index.name} ready")
+
+    db = SessionLocal()
+    try:
+        deleted = purge_notifications(
+            db, settings.NOTIFICATION_RETENTION_DAYS, settings.NOTIFICATION_UNREAD_RETENTION_DAYS
+        )
+        logger.info(f"✅ Purged {deleted} notifications")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Notification purge failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    purge()
@@ -0,0 +1,55 @@
+"""
+Add the pair columns and index to messages, create the conversations table
+if missing, then backfill both from existing messages.
+
+Usage: python scripts/rebuild_conversations.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+from sqlalchemy import inspect, text
+
+from app.database import SessionLocal, Base, engine
+from app.models.caregiver import Message
+from app.models.conversation import Conversation
+from app.services.conversations import backfill_message_pairs, rebuild_conversations
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def add_pair_columns():
+    existing = {column["name"] for column in inspect(engine).get_columns("messages")}
+    with engine.begin() as conn:
+        for name in ("user_low_id", "user_high_id"):
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE messages ADD COLUMN {name} INTEGER"))
+                logger.info(f"✅ Added messages.{name}")
+    for index in Message.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+        logger.info(f"✅ Index {index.name} ready")
+
+
+def rebuild():
+    add_pair_columns()
+    Base.metadata.create_all(bind=engine, tables=[Conversation.__table__])
+
+    db = SessionLocal()
+    try:
+        messages = backfill_message_pairs(db)
+        logger.info(f"✅ Backfilled message pairs: {messages} messages")
+        conversations = rebuild_conversations(db)
+        logger.info(f"✅ Rebuilt conversations: {conversations} conversations")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Conversation rebuild failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild()
@@ -0,0 +1,35 @@
+"""
+Rebuild daily_health_summary from health_data, food_logs and vital_readings.
+
+Usage: python scripts/rebuild_daily_health_summary.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+from app.database import SessionLocal, Base, engine
+from app.models.daily_health_summary import DailyHealthSummary
+from app.services.daily_summary import rebuild_daily_summaries
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def rebuild_summary():
+    Base.metadata.create_all(bind=engine, tables=[DailyHealthSummary.__table__])
+    db = SessionLocal()
+    try:
+        days = rebuild_daily_summaries(db)
+        logger.info(f"✅ Rebuilt daily health summary: {days} user-days")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Daily summary rebuild failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_summary()
@@ -0,0 +1,59 @@
+"""
+Create patient_latest_state and the per-user history / doctor panel
+indexes if missing, then rebuild the table from health_data and
+vital_readings.
+
+Usage: python scripts/rebuild_patient_latest_state.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+from app.database import SessionLocal, Base, engine
+from app.models.health import HealthData, FoodLog, WeeklyProgress
+from app.models.iot_device import VitalReading
+from app.models.patient_latest_state import PatientLatestState
+from app.models.user import UserProfile
+from app.services.latest_state import rebuild_latest_states
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEXED_TABLES = (HealthData, FoodLog, WeeklyProgress, VitalReading, UserProfile)
+# Only the history / panel indexes; other indexes on these tables can depend
+# on columns added by their own scripts (e.g. vital_readings.ingest_key)
+INDEX_NAMES = {
+    "ix_health_data_user_date",
+    "ix_food_logs_user_created",
+    "ix_weekly_progress_user_week",
+    "ix_vital_readings_user_timestamp",
+    "ix_user_profiles_doctor_completed",
+}
+
+
+def rebuild_state():
+    Base.metadata.create_all(bind=engine, tables=[PatientLatestState.__table__])
+    # create_all skips indexes on tables that already exist
+    for model in INDEXED_TABLES:
+        for index in model.__table__.indexes:
+            if index.name not in INDEX_NAMES:
+                continue
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ Index {index.name} ready")
+
+    db = SessionLocal()
+    try:
+        patients = rebuild_latest_states(db)
+        logger.info(f"✅ Rebuilt patient latest state: {patients} patients")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Latest state rebuild failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_state()
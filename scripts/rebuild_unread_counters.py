@@ -0,0 +1,38 @@
+"""
+Create the unread_counters table if missing, then recompute every user's
+unread notification and message counts. Run once before deploying the
+badge endpoints, and again if the counters ever drift.
+
+Usage: python scripts/rebuild_unread_counters.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+from app.database import SessionLocal, Base, engine
+from app.models.unread_counter import UnreadCounter
+from app.services.unread_counters import rebuild_unread_counters
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def rebuild():
+    Base.metadata.create_all(bind=engine, tables=[UnreadCounter.__table__])
+
+    db = SessionLocal()
+    try:
+        users = rebuild_unread_counters(db)
+        logger.info(f"✅ Rebuilt unread counters: {users} users")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Unread counter rebuild failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild()
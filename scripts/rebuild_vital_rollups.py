@@ -0,0 +1,62 @@
+"""
+Rebuild vital_rollups from raw health_data and vital_readings rows.
+
+Usage: python scripts/rebuild_vital_rollups.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, select
+import logging
+
+from app.database import SessionLocal, Base, engine
+from app.models.health import HealthData
+from app.models.iot_device import VitalReading
+from app.models.vital_rollup import VitalRollup
+from app.services.rollups import (
+    VITAL_READING_METRICS, apply_rollups_sync, samples_from_health_data, samples_from_readings
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+
+def rebuild_rollups():
+    Base.metadata.create_all(bind=engine, tables=[VitalRollup.__table__])
+    db = SessionLocal()
+    try:
+        db.execute(delete(VitalRollup))
+
+        samples = []
+        for record in db.scalars(select(HealthData).execution_options(yield_per=CHUNK_SIZE)):
+            samples.extend(samples_from_health_data(record))
+            if len(samples) >= CHUNK_SIZE:
+                apply_rollups_sync(db, samples)
+                samples = []
+
+        columns = [VitalReading.user_id, VitalReading.timestamp] + [
+            getattr(VitalReading, column) for column in VITAL_READING_METRICS
+        ]
+        for row in db.execute(select(*columns).execution_options(yield_per=CHUNK_SIZE)).mappings():
+            samples.extend(samples_from_readings([row]))
+            if len(samples) >= CHUNK_SIZE:
+                apply_rollups_sync(db, samples)
+                samples = []
+
+        apply_rollups_sync(db, samples)
+        db.commit()
+        total = db.query(VitalRollup).count()
+        logger.info(f"✅ Rebuilt vital rollups: {total} buckets")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Rollup rebuild failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_rollups()
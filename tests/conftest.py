@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, get_async_db, get_db
+from app.main import app
+from app.services.unread_counters import unread_cache
+
+
+@pytest.fixture
+def db_env(tmp_path):
+    """
+    Temporary SQLite database wired into get_db and get_async_db.
+    `statements` records every SQL statement run against it (clear it after
+    seeding); `login(user)` overrides auth.
+    """
+    # Ids restart in every database, so cached counters must not carry over
+    unread_cache.clear()
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(sync_engine)
+
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionTest = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override():
+        async with AsyncSessionTest() as session:
+            yield session
+
+    SessionTest = sessionmaker(bind=sync_engine, expire_on_commit=False)
+
+    def override_sync():
+        db = SessionTest()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    statements = []
+    for engine in (sync_engine, async_engine.sync_engine):
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    def login(user, *dependencies):
+        from app.auth.security import get_current_active_user, get_current_user
+        for dependency in dependencies or (get_current_active_user, get_current_user):
+            app.dependency_overrides[dependency] = lambda: user
+
+    app.dependency_overrides[get_async_db] = override
+    app.dependency_overrides[get_db] = override_sync
+    yield SimpleNamespace(
+        client=TestClient(app),
+        engine=sync_engine,
+        Session=SessionTest,
+        statements=statements,
+        login=login,
+    )
+    app.dependency_overrides.clear()
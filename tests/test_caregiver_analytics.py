@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from app.models.caregiver import CaregiverRelationship
+from app.models.caregiver_schedule import AppointmentStatus, CaregiverSchedule
+from app.models.caregiver_tasks import CaregiverTask, TaskStatus
+from app.models.user import User
+from app.services.rollups import apply_rollups_sync
+
+
+def seed_panel(db_env):
+    db = db_env.Session()
+    caregiver = User(email="cg@test.com", username="cg", hashed_password="x", is_active=True, is_caregiver=True)
+    patients = [User(email=f"p{i}@test.com", username=f"p{i}", hashed_password="x", is_active=True)
+                for i in range(4)]
+    db.add_all([caregiver, *patients])
+    db.flush()
+    db.add_all([
+        CaregiverRelationship(caregiver_id=caregiver.id, patient_id=patient.id,
+                              status="pending" if i == 3 else "approved")
+        for i, patient in enumerate(patients)
+    ])
+
+    now = datetime.utcnow()
+    calm, declining = patients[0], patients[1]
+    # Declining heart rate and glucose for one patient, a flat trend for another
+    samples = []
+    for day in range(10):
+        ts = now - timedelta(days=10 - day)
+        samples += [(calm.id, "heart_rate", ts, 70.0), (calm.id, "blood_glucose", ts, 100.0),
+                    (declining.id, "heart_rate", ts, 100.0 - day * 5),
+                    (declining.id, "blood_glucose", ts, 150.0 - day * 8)]
+    apply_rollups_sync(db, samples)
+
+    for patient in patients[:3]:
+        db.add_all([
+            CaregiverTask(caregiver_id=caregiver.id, patient_id=patient.id, assigned_by=caregiver.id,
+                          title="meds", task_type="medication", status=TaskStatus.COMPLETED.value,
+                          due_date=now - timedelta(hours=4), completed_at=now - timedelta(hours=2)),
+            CaregiverTask(caregiver_id=caregiver.id, patient_id=patient.id, assigned_by=caregiver.id,
+                          title="walk", status=TaskStatus.PENDING.value, due_date=now - timedelta(days=1)),
+            CaregiverSchedule(caregiver_id=caregiver.id, patient_id=patient.id, title="visit",
+                              appointment_type="checkup", status=AppointmentStatus.COMPLETED.value,
+                              start_time=now, end_time=now + timedelta(hours=1)),
+            CaregiverSchedule(caregiver_id=caregiver.id, patient_id=patient.id, title="visit",
+                              appointment_type="therapy", status=AppointmentStatus.NO_SHOW.value,
+                              start_time=now, end_time=now + timedelta(hours=1)),
+        ])
+    db.commit()
+    db.close()
+    db_env.login(caregiver)
+    return caregiver, patients
+
+
+def test_panel_covers_all_approved_patients_in_fixed_queries(db_env):
+    caregiver, patients = seed_panel(db_env)
+
+    db_env.statements.clear()
+    response = db_env.client.get("/caregiver/analytics/panel")
+    assert response.status_code == 200
+    assert len(db_env.statements) == 4
+
+    body = response.json()
+    assert body["total_patients"] == 3
+    ranking = body["risk_ranking"]
+    assert ranking[0]["patient_id"] == patients[1].id
+    assert ranking[0]["risk_level"] == "medium"
+    assert "Declining heart rate" in ranking[0]["risk_factors"]
+    assert {item["patient_id"] for item in ranking} == {p.id for p in patients[:3]}
+
+    # Each patient matches what the single-patient endpoint reports
+    single = db_env.client.get(f"/caregiver/analytics/patient/{patients[1].id}").json()
+    panel_entry = next(item for item in body["patients"] if item["patient_info"]["id"] == patients[1].id)
+    for key in ("task_analytics", "appointment_analytics", "risk_assessment", "overall_score"):
+        assert panel_entry[key] == single[key]
+    assert panel_entry["health_trends"]["heart_rate"]["average"] == single["health_trends"]["heart_rate"]["average"]
+    assert panel_entry["task_analytics"]["overdue_tasks"] == 1
+    assert panel_entry["task_analytics"]["average_completion_time"] == 2.0
+    assert panel_entry["appointment_analytics"]["no_show"] == 1
+
+
+def test_panel_requires_a_caregiver(db_env):
+    db_env.login(User(id=99, email="x@test.com", username="x", is_caregiver=False))
+    assert db_env.client.get("/caregiver/analytics/panel").status_code == 403
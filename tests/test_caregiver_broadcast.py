@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from app.config import settings
+from app.database import get_async_db
+from app.main import app
+from app.models.caregiver import CaregiverRelationship
+from app.models.notification import Notification
+from app.models.user import User
+from app.routers.notifications import NotificationConnectionManager
+from app.services.backplane import InProcessBackplane, InProcessBus
+from app.services.caregiver_map import caregiver_map
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def seed(db_env):
+    db = db_env.Session()
+    patient = User(email="p@test.com", username="p", hashed_password="x", is_active=True)
+    caregivers = [User(email=f"cg{i}@test.com", username=f"cg{i}", hashed_password="x",
+                       is_active=True, is_caregiver=True) for i in range(4)]
+    db.add_all([patient, *caregivers])
+    db.flush()
+    db.add_all([CaregiverRelationship(caregiver_id=caregiver.id, patient_id=patient.id,
+                                      status="pending" if i == 3 else "approved")
+                for i, caregiver in enumerate(caregivers)])
+    db.commit()
+    db.close()
+    return patient, caregivers
+
+
+def test_broadcast_reaches_all_caregivers_within_the_timeout(db_env, monkeypatch):
+    patient, caregivers = seed(db_env)
+    caregiver_map.clear()
+    monkeypatch.setattr(settings, "WS_SEND_TIMEOUT_SECONDS", 0.05)
+    record = {"notification_type": "system", "title": "Emergency", "message": "HR 150",
+              "sender_id": patient.id, "sender_type": "emergency"}
+
+    async def run():
+        manager = NotificationConnectionManager(InProcessBackplane(bus=InProcessBus()))
+        sockets = [FakeSocket() for _ in caregivers[:2]]
+        for caregiver, socket in zip(caregivers, sockets):
+            await manager.connect(caregiver.id, socket)
+
+        # The third caregiver is on another worker and the publish hangs
+        hanging = caregivers[2].id
+        route = manager.backplane.send
+
+        async def send(scope, user_id, payload):
+            if user_id == hanging:
+                await asyncio.sleep(10)
+            return await route(scope, user_id, payload)
+        manager.backplane.send = send
+
+        async for db in app.dependency_overrides[get_async_db]():
+            db_env.statements.clear()
+            started = time.monotonic()
+            result = await manager.broadcast_to_caregivers(patient.id, {"type": "emergency"}, db, record)
+            assert time.monotonic() - started < 1
+            assert result == {"recipients": 3, "delivered": 2}
+            assert sum("INSERT INTO notifications" in sql for sql in db_env.statements) == 1
+
+            # The recipient set now comes from the cache
+            db_env.statements.clear()
+            await manager.broadcast_to_caregivers(patient.id, {"type": "update"}, db)
+            assert not any("caregiver_relationships" in sql for sql in db_env.statements)
+        await asyncio.sleep(0.01)
+        return sockets
+
+    sockets = asyncio.run(run())
+    assert [len(socket.sent) for socket in sockets] == [2, 2]
+
+    db = db_env.Session()
+    assert sorted(n.user_id for n in db.query(Notification)) == [c.id for c in caregivers[:3]]
+
+    # Approving a relationship invalidates the patient's entry on commit
+    pending = db.query(CaregiverRelationship).filter_by(status="pending").one()
+    pending.status = "approved"
+    db.commit()
+
+    # A rolled-back write leaves nothing to invalidate
+    pending.status = "revoked"
+    db.flush()
+    db.rollback()
+    assert "caregiver_map_dirty" not in db.info
+    db.close()
+
+    async def recipients():
+        async for db in app.dependency_overrides[get_async_db]():
+            return await caregiver_map.caregivers_for(db, patient.id)
+
+    assert asyncio.run(recipients()) == tuple(c.id for c in caregivers)
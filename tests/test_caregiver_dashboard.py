@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+from app.models.caregiver import CaregiverRelationship
+from app.models.caregiver_schedule import AppointmentStatus, CaregiverSchedule
+from app.models.caregiver_tasks import CaregiverTask, TaskStatus
+from app.models.health import HealthData
+from app.models.notification import Notification
+from app.models.user import User, UserProfile
+from app.services.latest_state import rebuild_latest_states
+
+MAX_DASHBOARD_STATEMENTS = 9
+
+
+def seed_caregiver(db_env, patient_count):
+    db = db_env.Session()
+    caregiver = User(email="cg@test.com", username="cg", hashed_password="x", is_active=True, is_caregiver=True)
+    db.add(caregiver)
+    db.flush()
+
+    now = datetime.utcnow()
+    for i in range(patient_count):
+        patient = User(email=f"p{i}@test.com", username=f"p{i}", hashed_password="x", is_active=True)
+        db.add(patient)
+        db.flush()
+        db.add_all([
+            CaregiverRelationship(caregiver_id=caregiver.id, patient_id=patient.id, status="approved"),
+            UserProfile(user_id=patient.id, full_name=f"Patient {i}", age=60 + i,
+                        chronic_conditions=["diabetes"]),
+            HealthData(user_id=patient.id, heart_rate=70, date=now - timedelta(days=2)),
+            HealthData(user_id=patient.id, heart_rate=80 + i, blood_pressure="120/80", date=now - timedelta(hours=1)),
+            CaregiverTask(caregiver_id=caregiver.id, patient_id=patient.id, assigned_by=caregiver.id,
+                          title="meds", status=TaskStatus.PENDING.value, priority="high",
+                          due_date=now + timedelta(hours=i)),
+            CaregiverSchedule(caregiver_id=caregiver.id, patient_id=patient.id, title="visit",
+                              appointment_type="checkup", status=AppointmentStatus.SCHEDULED.value,
+                              start_time=datetime.combine(now.date(), datetime.max.time()) - timedelta(minutes=30 + i),
+                              end_time=datetime.combine(now.date(), datetime.max.time())),
+            Notification(user_id=patient.id, notification_type="critical", title="Alert", message="High HR"),
+        ])
+    requester = User(email="pending@test.com", username="pending", hashed_password="x", is_active=True)
+    db.add(requester)
+    db.flush()
+    db.add(CaregiverRelationship(caregiver_id=caregiver.id, patient_id=requester.id, status="pending"))
+    db.commit()
+    rebuild_latest_states(db)
+    db.close()
+    db_env.login(caregiver)
+
+
+def dashboard_statements(db_env):
+    db_env.statements.clear()
+    response = db_env.client.get("/caregivers/dashboard")
+    assert response.status_code == 200, response.text
+    return response.json(), len(db_env.statements)
+
+
+def test_dashboard_query_count_does_not_grow_with_patients(db_env):
+    seed_caregiver(db_env, 2)
+    body, few = dashboard_statements(db_env)
+    assert few <= MAX_DASHBOARD_STATEMENTS
+
+    stats = body["stats"]
+    assert (stats["total_patients"], stats["active_patients"], stats["pending_tasks"]) == (2, 2, 2)
+    assert stats["pending_requests"] == 1
+    assert (stats["completed_tasks"], stats["overdue_tasks"]) == (0, 1)
+    assert (stats["todays_appointments"], stats["weekly_appointments"]) == (2, 2)
+
+    first = body["recent_patients"][0]
+    assert first["name"] == "Patient 0"
+    assert first["recent_vitals"]["heart_rate"] == 80
+    assert first["conditions"] == ["diabetes"]
+    assert body["upcoming_tasks"][0]["patient_name"] == "p0"
+    assert body["upcoming_tasks"][0]["priority"] == "high"
+    assert {a["patient_name"] for a in body["todays_appointments"]} == {"p0", "p1"}
+    assert {a["patient_name"] for a in body["recent_alerts"]} == {"p0", "p1"}
+
+
+def test_dashboard_keeps_the_summary_fields(db_env):
+    seed_caregiver(db_env, 7)
+    body, _ = dashboard_statements(db_env)
+
+    assert (body["total_patients"], body["pending_requests"]) == (7, 1)
+    assert body["caregiver_status"] == "active"
+    assert len(body["recent_activity"]) == 5
+    activity = body["recent_activity"][0]
+    assert set(activity) == {"patient_id", "relationship_type", "status", "since"}
+    assert (activity["relationship_type"], activity["status"]) == ("family", "approved")
+
+
+def test_dashboard_query_count_is_constant_for_large_panels(db_env):
+    seed_caregiver(db_env, 12)
+    body, many = dashboard_statements(db_env)
+    assert many <= MAX_DASHBOARD_STATEMENTS
+    assert len(body["recent_patients"]) == 5
+    assert len(body["upcoming_tasks"]) == 10
+    assert len({a["patient_name"] for a in body["recent_alerts"]}) == 5
+    assert [p["recent_vitals"]["heart_rate"] for p in body["recent_patients"]] == [80, 81, 82, 83, 84]
+
+
+def test_dashboard_sections_share_a_bounded_number_of_sessions(db_env, monkeypatch):
+    from app.config import settings
+    from app.routers import caregiver_dashboard
+
+    seed_caregiver(db_env, 3)
+    opened = []
+    sibling_session = caregiver_dashboard.sibling_session
+
+    def counting(db):
+        opened.append(db)
+        return sibling_session(db)
+    monkeypatch.setattr(caregiver_dashboard, "sibling_session", counting)
+    monkeypatch.setattr(settings, "CAREGIVER_DASHBOARD_SESSIONS", 2)
+
+    fanned_out, _ = dashboard_statements(db_env)
+    assert len(opened) == 1
+
+    monkeypatch.setattr(settings, "CAREGIVER_DASHBOARD_SESSIONS", 1)
+    sequential, _ = dashboard_statements(db_env)
+    assert len(opened) == 1
+    for body in (fanned_out, sequential):
+        body.pop("last_updated")
+    assert sequential == fanned_out
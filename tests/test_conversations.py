@@ -0,0 +1,124 @@
+from sqlalchemy import func, select, text, update
+
+from app.models.caregiver import CaregiverRelationship, Message
+from app.models.conversation import Conversation
+from app.models.user import User
+from app.services.conversations import backfill_message_pairs, rebuild_conversations
+
+
+def seed_users(db_env):
+    db = db_env.Session()
+    caregiver = User(email="cg@test.com", username="cg", first_name="Care", hashed_password="x",
+                     is_active=True, is_caregiver=True)
+    patients = [User(email=f"p{i}@test.com", username=f"p{i}", hashed_password="x", is_active=True)
+                for i in range(3)]
+    db.add_all([caregiver, *patients])
+    db.flush()
+    db.add_all([CaregiverRelationship(caregiver_id=caregiver.id, patient_id=patient.id, status="approved")
+                for patient in patients])
+    db.commit()
+    db.close()
+    return caregiver, patients
+
+
+def send(db_env, sender, receiver_id, content):
+    db_env.login(sender)
+    response = db_env.client.post("/messages/send", json={"receiver_id": receiver_id, "content": content})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_inbox_is_one_query_and_tracks_send_and_read(db_env):
+    caregiver, patients = seed_users(db_env)
+    send(db_env, caregiver, patients[0].id, "hello p0")
+    first = send(db_env, patients[1], caregiver.id, "question")
+    second = send(db_env, patients[1], caregiver.id, "x" * 300)
+    send(db_env, patients[0], caregiver.id, "thanks")
+
+    db_env.login(caregiver)
+    db_env.statements.clear()
+    inbox = db_env.client.get("/messages/conversations").json()
+    assert len(db_env.statements) == 1
+    assert [c["user_id"] for c in inbox] == [patients[0].id, patients[1].id]
+    assert [c["unread_count"] for c in inbox] == [1, 2]
+    assert inbox[0]["last_message"] == "thanks" and inbox[0]["user_name"] == "p0"
+    assert len(inbox[1]["last_message"]) == 200
+    assert db_env.client.get("/messages/unread-count").json()["unread_count"] == 3
+
+    # Re-marking a read message does not take it off the counter twice
+    for _ in range(2):
+        db_env.client.post("/messages/mark-read", json={"message_ids": [first]})
+    inbox = db_env.client.get("/messages/conversations").json()
+    assert [c["unread_count"] for c in inbox] == [1, 1]
+
+    # Only the receiver can mark a message read
+    db_env.login(patients[1])
+    db_env.client.post("/messages/mark-read", json={"message_ids": [second]})
+    assert db_env.client.get("/messages/conversations").json()[0]["unread_count"] == 0
+    db_env.login(caregiver)
+    db_env.client.post("/messages/mark-read", json={"message_ids": [second]})
+    assert db_env.client.get("/messages/unread-count").json()["unread_count"] == 1
+
+
+def test_backfill_matches_incremental_rows(db_env):
+    caregiver, patients = seed_users(db_env)
+    send(db_env, caregiver, patients[2].id, "one")
+    read = send(db_env, patients[2], caregiver.id, "two")
+    send(db_env, patients[2], caregiver.id, "three")
+    db_env.login(caregiver)
+    db_env.client.post("/messages/mark-read", json={"message_ids": [read]})
+
+    columns = ("user_low_id", "user_high_id", "last_message_id", "last_sender_id",
+               "last_message_preview", "unread_low", "unread_high")
+    db = db_env.Session()
+    incremental = [tuple(getattr(c, name) for name in columns) for c in db.query(Conversation)]
+    db.expunge_all()
+
+    # Messages written before the table existed
+    db.add(Message(sender_id=patients[0].id, receiver_id=caregiver.id, content="legacy", is_read=False))
+    db.commit()
+    assert rebuild_conversations(db) == 2
+    rebuilt = {tuple(getattr(c, name) for name in columns) for c in db.query(Conversation)}
+    assert set(incremental) < rebuilt
+    legacy = next(row for row in rebuilt if row[4] == "legacy")
+    assert legacy[5:] == (1, 0)
+    db.close()
+
+
+def test_history_pages_with_cursors_on_the_pair_index(db_env):
+    caregiver, patients = seed_users(db_env)
+    sent = [send(db_env, *((caregiver, patients[0].id) if i % 2 else (patients[0], caregiver.id)), f"m{i}")
+            for i in range(7)]
+    send(db_env, caregiver, patients[1].id, "elsewhere")
+    url = f"/messages/conversation/{patients[0].id}"
+
+    db_env.login(caregiver)
+    pages, before = [], None
+    while True:
+        page = db_env.client.get(url, params={"limit": 3, **({"before_id": before} if before else {})}).json()
+        if not page:
+            break
+        pages.append([m["id"] for m in page])
+        before = page[0]["id"]
+    assert pages == [sent[4:], sent[1:4], sent[:1]]
+
+    synced = db_env.client.get(url, params={"after_id": sent[2], "limit": 3}).json()
+    assert [m["content"] for m in synced] == ["m3", "m4", "m5"]
+    assert synced[0]["sender_name"] == "Care" and synced[1]["receiver_email"] == "cg@test.com"
+    assert db_env.client.get(url, params={"after_id": sent[-1]}).json() == []
+    assert db_env.client.get(url, params={"after_id": 1, "before_id": 2}).status_code == 400
+
+    with db_env.engine.connect() as conn:
+        plan = " ".join(str(row) for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE user_low_id = 1 AND user_high_id = 2 "
+            "ORDER BY created_at DESC, id DESC LIMIT 3"
+        )))
+    assert "ix_messages_pair_created" in plan and "TEMP B-TREE" not in plan
+
+    db = db_env.Session()
+    db.execute(update(Message).values(user_low_id=None, user_high_id=None))
+    db.commit()
+    assert backfill_message_pairs(db) == 8
+    assert db.scalar(select(func.count()).where(Message.user_low_id == caregiver.id,
+                                                Message.user_high_id == patients[0].id)) == 7
+    db.close()
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+import time
+
+from app.auth.security import get_current_active_doctor
+from app.models.caregiver import Doctor
+from app.models.health import HealthData
+from app.models.user import User, UserProfile
+from app.services.latest_state import rebuild_latest_states
+from app.utils.pagination import encode_cursor
+
+HEART_RATES = [72, 135, 105, None, 80, 125, 90]
+
+
+def seed_doctor(db_env):
+    db = db_env.Session()
+    doctor = Doctor(doctor_id="DOC1", full_name="Dr Who", is_active=True)
+    db.add(doctor)
+    now = datetime.utcnow()
+    for i, heart_rate in enumerate(HEART_RATES):
+        patient = User(email=f"p{i}@test.com", username=f"p{i}", hashed_password="x", is_active=True)
+        db.add(patient)
+        db.flush()
+        db.add(UserProfile(user_id=patient.id, full_name=f"Patient {chr(ord('G') - i)}",
+                           doctor_id="DOC1", profile_completed=True))
+        if heart_rate is not None:
+            db.add(HealthData(user_id=patient.id, heart_rate=heart_rate, date=now - timedelta(seconds=i)))
+    # Someone else's patient and an incomplete profile stay out of the panel
+    for i, (doctor_id, completed) in enumerate([("DOC2", True), ("DOC1", False)]):
+        other = User(email=f"o{i}@test.com", username=f"o{i}", hashed_password="x", is_active=True)
+        db.add(other)
+        db.flush()
+        db.add(UserProfile(user_id=other.id, full_name="Other", doctor_id=doctor_id, profile_completed=completed))
+    db.commit()
+    rebuild_latest_states(db)
+    db.close()
+    db_env.login(doctor, get_current_active_doctor)
+
+
+def walk(db_env, query, limit):
+    pages, cursor = [], None
+    while True:
+        url = f"/doctors/patients?limit={limit}&{query}" + (f"&cursor={cursor}" if cursor else "")
+        response = db_env.client.get(url)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append(body)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_patient_once_in_sort_order(db_env):
+    seed_doctor(db_env)
+
+    pages = walk(db_env, "sort=status", 3)
+    assert [page["count"] for page in pages] == [3, 3, 1]
+    assert pages[0]["total_patients"] == 7 and pages[1]["total_patients"] is None
+    statuses = [p["status"] for page in pages for p in page["patients"]]
+    assert statuses == ["Critical", "Critical", "Monitor", "Stable", "Stable", "Stable", "Stable"]
+
+    names = [p["full_name"] for page in walk(db_env, "sort=name", 2) for p in page["patients"]]
+    assert names == sorted(names) and len(set(names)) == 7
+
+    checkins = [p["latest_heart_rate"] for page in walk(db_env, "sort=last_checkin", 4) for p in page["patients"]]
+    # Newest first; a patient with no vitals yet sorts last
+    assert checkins == [rate for rate in HEART_RATES if rate is not None] + [None]
+
+    critical = walk(db_env, "status_filter=critical", 1)
+    assert [p["latest_heart_rate"] for page in critical for p in page["patients"]] == [135, 125]
+    stable = db_env.client.get("/doctors/patients?status_filter=stable").json()
+    assert stable["total_patients"] == 4
+
+    assert db_env.client.get("/doctors/patients?cursor=not-a-cursor").status_code == 400
+
+
+def test_malformed_or_mismatched_cursors_are_rejected(db_env):
+    seed_doctor(db_env)
+    status_cursor = db_env.client.get("/doctors/patients?limit=2&sort=status").json()["next_cursor"]
+    assert db_env.client.get(f"/doctors/patients?sort=status&cursor={status_cursor}").status_code == 200
+
+    crafted = {
+        "status": [["status", 1], ["status", "1", 2], ["status", True, 2]],
+        "last_checkin": [["last_checkin", 5, 1], ["last_checkin", "yesterday", 1]],
+        "name": [["name", "a", 2, 3], ["name", {"a": 1}, 2], [1, 2]],
+    }
+    for sort, cursors in crafted.items():
+        for values in cursors:
+            response = db_env.client.get(f"/doctors/patients?sort={sort}&cursor={encode_cursor(values)}")
+            assert response.status_code == 400, (sort, values)
+
+    # A cursor from one sort order is not valid for another
+    assert db_env.client.get(f"/doctors/patients?sort=name&cursor={status_cursor}").status_code == 400
+
+
+def test_dashboard_runs_in_two_statements(db_env):
+    seed_doctor(db_env)
+
+    db_env.statements.clear()
+    body = db_env.client.get("/doctors/dashboard").json()
+    assert len(db_env.statements) == 2
+    assert (body["total_patients"], body["critical_patients"]) == (7, 2)
+    assert len(body["patients"]) == 7
+    assert [alert["patient_name"] for alert in body["recent_alerts"]] == ["Patient F", "Patient B"]
+
+
+def test_todays_alerts_use_the_utc_day(db_env, monkeypatch):
+    now = datetime.utcnow()
+    # A zone whose local date differs from the UTC date right now: behind
+    # UTC it would pull in yesterday's reading, ahead of it drop today's
+    monkeypatch.setenv("TZ", "Etc/GMT+12" if now.hour < 12 else "Etc/GMT-14")
+    time.tzset()
+    try:
+        db = db_env.Session()
+        doctor = Doctor(doctor_id="DOC1", full_name="Dr Who", is_active=True)
+        db.add(doctor)
+        midnight = datetime.combine(now.date(), datetime.min.time())
+        for name, measured_at in [("Today", now), ("Yesterday", midnight - timedelta(minutes=1))]:
+            patient = User(email=f"{name}@test.com", username=name, hashed_password="x", is_active=True)
+            db.add(patient)
+            db.flush()
+            db.add(UserProfile(user_id=patient.id, full_name=name, doctor_id="DOC1", profile_completed=True))
+            db.add(HealthData(user_id=patient.id, heart_rate=140, date=measured_at))
+        db.commit()
+        rebuild_latest_states(db)
+        db.close()
+        db_env.login(doctor, get_current_active_doctor)
+
+        body = db_env.client.get("/doctors/dashboard").json()
+        assert [alert["patient_name"] for alert in body["recent_alerts"]] == ["Today"]
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import asyncio
+import os
+
+import pytest
+
+from app.handler.emergency_engine import VitalRuleEngine
+
+START = datetime(2024, 5, 1, 8, 0)
+
+
+def feed(engine, user_id, heart_rates, step_seconds=5, **extra):
+    alerts = []
+    for i, heart_rate in enumerate(heart_rates):
+        alerts += engine.process(user_id, START + timedelta(seconds=i * step_seconds),
+                                 heart_rate=heart_rate, **extra)
+    return alerts
+
+
+def test_sustained_tachycardia_needs_a_full_window():
+    engine = VitalRuleEngine(cooldown_seconds=300)
+    assert feed(engine, 1, [130] * 9) == []
+
+    alerts = feed(VitalRuleEngine(cooldown_seconds=300), 1, [130] * 12)
+    assert [a.event_type for a in alerts] == ["sustained_tachycardia"]
+
+    # A single spike is not sustained
+    assert feed(VitalRuleEngine(), 2, [90, 90, 90, 125, 90, 90, 90, 90, 90, 90, 90]) == []
+
+
+def test_rate_of_change_spo2_and_glucose():
+    engine = VitalRuleEngine(cooldown_seconds=300)
+    assert [a.event_type for a in feed(engine, 1, [70, 115])] == ["rapid_heart_rate_change"]
+
+    alerts = []
+    for i, spo2 in enumerate([97, 89, 88, 89]):
+        alerts += engine.process(2, START + timedelta(seconds=i), blood_oxygen=spo2)
+    assert [(a.event_type, a.severity) for a in alerts] == [("spo2_drop", "high")]
+
+    alerts = engine.process(3, START, glucose_level=45)
+    assert [(a.event_type, a.severity) for a in alerts] == [("hypoglycemia", "critical")]
+    # Cooldown suppresses the repeat
+    assert engine.process(3, START + timedelta(minutes=1), glucose_level=50) == []
+
+
+def test_process_readings_flags_rows():
+    engine = VitalRuleEngine()
+    rows = [{"user_id": 1, "timestamp": START, "heart_rate": 70, "glucose_level": None},
+            {"user_id": 1, "timestamp": START + timedelta(seconds=5), "heart_rate": 72,
+             "glucose_level": 320.0, "is_emergency": False}]
+    alerts = engine.process_readings(rows)
+    assert [a.event_type for a in alerts] == ["hyperglycemia"]
+    assert rows[1]["is_emergency"] is True
+
+
+def test_restore_undoes_a_snapshot_users_progress():
+    engine = VitalRuleEngine(cooldown_seconds=300)
+    feed(engine, 1, [130] * 5)
+    snapshot = engine.snapshot([1, 2])
+
+    assert [a.event_type for a in feed(engine, 1, [130] * 12)] == ["sustained_tachycardia"]
+    feed(engine, 2, [70, 115])
+    engine.restore(snapshot)
+
+    # The rolled-back alert is raised again instead of being under cooldown
+    assert [a.event_type for a in feed(engine, 1, [130] * 12)] == ["sustained_tachycardia"]
+    assert 2 not in engine.users
+
+
+def test_holding_users_keeps_a_rollback_from_undoing_a_concurrent_batch():
+    engine = VitalRuleEngine(cooldown_seconds=300)
+
+    async def batch(heart_rate, fails):
+        async with engine.hold([1]):
+            snapshot = engine.snapshot([1])
+            engine.process(1, START, heart_rate=heart_rate)
+            await asyncio.sleep(0.05)  # the commit
+            if fails:
+                engine.restore(snapshot)
+
+    async def run():
+        await asyncio.gather(batch(66, fails=True), batch(99, fails=False))
+
+    asyncio.run(run())
+    assert engine.users[1].last_hr == 99
+    # Locks are dropped once nobody holds them
+    assert engine._holds == {}
+
+
+@pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="wall-clock benchmark; set RUN_BENCHMARKS=1")
+def test_benchmark_meets_throughput_target():
+    from scripts.benchmark_emergency_engine import TARGET_READINGS_PER_SECOND, run
+
+    assert run(readings=20_000, users=200) >= TARGET_READINGS_PER_SECOND
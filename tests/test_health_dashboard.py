@@ -0,0 +1,92 @@
+from datetime import datetime
+
+from app.models.daily_health_summary import DailyHealthSummary
+from app.models.health import HealthData
+from app.models.user import User, UserProfile
+from app.services.latest_state import rebuild_latest_states
+
+
+def make_user(db_env, **profile):
+    db = db_env.Session()
+    user = User(email="dash@test.com", username="dash", hashed_password="x", is_active=True)
+    db.add(user)
+    db.flush()
+    if profile:
+        db.add(UserProfile(user_id=user.id, **profile))
+    db.commit()
+    db.close()
+    db_env.login(user)
+    return user
+
+
+def test_dashboard_for_new_user_is_one_read_only_query(db_env):
+    make_user(db_env)
+    db_env.statements.clear()
+
+    response = db_env.client.get("/health/dashboard")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["welcome_message"] == "Welcome, dash"
+    assert body["health_snapshot"]["id"] == 0
+    assert body["weekly_progress"]["progress_color"] == "red"
+    assert len(db_env.statements) == 1
+    assert db_env.statements[0].lstrip().upper().startswith("SELECT")
+
+
+def test_dashboard_combines_latest_data_and_todays_meals(db_env):
+    user = make_user(db_env, full_name="Dash Board")
+    db = db_env.Session()
+    db.add_all([
+        HealthData(user_id=user.id, steps=9000, water_intake=1800, date=datetime(2024, 1, 1)),
+        HealthData(user_id=user.id, steps=100, date=datetime(2023, 1, 1)),
+    ])
+    db.commit()
+    rebuild_latest_states(db)
+    db.close()
+    for score in (80, 90, 70, 60, 100, 50):
+        db_env.client.post("/health/food-log", json={"meal_type": "snack", "diet_score": score})
+    db_env.statements.clear()
+
+    body = db_env.client.get("/health/dashboard").json()
+
+    assert len(db_env.statements) == 1
+    assert body["welcome_message"] == "Welcome, Dash Board"
+    assert body["health_snapshot"]["steps"] == 9000
+    assert body["meal_count_today"] == 6
+    assert body["diet_score"] == 75
+    assert len(body["recent_meals"]) == 5
+
+
+def test_health_data_updates_daily_summary(db_env):
+    user = make_user(db_env)
+    for steps, heart_rate in ((1000, 70), (2500, 80)):
+        response = db_env.client.post("/health/health-data",
+                                      json={"steps": steps, "heart_rate": heart_rate})
+        assert response.status_code == 200
+
+    db = db_env.Session()
+    summary = db.get(DailyHealthSummary, (user.id, datetime.now().date()))
+    assert summary.health_entries == 2
+    assert summary.steps == 3500
+    assert summary.heart_rate_avg == 75
+    db.close()
+
+
+def test_rebuild_matches_incremental_summary(db_env):
+    from app.services.daily_summary import rebuild_daily_summaries
+
+    user = make_user(db_env)
+    db_env.client.post("/health/health-data", json={"steps": 1200, "heart_rate": 66})
+    db_env.client.post("/health/food-log", json={"meal_type": "lunch", "diet_score": 81})
+
+    db = db_env.Session()
+    key = (user.id, datetime.now().date())
+    before = db.get(DailyHealthSummary, key)
+    before = (before.steps, before.heart_rate_sum, before.meal_count, before.diet_score_total)
+    db.expunge_all()
+
+    assert rebuild_daily_summaries(db) == 1
+    after = db.get(DailyHealthSummary, key)
+    assert (after.steps, after.heart_rate_sum, after.meal_count, after.diet_score_total) == before
+    db.close()
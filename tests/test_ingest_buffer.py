@@ -0,0 +1,169 @@
+import asyncio
+import glob
+import json
+import shutil
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.models.iot_device import VitalReading
+from app.services.ingest_buffer import BufferFull, IngestBuffer
+
+
+def make_db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'buffer.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(sync_engine)
+    Session = async_sessionmaker(
+        create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://")),
+        class_=AsyncSession, expire_on_commit=False,
+    )
+
+    @asynccontextmanager
+    async def scope():
+        async with Session() as session:
+            yield session
+
+    return sync_engine, scope
+
+
+@asynccontextmanager
+async def broken_scope():
+    raise ConnectionError("database unavailable")
+    yield
+
+
+def reading(heart_rate):
+    return {"device_id": "watch-1", "heart_rate": heart_rate, "blood_oxygen": None,
+            "is_emergency": False, "timestamp": datetime(2024, 5, 1, 10, 0)}
+
+
+def segments(spool):
+    return [path for path in glob.glob(spool + ".*") if not path.endswith((".lock", ".dead"))]
+
+
+def count_readings(engine):
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(VitalReading))
+
+
+def test_flushes_on_size_threshold(tmp_path):
+    engine, scope = make_db(tmp_path)
+    spool = str(tmp_path / "spool.ndjson")
+    buffer = IngestBuffer(spool, max_size=100, flush_size=5,
+                          flush_interval_ms=10_000, session_scope=scope)
+
+    async def run():
+        for i in range(5):
+            await buffer.add(reading(60 + i))
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert count_readings(engine) == 5
+    assert buffer.pending == []
+    assert segments(spool) == []
+
+
+def test_backpressure_and_crash_recovery(tmp_path):
+    engine, scope = make_db(tmp_path)
+    spool = str(tmp_path / "spool.ndjson")
+    crashed = IngestBuffer(spool, max_size=3, flush_size=3,
+                           flush_interval_ms=10_000, session_scope=broken_scope)
+
+    async def fill():
+        for i in range(3):
+            await crashed.add(reading(70 + i))
+        with pytest.raises(BufferFull):
+            await crashed.add(reading(99))
+        await crashed.flush()
+
+    asyncio.run(fill())
+    assert crashed.failed_flushes >= 1
+    assert count_readings(engine) == 0
+    # Process exit releases the owner lock
+    crashed._owner_lock.close()
+
+    # A new process replays the acknowledged readings from the spool
+    restarted = IngestBuffer(spool, max_size=3, flush_size=3,
+                             flush_interval_ms=10_000, session_scope=scope)
+    assert asyncio.run(restarted.recover()) == 3
+    assert count_readings(engine) == 3
+    assert segments(spool) == []
+    # The dead owner's lock file went with its segments
+    assert crashed.owner not in " ".join(glob.glob(spool + ".*"))
+
+
+def test_live_segments_are_left_alone_and_replays_are_idempotent(tmp_path):
+    engine, scope = make_db(tmp_path)
+    spool = str(tmp_path / "spool.ndjson")
+    worker_a, worker_b = (IngestBuffer(spool, max_size=100, flush_size=100, flush_interval_ms=10_000,
+                                       session_scope=scope) for _ in range(2))
+
+    async def run():
+        for i in range(3):
+            await worker_a.add(reading(60 + i))
+        await worker_b.add(reading(90))
+        assert len(set(segments(spool))) == 2
+
+        # A live worker's segment is not replayed by another one
+        assert await worker_b.recover() == 0
+        [segment] = [path for path in segments(spool) if worker_a.owner in path]
+        shutil.copy(segment, tmp_path / "copy")
+        assert await worker_a.flush() == 3
+
+        # A dies after committing but before deleting its segment
+        shutil.copy(tmp_path / "copy", segment)
+        worker_a._owner_lock.close()
+        # Flushed with B's own pending reading; only that one is new
+        assert await worker_b.recover() == 4
+        await worker_b.close()
+
+    asyncio.run(run())
+    assert count_readings(engine) == 4
+    assert glob.glob(spool + ".*") == [spool + ".recover.lock"]
+
+
+def test_rejected_readings_are_dead_lettered_instead_of_blocking_the_buffer(tmp_path):
+    engine, scope = make_db(tmp_path)
+    spool = str(tmp_path / "spool.ndjson")
+    buffer = IngestBuffer(spool, max_size=100, flush_size=100, flush_interval_ms=10_000,
+                          max_flush_attempts=2, session_scope=scope)
+
+    async def run():
+        for i in range(3):
+            await buffer.add(reading(60 + i))
+        await buffer.add({**reading(0), "timestamp": "not a timestamp"})
+
+        assert await buffer.flush() == 0
+        assert await buffer.flush() == 0
+        # Third attempt goes reading by reading and sets the bad one aside
+        assert await buffer.flush() == 3
+        assert buffer.pending == [] and segments(spool) == []
+
+        await buffer.add(reading(70))
+        assert await buffer.flush() == 1
+
+    asyncio.run(run())
+    assert count_readings(engine) == 4
+    assert buffer.stats()["dead_lettered"] == 1
+    with open(spool + ".dead") as dead:
+        assert [json.loads(line)["timestamp"] for line in dead] == ["not a timestamp"]
+
+
+def test_outages_are_retried_not_dead_lettered(tmp_path):
+    spool = str(tmp_path / "spool.ndjson")
+    buffer = IngestBuffer(spool, max_size=100, flush_size=100, flush_interval_ms=10_000,
+                          max_flush_attempts=1, session_scope=broken_scope)
+
+    async def run():
+        await buffer.add(reading(60))
+        for _ in range(3):
+            assert await buffer.flush() == 0
+
+    asyncio.run(run())
+    assert len(buffer.pending) == 1 and buffer.dead_lettered == 0
+    assert not glob.glob(spool + ".dead")
@@ -0,0 +1,106 @@
+import json
+
+from sqlalchemy import func, select
+
+from app.models.iot_device import IoTDevice, VitalReading
+
+
+def reading(device, heart_rate):
+    return {"device_id": device, "heart_rate": heart_rate,
+            "timestamp": "2024-05-01T10:00:00Z", "data_type": "heart_rate"}
+
+
+def test_batch_array_stores_with_per_item_status(db_env):
+    engine, statements = db_env.engine, db_env.statements
+    items = [reading("watch-1", 70 + i) for i in range(50)] + [{"device_id": "x"}]
+    items += [reading("watch-2", 99)]
+    response = db_env.client.post("/iot/webhook/batch", json=items)
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["status"] == "partial"
+    assert body["stored"] == 51
+    assert body["results"][50]["status"] == "rejected"
+    assert body["results"][51]["status"] == "stored"
+
+    # device lookup, device insert, reading insert, last_sync update
+    inserts = [s for s in statements if s.startswith("INSERT INTO vital_readings")]
+    assert len(inserts) == 1
+    assert sum(s.startswith("UPDATE iot_devices") for s in statements) == 1
+
+    with engine.connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(VitalReading)) == 51
+        assert conn.scalar(select(func.count()).select_from(IoTDevice)) == 2
+
+
+def test_batch_ndjson_stream(db_env):
+    engine = db_env.engine
+    body = "\n".join(json.dumps(reading("watch-3", 80 + i)) for i in range(5)) + "\n"
+    response = db_env.client.post(
+        "/iot/webhook/batch", content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["stored"] == 5
+    with engine.connect() as conn:
+        heart_rates = conn.scalars(select(VitalReading.heart_rate).order_by(VitalReading.id)).all()
+    assert heart_rates == [80, 81, 82, 83, 84]
+
+
+def test_batch_raises_emergency_events(db_env):
+    from app.handler.emergency_engine import emergency_engine
+    from app.models.emergency import EmergencyEvent
+
+    # Earlier tests fed the same (default) user
+    emergency_engine.users.clear()
+    engine = db_env.engine
+    items = [dict(reading("watch-9", 135), timestamp=f"2024-05-01T10:00:{i * 5:02d}Z")
+             for i in range(12)]
+    response = db_env.client.post("/iot/webhook/batch", json=items)
+
+    assert response.json()["stored"] == 12
+    with engine.connect() as conn:
+        events = conn.execute(select(EmergencyEvent.event_type, EmergencyEvent.severity)).all()
+        flagged = conn.scalar(select(func.count()).select_from(VitalReading)
+                              .where(VitalReading.is_emergency.is_(True)))
+    assert events == [("sustained_tachycardia", "high")]
+    assert flagged == 1
+
+
+def test_oversized_batch_is_rejected_before_storing(db_env, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "IOT_BATCH_MAX_ITEMS", 3)
+    monkeypatch.setattr(settings, "IOT_BATCH_CHUNK_SIZE", 2)
+    body = "\n".join(json.dumps(reading("watch-4", 80 + i)) for i in range(4))
+    response = db_env.client.post(
+        "/iot/webhook/batch", content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 413
+    with db_env.engine.connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(VitalReading)) == 0
+
+
+def test_failed_batch_does_not_put_its_alert_under_cooldown(db_env, monkeypatch):
+    from app.handler.emergency_engine import emergency_engine
+    from app.models.emergency import EmergencyEvent
+    from app.services import vital_ingest
+
+    emergency_engine.users.clear()
+    items = [dict(reading("watch-9", 135), timestamp=f"2024-05-01T10:00:{i * 5:02d}Z")
+             for i in range(12)]
+
+    async def unavailable(db, state):
+        raise ConnectionError("database unavailable")
+    apply_latest_state = vital_ingest.apply_latest_state
+    monkeypatch.setattr(vital_ingest, "apply_latest_state", unavailable)
+    assert db_env.client.post("/iot/webhook/batch", json=items).json()["stored"] == 0
+
+    monkeypatch.setattr(vital_ingest, "apply_latest_state", apply_latest_state)
+    assert db_env.client.post("/iot/webhook/batch", json=items).json()["stored"] == 12
+    with db_env.engine.connect() as conn:
+        events = conn.scalars(select(EmergencyEvent.event_type)).all()
+    assert events == ["sustained_tachycardia"]
@@ -0,0 +1,73 @@
+import asyncio
+
+from app.services.iot_hub_client import FakeHubTransport, HubClientManager
+
+
+def make_manager(**kwargs):
+    transports = {}
+
+    def factory(connection_string):
+        transports[connection_string] = FakeHubTransport(connection_string)
+        return transports[connection_string]
+
+    options = {"batch_size": 10, "linger_ms": 20, "max_queue": 100, "max_retries": 2}
+    options.update(kwargs)
+    return HubClientManager(transport_factory=factory, **options), transports
+
+
+def test_messages_are_batched_over_one_connection():
+    manager, transports = make_manager()
+
+    async def run():
+        for i in range(25):
+            manager.send({"heart_rate": 60 + i}, connection_string="device-a")
+        await manager.flush()
+
+    asyncio.run(run())
+    transport = transports["device-a"]
+    assert transport.connect_count == 1
+    assert manager.stats()["device-a"]["sent_batches"] == 3
+    # Still one JSON object per IoT Hub message
+    assert transport.messages == [{"heart_rate": 60 + i} for i in range(25)]
+
+
+def test_reconnects_after_send_failure():
+    manager, transports = make_manager()
+
+    async def run():
+        manager.send({"heart_rate": 70}, connection_string="device-b")
+        await manager.flush()
+        transports["device-b"].fail_next = 1
+        manager.send({"heart_rate": 71}, connection_string="device-b")
+        await manager.flush()
+
+    asyncio.run(run())
+    transport = transports["device-b"]
+    assert transport.connect_count == 2
+    assert transport.messages == [{"heart_rate": 70}, {"heart_rate": 71}]
+    assert manager.stats()["device-b"]["reconnects"] == 1
+
+
+def test_retry_resumes_a_partly_sent_batch():
+    manager, transports = make_manager()
+    sends = []
+
+    async def run():
+        transport = manager.connection("device-c").transport
+        original = transport.send
+
+        def flaky_send(payload):
+            sends.append(payload["heart_rate"])
+            # The link drops after the second message of the batch
+            if len(sends) == 3:
+                transport.fail_next = 1
+            original(payload)
+
+        transport.send = flaky_send
+        for i in range(4):
+            manager.send({"heart_rate": 70 + i}, connection_string="device-c")
+        await manager.flush()
+
+    asyncio.run(run())
+    assert transports["device-c"].messages == [{"heart_rate": 70 + i} for i in range(4)]
+    assert sends == [70, 71, 72, 72, 73]
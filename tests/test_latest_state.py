@@ -0,0 +1,139 @@
+from datetime import date, datetime, timedelta, timezone
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.auth.security import get_current_active_doctor
+from app.database import Base
+from app.models.caregiver import Doctor
+from app.models.patient_latest_state import PatientLatestState
+from app.models.user import User, UserProfile
+from app.services.daily_summary import accumulate_readings
+from app.services.latest_state import apply_latest_state_sync, classify, fold_readings, rebuild_latest_states
+
+START = datetime(2024, 5, 1, 8, 0)
+
+
+def test_merge_keeps_latest_non_null_vitals_and_reclassifies():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    def ingest(*readings):
+        apply_latest_state_sync(db, fold_readings({}, [
+            {"user_id": 1, "timestamp": START + timedelta(minutes=minute), **vitals}
+            for minute, vitals in readings
+        ]))
+        db.commit()
+
+    ingest((0, {"heart_rate": 72, "blood_pressure_systolic": 120, "blood_pressure_diastolic": 80}),
+           (1, {"blood_oxygen": 97.0}))
+    ingest((5, {"blood_oxygen": 88.0}))
+    state = db.get(PatientLatestState, 1)
+    assert (state.heart_rate, state.blood_pressure, state.blood_oxygen) == (72, "120/80", 88.0)
+    assert state.status == "monitor"
+    assert state.measured_at == START + timedelta(minutes=5)
+
+    # A late, older reading neither overwrites nor rewinds the state
+    ingest((2, {"heart_rate": 150, "temperature": 37.1}))
+    db.refresh(state)
+    assert state.heart_rate == 72 and state.temperature == 37.1
+    assert state.measured_at == START + timedelta(minutes=5)
+
+    ingest((6, {"heart_rate": 130}))
+    db.refresh(state)
+    assert state.status == "critical" == classify(130, 88.0)
+    db.close()
+
+
+def test_writes_feed_snapshot_and_doctor_patient_list(db_env):
+    db = db_env.Session()
+    user = User(id=1, email="p@test.com", username="p", hashed_password="x", is_active=True, patient_id="P000001")
+    doctor = Doctor(doctor_id="DOC1", full_name="Dr Who", is_active=True)
+    db.add_all([user, doctor])
+    db.flush()
+    db.add(UserProfile(user_id=user.id, full_name="Pat", doctor_id="DOC1", profile_completed=True))
+    db.commit()
+    db.close()
+    db_env.login(user)
+    db_env.login(doctor, get_current_active_doctor)
+
+    record = db_env.client.post("/health/health-data",
+                                json={"heart_rate": 75, "blood_pressure": "118/76"}).json()
+    snapshot = db_env.client.get("/health/health-snapshot").json()
+    assert snapshot["id"] == record["id"]
+
+    stable = db_env.client.get("/doctors/patients?status_filter=stable").json()
+    assert [p["latest_heart_rate"] for p in stable["patients"]] == [75]
+
+    timestamp = (datetime.utcnow() + timedelta(minutes=1)).isoformat() + "Z"
+    response = db_env.client.post("/iot/webhook/batch", json=[
+        {"device_id": "watch-1", "heart_rate": 135, "timestamp": timestamp, "data_type": "heart_rate"}
+    ])
+    assert response.status_code == 200
+
+    db_env.statements.clear()
+    critical = db_env.client.get("/doctors/patients?status_filter=critical").json()
+    assert len(db_env.statements) == 1
+    patient = critical["patients"][0]
+    assert (patient["latest_heart_rate"], patient["latest_blood_pressure"], patient["status"]) == (135, "118/76", "Critical")
+
+    # The snapshot still shows the last manual entry
+    assert db_env.client.get("/health/health-snapshot").json()["id"] == record["id"]
+
+    db = db_env.Session()
+    incremental = db.get(PatientLatestState, user.id)
+    expected = (incremental.heart_rate, incremental.blood_pressure, incremental.status, incremental.health_data_id)
+    db.expunge_all()
+    assert rebuild_latest_states(db) == 1
+    rebuilt = db.get(PatientLatestState, user.id)
+    assert (rebuilt.heart_rate, rebuilt.blood_pressure, rebuilt.status, rebuilt.health_data_id) == expected
+    db.close()
+
+
+def test_manual_entry_orders_against_device_readings_off_utc(db_env, monkeypatch):
+    # Five hours behind UTC, so a local timestamp would look older than it is
+    monkeypatch.setenv("TZ", "Etc/GMT+5")
+    time.tzset()
+    try:
+        db = db_env.Session()
+        user = User(id=1, email="p@test.com", username="p", hashed_password="x", is_active=True)
+        db.add(user)
+        db.commit()
+        db.close()
+        db_env.login(user)
+
+        timestamp = (datetime.utcnow() - timedelta(minutes=1)).isoformat() + "Z"
+        db_env.client.post("/iot/webhook/batch", json=[
+            {"device_id": "watch-1", "heart_rate": 90, "timestamp": timestamp, "data_type": "heart_rate"}
+        ])
+        db_env.client.post("/health/health-data", json={"heart_rate": 70})
+        db_env.client.post("/iot/webhook/batch", json=[
+            {"device_id": "watch-1", "heart_rate": 95, "timestamp": timestamp, "data_type": "heart_rate"}
+        ])
+
+        db = db_env.Session()
+        assert db.get(PatientLatestState, user.id).heart_rate == 70
+        db.close()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_summary_day_and_latest_state_agree_off_utc(monkeypatch):
+    # Fourteen hours ahead of UTC: local time is already the next day
+    monkeypatch.setenv("TZ", "Etc/GMT-14")
+    time.tzset()
+    try:
+        readings = [
+            {"user_id": 1, "timestamp": datetime(2024, 5, 1, 20, 0, tzinfo=timezone.utc), "heart_rate": 70},
+            {"user_id": 2, "timestamp": datetime(2024, 5, 1, 20, 0), "heart_rate": 70},
+        ]
+        days = {user_id: day for user_id, day in accumulate_readings({}, readings)}
+        states = fold_readings({}, readings)
+        for user_id in (1, 2):
+            assert days[user_id] == states[user_id]["measured_at"].date() == date(2024, 5, 1)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,139 @@
+import time
+from datetime import date, datetime, timedelta
+
+from app.models.daily_health_summary import DailyHealthSummary
+from app.models.health import WeeklyProgress
+from app.models.user import User
+from app.services.leaderboard_engine import Entry, LeaderboardEngine, WeekBoard, leaderboard_engine, week_of
+
+WEEK = date(2024, 5, 6)
+
+
+def test_ties_share_a_rank_and_updates_move_users():
+    board = WeekBoard()
+    for user_id, score in [(1, 80), (2, 90), (3, 90), (4, 100)]:
+        board.upsert(Entry(user_id, None, score, "green", 10000))
+
+    assert [(rank, entry.user_id) for rank, entry in board.top(10)] == [(1, 4), (2, 2), (2, 3), (4, 1)]
+    assert board.rank(3) == 2
+    assert board.rank(1) == 4
+
+    board.upsert(Entry(1, None, 95, "green", 10000))
+    assert board.rank(1) == 2
+    assert board.rank(2) == 3
+    assert len(board) == 4
+    assert board.rank(99) is None
+
+
+def test_rank_lookup_is_sub_millisecond_for_large_boards():
+    engine = LeaderboardEngine()
+    engine.load_rows(WEEK, ((user_id, None, user_id % 101, "red", 10000) for user_id in range(300_000)))
+    board = engine.boards[WEEK]
+
+    started = time.perf_counter()
+    for user_id in range(0, 300_000, 300):
+        board.rank(user_id)
+    per_lookup = (time.perf_counter() - started) / 1000
+
+    assert per_lookup < 0.001
+    assert board.rank(100) == 1 + sum(1 for user_id in range(300_000) if user_id % 101 > 100 % 101)
+
+
+def test_weekly_endpoint_reports_exact_rank_beyond_the_top_ten(db_env):
+    leaderboard_engine.boards.clear()
+    db = db_env.Session()
+    users = [User(email=f"lb{i}@test.com", username=f"lb{i}", hashed_password="x",
+                  is_active=True, patient_id=f"P{i:06d}") for i in range(15)]
+    db.add_all(users)
+    db.commit()
+    db.close()
+
+    for i, user in enumerate(users):
+        db_env.login(user)
+        response = db_env.client.post("/health/update-progress", json={"progress_score": 95 - i})
+        assert response.status_code == 200
+
+    db_env.login(users[12])
+    body = db_env.client.get("/leaderboard/weekly").json()
+    assert body["total_participants"] == 15
+    assert len(body["leaderboard"]) == 10
+    assert body["current_user_rank"] == 13
+    assert body["current_user_data"]["display_name"] == "User0012"
+
+    # A fresh worker loads the same board from the database
+    leaderboard_engine.boards.clear()
+    reloaded = db_env.client.get("/leaderboard/weekly").json()
+    assert reloaded["current_user_rank"] == 13
+    assert reloaded["leaderboard"] == body["leaderboard"]
+
+
+def test_update_to_an_unloaded_week_does_not_hide_other_workers_rows(db_env):
+    leaderboard_engine.boards.clear()
+    week = week_of(datetime.now())
+    db = db_env.Session()
+    users = [User(email=f"uw{i}@test.com", username=f"uw{i}", hashed_password="x", is_active=True)
+             for i in range(4)]
+    db.add_all(users)
+    db.flush()
+    # Rows written through other workers
+    db.add_all([WeeklyProgress(user_id=user.id, week_start_date=datetime.combine(week, datetime.min.time()),
+                               progress_score=90 - i, progress_color="green") for i, user in enumerate(users[:3])])
+    db.commit()
+    db.close()
+
+    db_env.login(users[3])
+    db_env.client.post("/health/update-progress", json={"progress_score": 95})
+    assert leaderboard_engine.is_stale(week)
+
+    body = db_env.client.get("/leaderboard/weekly").json()
+    assert body["total_participants"] == 4
+    assert body["current_user_rank"] == 1
+    assert not leaderboard_engine.is_stale(week)
+
+
+def test_reload_keeps_updates_made_while_it_ran():
+    engine = LeaderboardEngine()
+    started = time.monotonic()
+    engine.update(WEEK, 7, None, 99, "green")
+    board = engine.install(WEEK, WeekBoard.from_rows([(1, None, 50, "red", None), (7, None, 10, "red", None)],
+                                                     started))
+    assert [(entry.user_id, entry.progress_score) for _, entry in board.top(5)] == [(7, 99), (1, 50)]
+    assert engine.boards[WEEK] is board
+
+
+def test_history_is_one_grouped_query_per_bucket_size(db_env):
+    db = db_env.Session()
+    user = User(email="hist@test.com", username="hist", hashed_password="x", is_active=True)
+    db.add(user)
+    db.flush()
+    monday = week_of(datetime.now()) - timedelta(days=7)
+    db.add_all([
+        DailyHealthSummary(user_id=user.id, day=monday, steps=4000,
+                           heart_rate_sum=140, heart_rate_count=2),
+        DailyHealthSummary(user_id=user.id, day=monday + timedelta(days=2), steps=8000,
+                           heart_rate_sum=80, heart_rate_count=1),
+        DailyHealthSummary(user_id=user.id, day=monday + timedelta(days=7), steps=0),
+        WeeklyProgress(user_id=user.id, week_start_date=datetime.combine(monday, datetime.min.time()),
+                       week_end_date=datetime.combine(monday + timedelta(days=6), datetime.min.time()),
+                       progress_score=85, progress_color="green"),
+    ])
+    db.commit()
+    db.close()
+    db_env.login(user)
+
+    db_env.statements.clear()
+    body = db_env.client.get("/leaderboard/history?days=14").json()
+    assert len(db_env.statements) == 1
+    first, second = body["history"]
+    assert first["week_start"] == monday.isoformat()
+    assert first["avg_heart_rate"] == 220 / 3
+    assert first["avg_steps"] == 6000
+    assert first["progress_color"] == "green"
+    assert first["achievements"] == ["Weekly Goal Met"]
+    assert second["progress_score"] is None and second["avg_steps"] is None
+
+    days = db_env.client.get("/leaderboard/history?days=14&bucket=day").json()
+    assert [item["avg_steps"] for item in days["history"]] == [4000, 8000, None]
+    assert days["history"][0]["progress_score"] == 85
+
+    assert db_env.client.get("/leaderboard/history?bucket=year").status_code == 422
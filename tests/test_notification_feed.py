@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.auth.security import get_current_active_user_or_admin
+from app.models.notification import Notification
+from app.models.user import User
+from app.services.notification_feed import purge_notifications
+
+NOW = datetime.utcnow().replace(microsecond=0)
+
+
+def seed(db_env):
+    db = db_env.Session()
+    user, other = (User(email=f"{name}@test.com", username=name, hashed_password="x", is_active=True)
+                   for name in ("u", "o"))
+    db.add_all([user, other])
+    db.flush()
+    rows = [
+        # Pairs share a timestamp, so pages must break ties by id
+        Notification(user_id=user.id, notification_type="system", title=f"s{i}", message="m",
+                     created_at=NOW - timedelta(minutes=i // 2))
+        for i in range(25)
+    ] + [
+        Notification(user_id=user.id, notification_type="caregiver", title=f"c{i}", message="m",
+                     created_at=NOW - timedelta(hours=i))
+        for i in range(3)
+    ] + [Notification(user_id=other.id, notification_type="system", title="x", message="m", created_at=NOW)]
+    db.add_all(rows)
+    db.commit()
+    db.close()
+    db_env.login(user, get_current_active_user_or_admin)
+    return user
+
+
+def test_feed_pages_each_group_in_one_statement(db_env):
+    seed(db_env)
+
+    db_env.statements.clear()
+    body = db_env.client.get("/notifications/?limit=10").json()
+    assert len(db_env.statements) == 1
+    assert [len(body[group]) for group in ("system", "caregiver", "doctor")] == [10, 3, 0]
+    assert body["next_cursors"]["caregiver"] is None and body["next_cursors"]["doctor"] is None
+
+    titles, cursor = [n["title"] for n in body["system"]], body["next_cursors"]["system"]
+    while cursor:
+        page = db_env.client.get(f"/notifications/?notification_type=system&limit=10&cursor={cursor}").json()
+        assert page["caregiver"] == [] and set(page["next_cursors"]) == {"system"}
+        titles += [n["title"] for n in page["system"]]
+        cursor = page["next_cursors"]["system"]
+    # Same-timestamp pairs come back newest id first
+    expected = [f"s{i}" for pair in range(0, 25, 2) for i in (pair + 1, pair) if i < 25]
+    assert titles == expected
+
+    since = (NOW - timedelta(minutes=2)).isoformat()
+    recent = db_env.client.get(f"/notifications/?since={since}").json()
+    assert [n["title"] for n in recent["system"]] == ["s1", "s0", "s3", "s2"]
+    assert [n["title"] for n in recent["caregiver"]] == ["c0"]
+
+    assert db_env.client.get(f"/notifications/?cursor={body['next_cursors']['system']}").status_code == 400
+
+    with db_env.engine.connect() as conn:
+        plan = " ".join(str(row) for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM notifications WHERE user_id = 1 AND notification_type = 'system' "
+            "ORDER BY created_at DESC, id DESC LIMIT 11"
+        )))
+    assert "ix_notifications_user_type_created" in plan and "TEMP B-TREE" not in plan
+
+
+def test_retention_removes_old_read_and_very_old_unread(db_env):
+    user = seed(db_env)
+    db = db_env.Session()
+    db.add_all([
+        Notification(user_id=user.id, notification_type="doctor", title="old read", message="m",
+                     is_read=True, created_at=NOW - timedelta(days=100)),
+        Notification(user_id=user.id, notification_type="doctor", title="old unread", message="m",
+                     is_read=False, created_at=NOW - timedelta(days=100)),
+        Notification(user_id=user.id, notification_type="doctor", title="ancient", message="m",
+                     is_read=False, created_at=NOW - timedelta(days=400)),
+    ])
+    db.commit()
+
+    assert purge_notifications(db, read_days=90, unread_days=365, chunk_size=1) == 2
+    assert [n.title for n in db.query(Notification).filter_by(notification_type="doctor")] == ["old unread"]
+    assert db.query(Notification).count() == 30
+    db.close()
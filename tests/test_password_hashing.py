@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from passlib.context import CryptContext
+
+from app.auth import hashing
+
+
+def test_rehash_when_cost_differs():
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("Secret123")
+
+    valid, new_hash = hashing.verify_and_update("Secret123", old_hash)
+    assert valid
+    assert new_hash is not None
+    assert not hashing.password_needs_rehash(new_hash)
+
+    valid, new_hash = hashing.verify_and_update("wrong", old_hash)
+    assert not valid and new_hash is None
+
+
+def test_async_hashing_runs_on_pool():
+    async def roundtrip():
+        hashed = await hashing.get_password_hash_async("Secret123")
+        return await hashing.verify_password_async("Secret123", hashed)
+
+    before = hashing.hashing_pool.stats()["completed"]
+    assert asyncio.run(roundtrip())
+    stats = hashing.hashing_pool.stats()
+    assert stats["completed"] == before + 2
+    assert stats["queue_depth"] == 0
+
+
+def test_cancelled_queued_jobs_leave_the_queue():
+    pool = hashing.PasswordHashingPool(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def run():
+        busy = asyncio.create_task(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(pool.run(lambda: None))
+        await asyncio.sleep(0.05)
+        assert pool.stats()["queue_depth"] == 1
+        # The client goes away while its job waits for the worker
+        queued.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await busy
+        assert pool.stats()["queue_depth"] == 0
+        await pool.run(lambda: None)
+
+    asyncio.run(run())
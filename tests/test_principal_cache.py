@@ -0,0 +1,55 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.user import User
+from app.auth.principal_cache import PrincipalCache, principal_cache
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine)
+
+
+def test_cache_hit_attaches_without_query():
+    engine, Session = make_session()
+    cache = PrincipalCache(maxsize=10, ttl=60)
+
+    db = Session()
+    user = User(email="cache@test.com", username="cache", hashed_password="x")
+    db.add(user)
+    db.commit()
+    cache.put(("patient", str(user.id), 1), user)
+    db.close()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    db = Session()
+    cached = cache.get(("patient", str(user.id), 1), db)
+    assert cached.email == "cache@test.com"
+    assert cached in db
+    assert statements == []
+
+    # Attached instance still persists changes made by handlers
+    cached.username = "renamed"
+    db.commit()
+    assert db.query(User).filter(User.username == "renamed").count() == 1
+    db.close()
+
+
+def test_security_change_evicts_entry():
+    engine, Session = make_session()
+    db = Session()
+    user = User(email="evict@test.com", username="evict", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    key = ("patient", str(user.id), 2)
+    principal_cache.put(key, user)
+    user.is_active = False
+    db.commit()
+
+    assert principal_cache.get(key, db) is None
+    db.close()
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.services.rollups import (
+    apply_rollups_sync, choose_granularity, load_rollups, summarize
+)
+from app.services.vital_analytics import load_window
+
+
+def test_incremental_rollups_and_granularity_choice():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    start = datetime(2024, 5, 1, 8, 0)
+    # Two ingest batches hitting the same buckets
+    apply_rollups_sync(db, [(1, "heart_rate", start + timedelta(minutes=i), 60 + i) for i in range(90)])
+    apply_rollups_sync(db, [(1, "heart_rate", start + timedelta(days=1), 150.0),
+                            (2, "heart_rate", start, 70.0)])
+    db.commit()
+
+    days = load_rollups(db, [1], "heart_rate", start - timedelta(days=5), start + timedelta(days=2))
+    assert [b.granularity for b in days] == ["day", "day"]
+    assert days[0].count == 90 and days[0].min == 60 and days[0].max == 149
+
+    summary = summarize(days)
+    assert summary["count"] == 91
+    assert summary["mean"] == (sum(range(60, 150)) + 150) / 91
+    assert summary["last_value"] == 150
+
+    hours = load_rollups(db, [1], "heart_rate", start, start + timedelta(hours=3))
+    assert [b.count for b in hours] == [60, 30]
+    assert hours[1].last_value == 149
+
+    assert choose_granularity(start, start + timedelta(minutes=30)) == "minute"
+    db.close()
+
+
+def test_windows_clip_partial_days_with_finer_buckets():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    start = datetime(2024, 5, 1, 12, 30)
+    # One reading an hour from 06:00 on the first day to 06:00 four days later
+    samples = [(1, "heart_rate", datetime(2024, 5, 1, 6) + timedelta(hours=h), 60.0 + h) for h in range(97)]
+    apply_rollups_sync(db, samples)
+    db.commit()
+
+    end = datetime(2024, 5, 4, 3, 15)
+    inside = [value for _, _, ts, value in samples if start <= ts <= end]
+    buckets = load_rollups(db, [1], "heart_rate", start, end)
+    summary = summarize(buckets)
+    assert summary["count"] == len(inside)
+    assert summary["mean"] == sum(inside) / len(inside)
+    assert summary["min"] == min(inside) and summary["max"] == max(inside)
+
+    # Per-bucket statistics still see one slot per day
+    window = load_window(db, [1], ["heart_rate"], start, end)
+    assert window.timestamps == [datetime(2024, 5, d) for d in (1, 2, 3, 4)]
+    assert window.count.sum() == len(inside)
+    db.close()
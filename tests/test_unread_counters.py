@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.auth.security import get_current_active_user_or_admin
+from app.database import get_async_db
+from app.main import app
+from app.models.caregiver import CaregiverRelationship
+from app.models.notification import Notification
+from app.models.unread_counter import UnreadCounter
+from app.models.user import User
+from app.routers.notifications import NotificationConnectionManager
+from app.services.backplane import InProcessBackplane, InProcessBus
+from app.services.notification_feed import purge_notifications
+from app.services.unread_counters import rebuild_unread_counters, unread_cache
+
+
+def seed(db_env):
+    db = db_env.Session()
+    caregiver = User(email="cg@test.com", username="cg", hashed_password="x", is_active=True, is_caregiver=True)
+    patient = User(email="p@test.com", username="p", hashed_password="x", is_active=True)
+    db.add_all([caregiver, patient])
+    db.flush()
+    db.add(CaregiverRelationship(caregiver_id=caregiver.id, patient_id=patient.id, status="approved"))
+    db.commit()
+    db.close()
+    return caregiver, patient
+
+
+def badges(db_env, user):
+    db_env.login(user, get_current_active_user_or_admin)
+    return db_env.client.get("/me/badges").json()
+
+
+def counters(db_env):
+    db = db_env.Session()
+    rows = db.execute(select(UnreadCounter.user_id, UnreadCounter.notifications, UnreadCounter.messages)
+                      .order_by(UnreadCounter.user_id)).all()
+    db.close()
+    return [tuple(row) for row in rows]
+
+
+def test_badges_follow_writes_and_are_served_from_cache(db_env):
+    caregiver, patient = seed(db_env)
+    assert badges(db_env, caregiver) == {"notifications": 0, "messages": 0, "total": 0}
+
+    # A cached poll does not touch the database
+    db_env.statements.clear()
+    badges(db_env, caregiver)
+    assert db_env.statements == []
+
+    db_env.login(patient)
+    sent = [db_env.client.post("/messages/send", json={"receiver_id": caregiver.id, "content": f"m{i}"}).json()["id"]
+            for i in range(3)]
+    db_env.client.post("/notifications/create", json={
+        "user_id": caregiver.id, "notification_type": "system", "title": "t", "message": "m"})
+
+    async def broadcast():
+        manager = NotificationConnectionManager(InProcessBackplane(bus=InProcessBus()))
+        async for db in app.dependency_overrides[get_async_db]():
+            await manager.broadcast_to_caregivers(patient.id, {"type": "emergency"}, db, {
+                "notification_type": "system", "title": "Emergency", "message": "HR 150",
+                "sender_id": patient.id, "sender_type": "emergency"})
+
+    asyncio.run(broadcast())
+    assert badges(db_env, caregiver) == {"notifications": 2, "messages": 3, "total": 5}
+
+    db_env.login(caregiver)
+    db_env.client.post("/messages/mark-read", json={"message_ids": sent[:2]})
+    first = db_env.client.get("/notifications/").json()["system"][0]["id"]
+    for _ in range(2):
+        db_env.client.post(f"/notifications/mark-read/{first}")
+    assert db_env.client.get("/messages/unread-count").json()["unread_count"] == 1
+    assert db_env.client.get("/notifications/unread-count").json()["unread_count"] == 1
+    assert badges(db_env, patient)["total"] == 0
+    assert unread_cache.stats()["hits"] >= 1
+
+    incremental = counters(db_env)
+    db = db_env.Session()
+    rebuild_unread_counters(db)
+    db.close()
+    assert counters(db_env) == incremental == [(caregiver.id, 1, 1)]
+
+
+def test_purge_and_rollback_keep_counters_in_step(db_env):
+    caregiver, _ = seed(db_env)
+    db = db_env.Session()
+    now = datetime.utcnow()
+    db.add_all([
+        Notification(user_id=caregiver.id, notification_type="doctor", title=f"n{i}", message="m",
+                     created_at=now - timedelta(days=400 if i < 2 else 1))
+        for i in range(3)
+    ])
+    db.commit()
+
+    # Counter updates roll back with the rows they counted
+    db.add(Notification(user_id=caregiver.id, notification_type="doctor", title="x", message="m"))
+    db.flush()
+    db.rollback()
+    assert counters(db_env) == [(caregiver.id, 3, 0)]
+
+    assert purge_notifications(db, read_days=90, unread_days=365) == 2
+    db.close()
+    assert counters(db_env) == [(caregiver.id, 1, 0)]
+    assert badges(db_env, caregiver)["notifications"] == 1
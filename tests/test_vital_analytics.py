@@ -0,0 +1,72 @@
+import statistics
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.services.rollups import apply_rollups_sync, load_rollups, summarize
+from app.services.vital_analytics import load_window, metric_reports
+
+START = datetime(2024, 5, 1, 8, 0)
+NAMES = {"heart_rate": "heart_rate", "blood_glucose": "blood_glucose", "weight": None}
+
+
+def reference_report(buckets):
+    """The per-metric list/statistics implementation the kernel replaced"""
+    summary = summarize(buckets)
+    values = [b.mean for b in buckets if b.count]
+    half = len(values) // 2
+    first, second = statistics.mean(values[:half]), statistics.mean(values[half:])
+    trend = "improving" if second > first * 1.1 else "declining" if second < first * 0.9 else "stable"
+    return {
+        "average": summary["mean"], "min": summary["min"], "max": summary["max"],
+        "recent_average": statistics.mean(values[-5:]), "trend": trend,
+        "data_points": summary["count"], "latest_value": summary["last_value"],
+        "latest_timestamp": summary["last_at"].isoformat(), "p50": float(np.median(values)),
+    }
+
+
+def test_kernel_matches_per_metric_statistics_for_many_patients():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    rng = np.random.default_rng(7)
+    samples = []
+    for user_id in (1, 2, 3):
+        for day in range(12):
+            if user_id == 2 and day % 3 == 0:
+                continue  # gaps become NaN buckets
+            for reading in range(4):
+                ts = START + timedelta(days=day, hours=reading)
+                samples.append((user_id, "heart_rate", ts, float(60 + user_id * 5 + day * user_id + rng.normal())))
+        samples.append((user_id, "blood_glucose", START + timedelta(days=user_id), 100.0 + user_id))
+    apply_rollups_sync(db, samples)
+    db.commit()
+
+    window_start, window_end = START - timedelta(days=1), START + timedelta(days=13)
+    window = load_window(db, [1, 2, 3, 4], ["heart_rate", "blood_glucose"], window_start, window_end)
+    reports = metric_reports(window, NAMES)
+
+    for user_id in (1, 2, 3):
+        buckets = load_rollups(db, [user_id], "heart_rate", window_start, window_end)
+        expected = reference_report(buckets)
+        report = reports[user_id]["heart_rate"]
+        for key in ("average", "min", "max", "recent_average", "latest_value"):
+            assert report[key] == expected[key] or abs(report[key] - expected[key]) < 1e-9
+        assert report["trend"] == expected["trend"]
+        assert report["data_points"] == expected["data_points"]
+        assert report["latest_timestamp"] == expected["latest_timestamp"]
+        assert abs(report["percentiles"]["p50"] - expected["p50"]) < 1e-9
+        assert abs(report["slope_per_day"] - user_id) < 0.5
+
+        glucose = reports[user_id]["blood_glucose"]
+        assert glucose["average"] == 100.0 + user_id
+        assert glucose["trend"] == "stable" and glucose["slope_per_day"] is None
+
+    assert [reports[u]["heart_rate"]["trend"] for u in (1, 3)] == ["stable", "improving"]
+    assert reports[1]["weight"]["has_data"] is False
+    assert reports[4]["heart_rate"] == {"has_data": False, "message": "No heart rate data available"}
+    db.close()
@@ -0,0 +1,103 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers.notifications import NotificationConnectionManager, notification_manager
+from app.services.backplane import InProcessBackplane, InProcessBus
+
+
+class FakeSocket:
+    def __init__(self, stalled=False):
+        self.sent = []
+        self.closed_with = None
+        self.stalled = stalled
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def manager(**kwargs):
+    return NotificationConnectionManager(InProcessBackplane(bus=InProcessBus()), **kwargs)
+
+
+def test_every_connection_of_a_user_receives_and_slow_ones_are_dropped():
+    async def run():
+        registry = manager(queue_size=2)
+        phone, tablet, stalled = FakeSocket(), FakeSocket(), FakeSocket(stalled=True)
+        first = await registry.connect(1, phone)
+        await registry.connect(1, tablet)
+        await registry.connect(1, stalled)
+
+        for i in range(4):
+            assert await registry.send_notification(1, {"id": i})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        assert phone.sent == tablet.sent == [{"id": i} for i in range(4)]
+
+        # The stalled socket took one message into its writer and queued two more
+        assert stalled.closed_with == 1013
+        stats = registry.stats()
+        assert (stats["users"], stats["connections"], stats["evicted_slow"]) == (1, 2, 1)
+        assert stats["sent"] == 8 and stats["max_queue_depth"] == 0
+
+        await registry.disconnect(first)
+        await registry.disconnect(first)
+        assert registry.is_user_online(1)
+        assert registry.stats()["connections"] == 1
+
+    asyncio.run(run())
+
+
+def test_listen_only_clients_stay_connected_by_default():
+    async def run():
+        registry = manager(idle_timeout=0)
+        listener = FakeSocket()
+        await registry.connect(1, listener)
+        await asyncio.sleep(0.05)
+        assert await registry.send_notification(1, {"id": 1})
+        await asyncio.sleep(0.01)
+
+        # No heartbeat frames the client does not know about
+        assert listener.sent == [{"id": 1}] and listener.closed_with is None
+        assert registry._sweeper is None
+
+    asyncio.run(run())
+
+
+def test_opt_in_idle_timeout_evicts_silent_connections():
+    async def run():
+        registry = manager(idle_timeout=0.1)
+        alive, silent = FakeSocket(), FakeSocket()
+        responsive = await registry.connect(1, alive)
+        await registry.connect(2, silent)
+
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            # The client's own keep-alive frames
+            registry.touch(responsive)
+
+        assert alive.sent == [] and alive.closed_with is None
+        assert silent.closed_with == 1001
+        assert registry.is_user_online(1) and not registry.is_user_online(2)
+        assert registry.stats()["evicted_idle"] == 1
+
+    asyncio.run(run())
+
+
+def test_websocket_endpoint_keeps_both_connections():
+    client = TestClient(app)
+    with client.websocket_connect("/notifications/ws/42") as phone, \
+            client.websocket_connect("/notifications/ws/42") as tablet:
+        for socket in (phone, tablet):
+            socket.send_json({"type": "ping"})
+            assert socket.receive_json() == {"type": "pong"}
+        assert len(notification_manager.user_connections(42)) == 2